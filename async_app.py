@@ -0,0 +1,472 @@
+import asyncio
+import concurrent.futures
+import functools
+import json
+import time
+import openai
+from openai import AsyncOpenAI
+from urllib.parse import parse_qs, unquote
+
+from single_flight import AsyncSingleFlight
+from hot_reload import CLIENT_CLOSE_DELAY
+from rate_limiter import retry_after
+from metrics import NULL_TRACE
+from translation_log import log
+from translation_service import TranslationService, FatalTranslationError, BLOCKED_MESSAGE, CENSOR_WINDOW, is_censored
+from text_processing import (
+    handle_paired_symbols,
+    remove_text_special_chars,
+    restore_text_special_chars,
+    restore_paired_symbols
+)
+
+
+class AsyncTranslationService:
+    """基于 asyncio + AsyncOpenAI 的翻译流程
+
+    复用 TranslationService 的配置、字典、缓存与提示词构建，重试、审查检测和切换云服务商的逻辑
+    与 TranslationService.handle_translation 保持一致，每个请求只占用一个协程而不是一个线程。
+    """
+
+    def __init__(self, service: TranslationService):
+        self.service = service
+        self.clients = {}
+        self.model_types = {}
+        if not service.config_manager.update_clients(self.clients, self.model_types, client_class=AsyncOpenAI):
+            raise RuntimeError("异步API客户端初始化失败")
+        self.single_flight = AsyncSingleFlight()
+        self.provider_slots = {}
+        self.loop = None  # 服务启动后的事件循环，用于关闭被替换的客户端
+        # 缓存/翻译记忆使用共享存储（SQLite / Redis）时，读写在线程池中执行，不阻塞事件循环
+        cache, memory = service.cache, service.memory
+        self.offload_cache = cache is not None and cache.backend is not None
+        self.offload_memory = memory is not None and memory.store is not None
+        self.io_executor = None
+        if self.offload_cache or self.offload_memory:
+            self.io_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=service.get_current_config().get('server', {}).get('io_workers', 8),
+                thread_name_prefix='async-io'
+            )
+        service.config_manager.add_reload_listener(self._on_config_reload)
+
+    def _on_config_reload(self, old_config, new_config):
+        """config重载后同步更新异步客户端（在文件监视线程中调用）"""
+        self.service.config_manager.update_clients(
+            self.clients, self.model_types, client_class=AsyncOpenAI, on_retired=self._close_clients_later
+        )
+        if old_config.get('server') != new_config.get('server') or old_config['api_keys'] != new_config['api_keys']:
+            self.provider_slots = {}
+
+    def _close_clients_later(self, retired):
+        """在事件循环中 CLIENT_CLOSE_DELAY 秒后关闭被替换的异步客户端（服务尚未启动时连接池为空，无需关闭）"""
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+
+        async def close():
+            await asyncio.sleep(CLIENT_CLOSE_DELAY)
+            for client in retired:
+                try:
+                    await client.close()
+                except Exception:
+                    pass
+
+        asyncio.run_coroutine_threadsafe(close(), loop)
+
+    async def _run_io(self, offload, func, *args):
+        """执行缓存/翻译记忆的同步调用：offload 为 True 时（会访问共享存储）放到线程池中执行"""
+        if not offload:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.io_executor, functools.partial(func, *args))
+
+    def _provider_slot(self, api_type):
+        """获取云服务商的并发信号量，上限与同步版本相同"""
+        slot = self.provider_slots.get(api_type)
+        if slot is None:
+            config = self.service.config_manager.get_config()
+            limit = config['api_keys'].get(api_type, {}).get(
+                'max_concurrency', config.get('server', {}).get('provider_concurrency', 8)
+            )
+            slot = asyncio.Semaphore(limit)
+            self.provider_slots[api_type] = slot
+        return slot
+
+    async def translate(self, text, separator_symbol="", trace=NULL_TRACE):
+        """翻译并返回结果：先查缓存，相同原文的并发请求只发起一次翻译"""
+        with trace.span('cache'):
+            cached = await self._run_io(self.offload_cache, self.service.lookup_cache, text, separator_symbol)
+        if cached is not None:
+            trace.set(cache_hit=True)
+            return cached
+        key = (unquote(text), separator_symbol)
+        return await self.single_flight.do(key, self.handle_translation, text, separator_symbol, trace)
+
+    async def handle_translation(self, text, separator_symbol="", trace=NULL_TRACE):
+        """异步流式翻译处理，返回最终译文；各段落并发翻译后按原顺序拼接"""
+        text = unquote(text)
+        source_text = text
+
+        # 整个请求使用同一个config/字典快照
+        snapshot = self.service.config_manager.snapshot()
+        dict_snapshot = self.service.dict_manager.snapshot()
+        trace.set(config_version=snapshot.version, dict_version=dict_snapshot.version)
+        api_priority = self.service.provider_order(snapshot)
+
+        if not separator_symbol:
+            paragraphs = text.split('\n') if '\n' in text else [text]
+        else:
+            paragraphs = [text]
+
+        units = []
+        for index, para in enumerate(paragraphs):
+            parts = [para] if separator_symbol else self.service.split_paragraph(para, api_priority, snapshot)
+            units.extend((index, part) for part in parts if part.strip())
+
+        # 每个请求同时进行的段落数不超过 parallel.max_per_request
+        parallel_config = snapshot.config.get('parallel', {})
+        limit = parallel_config.get('max_per_request', 4) if parallel_config.get('enabled', True) else 1
+        semaphore = asyncio.Semaphore(max(1, limit))
+        use_cache = len(units) > 1
+
+        async def translate_unit(unit):
+            async with semaphore:
+                return await self._translate_unit(unit, use_cache, separator_symbol, api_priority, snapshot, dict_snapshot, trace)
+
+        tasks = [asyncio.ensure_future(translate_unit(part)) for _, part in units]
+        try:
+            results = await asyncio.gather(*tasks)
+        except FatalTranslationError as e:
+            return str(e)
+        finally:
+            # 某个单元出错时取消其余单元
+            for task in tasks:
+                task.cancel()
+
+        translated_paragraphs = [[] for _ in paragraphs]
+        cacheable = True
+        for (index, _), (translation, ok) in zip(units, results):
+            translated_paragraphs[index].append(translation if translation else "翻译失败！")
+            cacheable = cacheable and ok
+
+        final_translation = '\n'.join(''.join(parts) for parts in translated_paragraphs)
+        cache = self.service.cache
+        if cache is not None and cacheable and final_translation:
+            key = self.service._cache_key(source_text, separator_symbol, snapshot, dict_snapshot)
+            await self._run_io(self.offload_cache, cache.put, key, source_text, final_translation)
+        return final_translation
+
+    async def _translate_unit(self, unit, use_cache, separator_symbol, api_priority, snapshot, dict_snapshot, trace=NULL_TRACE):
+        """翻译一个单元：单独查询/写入缓存，返回 (译文, 是否可缓存)"""
+        cache = self.service.cache
+        key = None
+        if use_cache and cache is not None:
+            key = self.service._cache_key(unit, separator_symbol, snapshot, dict_snapshot)
+            with trace.span('cache'):
+                cached = await self._run_io(self.offload_cache, cache.get, key)
+            if cached is not None:
+                return cached, True
+        translation, cacheable = await self._translate_paragraph(unit, separator_symbol, api_priority, snapshot, dict_snapshot, trace)
+        if key is not None and cacheable and translation:
+            await self._run_io(self.offload_cache, cache.put, key, unit, translation)
+        return translation, cacheable
+
+    async def _translate_paragraph(self, para, separator_symbol, api_priority, snapshot, dict_snapshot, trace=NULL_TRACE):
+        """翻译单个段落，返回 (译文, 是否可缓存)"""
+        text = para
+        if not separator_symbol:
+            text, removed_symbols = handle_paired_symbols(text)
+            text, text_start_special_chars, text_end_special_chars = remove_text_special_chars(text)
+
+        examples = []
+        normalized = None
+        if not separator_symbol:
+            remembered, examples, normalized = await self._run_io(
+                self.offload_memory, self.service.memory_lookup, text, snapshot, dict_snapshot, trace
+            )
+            if remembered is not None:
+                remembered = restore_text_special_chars(remembered, text_start_special_chars, text_end_special_chars)
+                return restore_paired_symbols(remembered, removed_symbols), True
+
+        with trace.span('prompt'):
+            prompt = self.service.build_prompt(text, separator_symbol, snapshot, trace, dict_snapshot, examples)
+            base_params, _ = self.service.build_base_params(text, prompt, snapshot)
+        provider_wait = snapshot.config.get('server', {}).get('provider_wait', 10)
+        loop_start = time.perf_counter()
+
+        max_retries = 3
+        retries = 0
+        current_translation = ""
+        cacheable = True
+        block_retry_count = 0
+        max_block_retries = len(api_priority) - 1
+
+        while block_retry_count <= max_block_retries:
+            try:
+                api_type = api_priority[block_retry_count]
+                if api_type not in self.clients:
+                    log.warning(f"\033[41m[错误]未配置的API类型: {api_type}\033[0m")
+                    block_retry_count += 1
+                    continue
+
+                model_params = self.service.model_params(base_params, api_type, snapshot)
+                # 还有下一个云服务商时，限速需要等待较久就直接切换；最后一个云服务商最多等待 provider_wait 秒
+                has_next = self.service._next_provider_index(api_priority, block_retry_count) is not None
+                current_translation, is_blocked = await self._stream_completion(
+                    api_type, model_params, provider_wait, trace, rate_wait=None if has_next else provider_wait
+                )
+                if current_translation is None:
+                    log.warning(f"\033[33m[{api_type}]并发已满或已达到限速，切换下一个云服务商\033[0m")
+                    current_translation = ""
+                    block_retry_count += 1
+                    trace.inc('failovers', api_type)
+                    continue
+
+                if is_blocked and block_retry_count < max_block_retries:
+                    block_retry_count += 1
+                    trace.inc('failovers', api_type)
+                    log.warning(f"\033[33m[正在重试 {block_retry_count + 1}/{max_block_retries + 1}]...\033[0m")
+                    await asyncio.sleep(1)
+                    continue
+
+                if is_blocked:
+                    log.warning(f"\033[33m[翻译失败]\033[0m")
+                    cacheable = False
+                    current_translation = BLOCKED_MESSAGE
+
+                if not current_translation:
+                    raise ValueError("空响应")
+
+                if cacheable:
+                    await self._run_io(
+                        self.offload_memory, self.service.memory_record, current_translation, dict_snapshot, normalized
+                    )
+
+                if not separator_symbol:
+                    current_translation = restore_text_special_chars(
+                        current_translation,
+                        text_start_special_chars,
+                        text_end_special_chars
+                    )
+                    current_translation = restore_paired_symbols(current_translation, removed_symbols)
+
+            except openai.BadRequestError as e:
+                if "data_inspection_failed" in str(e):
+                    block_retry_count += 1
+                    if block_retry_count <= max_block_retries:
+                        trace.inc('failovers', api_type)
+                        log.warning(f"\033[41m[警告]检测到阿里云审查！(正在重试 {block_retry_count}/{max_block_retries}) 错误信息: {str(e)}\033[0m")
+                        await asyncio.sleep(1)
+                        continue
+                    cacheable = False
+                    current_translation = BLOCKED_MESSAGE
+                else:
+                    raise e
+
+            except openai.RateLimitError as e:
+                # 限速器已按 Retry-After 暂停该云服务商：有下一个云服务商时立即切换，否则重新排队等待额度
+                log.error(f"\033[31m[限流错误] {str(e)}\033[0m")
+                retries += 1
+                if retries >= max_retries:
+                    raise e
+                if self.service._next_provider_index(api_priority, block_retry_count) is not None:
+                    block_retry_count += 1
+                    trace.inc('failovers', api_type)
+                else:
+                    trace.inc('retries', api_type)
+                continue
+
+            except openai.APIConnectionError as e:
+                log.error(f"\033[31m[连接错误] {str(e)}\033[0m")
+                if "SSL" in str(e):
+                    raise FatalTranslationError("SSL证书验证失败，请检查系统时间")
+                # SDK 不再自动重试，连接错误与其他错误一样重试
+                retries += 1
+                if retries >= max_retries:
+                    raise e
+                trace.inc('retries', api_type)
+                await asyncio.sleep(1)
+                continue
+
+            except Exception as e:
+                retries += 1
+                log.warning(f"\033[33m[重试{retries}/{max_retries}] 错误: {str(e)}\033[0m")
+                if retries >= max_retries:
+                    raise e
+                trace.inc('retries', api_type)
+                await asyncio.sleep(1)
+                continue
+
+            break
+
+        trace.add('provider_loop', time.perf_counter() - loop_start)
+        return current_translation, cacheable and bool(current_translation)
+
+    async def _stream_completion(self, api_type, model_params, provider_wait, trace=NULL_TRACE, rate_wait=None):
+        """请求一次流式补全，返回 (译文, 是否被审查)；已达到限速或等待并发名额超时返回 (None, False)"""
+        rate_limiter = self.service.rate_limiter
+        wait = rate_limiter.reserve(api_type, self.service.token_budget.request_tokens(model_params), rate_wait)
+        if wait is None:
+            log.warning(f"\033[33m[{api_type}]已达到限速\033[0m")
+            return None, False
+        if wait:
+            trace.add('rate_wait', wait, api_type)
+            await asyncio.sleep(wait)
+
+        slot = self._provider_slot(api_type)
+        try:
+            await asyncio.wait_for(slot.acquire(), provider_wait)
+        except asyncio.TimeoutError:
+            return None, False
+
+        scheduler = self.service.scheduler
+        start = time.perf_counter()
+        ttft = None
+        stream = None
+        trace.inc('requests', api_type)
+        try:
+            stream = await self.clients[api_type].chat.completions.create(**model_params)
+            rate_limiter.update_from_headers(api_type, getattr(getattr(stream, 'response', None), 'headers', None))
+            full_translation = []
+            recent_text = ""
+            is_blocked = False
+            chunks = 0
+            usage = None
+            async for chunk in stream:
+                chunks += 1
+                if getattr(chunk, 'usage', None) is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                chunk_text = chunk.choices[0].delta.content or ""
+                full_translation.append(chunk_text)
+                if chunk_text and ttft is None:
+                    ttft = time.perf_counter() - start
+                    trace.add('ttft', ttft, api_type)
+                recent_text = (recent_text + chunk_text)[-CENSOR_WINDOW * 2:]
+                if not is_blocked and is_censored(recent_text):
+                    is_blocked = True
+                    trace.inc('blocks', api_type)
+                    log.warning(f"\033[41m[警告]{api_type} 检测到云服务商审查！\033[0m")
+            duration = time.perf_counter() - start
+            if ttft is not None:
+                trace.add('stream', duration - ttft, api_type)
+            scheduler.record_success(api_type, ttft if ttft is not None else duration, duration, chunks, is_blocked)
+            self.service.account_usage(api_type, model_params, usage, ''.join(full_translation), trace)
+            return ''.join(full_translation), is_blocked
+        except openai.BadRequestError as e:
+            if "data_inspection_failed" in str(e):
+                duration = time.perf_counter() - start
+                scheduler.record_success(api_type, duration, duration, 0, censored=True)
+                trace.inc('blocks', api_type)
+            else:
+                scheduler.record_error(api_type)
+                trace.inc('errors', api_type)
+            raise
+        except Exception as e:
+            rate_limited = isinstance(e, openai.RateLimitError)
+            if rate_limited:
+                rate_limiter.penalize(api_type, retry_after(e))
+            scheduler.record_error(api_type, rate_limited=rate_limited)
+            trace.inc('rate_limits' if rate_limited else 'errors', api_type)
+            raise
+        finally:
+            slot.release()
+            # 被取消（请求超时）或出错时关闭连接，不再继续接收
+            if stream is not None:
+                await stream.close()
+
+    def get_stats(self):
+        stats = self.service.get_stats()
+        stats['async_single_flight'] = self.single_flight.get_stats()
+        return stats
+
+
+class TranslationASGIApp:
+    """不依赖 Web 框架的 ASGI 应用，提供与 run_app 相同的 /translate 和 /stats 接口"""
+
+    def __init__(self, async_service: AsyncTranslationService, request_timeout=30):
+        self.async_service = async_service
+        self.request_timeout = request_timeout
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    self.async_service.loop = asyncio.get_running_loop()
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            return
+
+        path, method = scope['path'], scope['method']
+        if path == '/translate' and method == 'GET':
+            await self._translate(scope, send)
+        elif path == '/stats' and method == 'GET':
+            body = json.dumps(self.async_service.get_stats(), ensure_ascii=False)
+            await self._send(send, 200, body, 'application/json')
+        elif path == '/metrics' and method == 'GET':
+            cache = self.async_service.service.cache
+            cache_stats = cache.get_stats() if cache is not None else {}
+            gauges = {'cache_entries': cache_stats.get('memory_entries'), 'cache_hit_rate': cache_stats.get('hit_rate')}
+            body = self.async_service.service.metrics.render_prometheus(gauges)
+            await self._send(send, 200, body, 'text/plain; version=0.0.4')
+        else:
+            await self._send(send, 404, "Not Found")
+
+    async def _translate(self, scope, send):
+        query = parse_qs(scope['query_string'].decode('utf-8', errors='replace'))
+        text = query.get('text', [''])[0]
+        log_results = log.enabled('results')
+        if log_results:
+            log.info(f"\033[36m[原文]\033[0m \033[35m{text}\033[0m")
+
+        trace = self.async_service.service.metrics.start_trace('translate')
+        try:
+            result = await asyncio.wait_for(self.async_service.translate(text, trace=trace), self.request_timeout)
+        except asyncio.TimeoutError:
+            trace.finish(status=500)
+            await self._send(send, 500, "[ERROR]翻译超时")
+            return
+        except Exception as e:
+            trace.finish(status=500)
+            await self._send(send, 500, f"[ERROR]系统错误: {str(e)}")
+            return
+        trace.finish(status=200)
+
+        if log_results:
+            log.info(f"\033[36m[译文]\033[0m \033[1;32m{result}\n\033[0m")
+        await self._send(send, 200, result)
+
+    @staticmethod
+    async def _send(send, status, body, content_type='text/plain'):
+        payload = body.encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', f'{content_type}; charset=utf-8'.encode('latin-1')),
+                (b'content-length', str(len(payload)).encode('latin-1')),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': payload})
+
+
+def serve(service: TranslationService, host='127.0.0.1', port=4000, sock=None):
+    """使用 uvicorn 启动异步翻译服务（sock 为多进程模式下已绑定端口的监听 socket）"""
+    try:
+        import uvicorn  # 需要安装：pip install uvicorn
+    except ImportError:
+        log.error("\033[31m[服务启动]异步模式需要安装 uvicorn：pip install uvicorn\033[0m")
+        exit(1)
+
+    request_timeout = service.get_current_config().get('server', {}).get('request_timeout', 30)
+    app = TranslationASGIApp(AsyncTranslationService(service), request_timeout=request_timeout)
+    if sock is not None:
+        server = uvicorn.Server(uvicorn.Config(app, log_level='warning', access_log=False))
+        server.run(sockets=[sock])
+        return
+    log.info(f"\033[33m[服务启动]异步翻译服务在 http://{host}:{port}/translate 上启动\n\033[0m")
+    uvicorn.run(app, host=host, port=port, log_level='warning', access_log=False)
@@ -0,0 +1,304 @@
+"""
+本地模拟的 OpenAI 兼容流式接口（chat.completions），用于离线性能测试。
+
+每个云服务商使用不同的路径前缀，例如 http://127.0.0.1:4100/tencent/v1 ，
+可以分别配置首字延迟、输出速度和各类错误的注入概率：
+
+    python benchmarks/fake_openai_server.py --port 4100 --first-token-ms 300 --tokens-per-sec 60 \
+        --profiles '{"tencent": {"censor_rate": 0.05}, "ali": {"inspection_rate": 0.05}}'
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+CENSOR_TEXT = "我无法给到相关内容"
+
+DEFAULT_PROFILE = {
+    'first_token_ms': 300,   # 首个文本块前的延迟（毫秒）
+    'tokens_per_sec': 60,    # 输出速度，每个文本块按 1 个 token 计
+    'chars_per_token': 2,    # 每个文本块的字符数
+    'error_rate': 0.0,       # 返回 500 的概率
+    'rate_limit_rate': 0.0,  # 返回 429（RateLimitError）的概率
+    'retry_after': 1,        # 429 响应的 Retry-After 秒数
+    'censor_rate': 0.0,      # 输出中夹带审查提示（“我无法给到相关内容”）的概率
+    'inspection_rate': 0.0,  # 返回阿里云 data_inspection_failed（400）的概率
+    'cache_block_tokens': 64,  # 模拟提示词前缀缓存的粒度（token），0 表示不模拟
+}
+
+MAX_CACHED_PREFIXES = 100000
+
+
+class FakeOpenAIServer:
+    """在后台线程中运行的模拟服务，统计每个云服务商的请求结果"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 4100, profile: Optional[Dict[str, Any]] = None,
+                 profiles: Optional[Dict[str, Dict[str, Any]]] = None, seed: Optional[int] = None):
+        self.profile = {**DEFAULT_PROFILE, **(profile or {})}
+        self.profiles = profiles or {}
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self.prefixes = set()  # 已见过的提示词前缀（按缓存粒度切分）的哈希
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    def base_url(self, provider: str) -> str:
+        host = self.httpd.server_address[0]
+        return f"http://{host}:{self.port}/{provider}/v1"
+
+    def profile_for(self, provider: str) -> Dict[str, Any]:
+        return {**self.profile, **self.profiles.get(provider, {})}
+
+    def count(self, provider: str, outcome: str):
+        with self.lock:
+            provider_stats = self.stats.setdefault(provider, {})
+            provider_stats[outcome] = provider_stats.get(outcome, 0) + 1
+
+    def roll(self, probability: float) -> bool:
+        if probability <= 0:
+            return False
+        with self.lock:
+            return self.random.random() < probability
+
+    def cached_prefix_chars(self, prompt: str, block_chars: int) -> int:
+        """与 DeepSeek 的上下文硬盘缓存类似：返回此前请求中出现过的最长前缀长度（按粒度取整），并记录本次的前缀"""
+        if block_chars <= 0:
+            return 0
+        hit = 0
+        with self.lock:
+            if len(self.prefixes) > MAX_CACHED_PREFIXES:
+                self.prefixes.clear()
+            for end in range(block_chars, len(prompt) + 1, block_chars):
+                key = hash(prompt[:end])
+                if key in self.prefixes:
+                    if hit == end - block_chars:
+                        hit = end
+                else:
+                    self.prefixes.add(key)
+        return hit
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        with self.lock:
+            return {provider: dict(outcomes) for provider, outcomes in self.stats.items()}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(FakeOpenAIHandler):
+            fake = server
+
+        return Handler
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 支持长连接，与真实服务一样复用连接池
+    fake: FakeOpenAIServer = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _provider(self) -> str:
+        return self.path.strip('/').split('/', 1)[0]
+
+    def _send_json(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str, error_type: str, code: str,
+                    headers: Optional[Dict[str, str]] = None):
+        self._send_json(status, {'error': {'message': message, 'type': error_type, 'code': code}}, headers)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send_json(200, self.fake.get_stats())
+        elif self.path.endswith('/models'):
+            self._send_json(200, {'object': 'list', 'data': [{'id': 'fake-model', 'object': 'model'}]})
+        else:
+            self._send_error(404, 'Not Found', 'invalid_request_error', 'not_found')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_error(400, 'invalid json', 'invalid_request_error', 'invalid_json')
+            return
+        if not self.path.endswith('/chat/completions'):
+            self._send_error(404, 'Not Found', 'invalid_request_error', 'not_found')
+            return
+
+        provider = self._provider()
+        profile = self.fake.profile_for(provider)
+
+        if self.fake.roll(profile['rate_limit_rate']):
+            self.fake.count(provider, 'rate_limited')
+            self._send_error(429, 'Rate limit reached', 'rate_limit_error', 'rate_limit_exceeded',
+                             {'Retry-After': str(profile['retry_after'])})
+            return
+        if self.fake.roll(profile['error_rate']):
+            self.fake.count(provider, 'error')
+            self._send_error(500, 'Internal server error', 'server_error', 'internal_error')
+            return
+        if self.fake.roll(profile['inspection_rate']):
+            self.fake.count(provider, 'inspection_failed')
+            self._send_error(400, 'Input or output data may contain inappropriate content.',
+                             'data_inspection_failed', 'data_inspection_failed')
+            return
+
+        source = ''
+        for message in request.get('messages', []):
+            if message.get('role') == 'user':
+                source = message.get('content') or ''
+        censored = self.fake.roll(profile['censor_rate'])
+        output = self._translate(source, censored)
+        self.fake.count(provider, 'censored' if censored else 'ok')
+
+        if request.get('stream'):
+            self._stream(request, output, profile)
+        else:
+            time.sleep(profile['first_token_ms'] / 1000)
+            self._send_json(200, {
+                'id': f"chatcmpl-{uuid.uuid4().hex}",
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': request.get('model', 'fake-model'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': output}, 'finish_reason': 'stop'}],
+                'usage': self._usage(request, output, profile),
+            })
+
+    @staticmethod
+    def _translate(source: str, censored: bool) -> str:
+        """生成“译文”：保留分隔行，其余每行加上前缀，长度与原文相近"""
+        if censored:
+            return CENSOR_TEXT
+        lines = []
+        for line in source.split('\n'):
+            lines.append(line if not line.strip() or line.strip() == '◆◆' else '译' + line)
+        return '\n'.join(lines)
+
+    def _usage(self, request: Dict[str, Any], output: str, profile: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = ''.join(message.get('content') or '' for message in request.get('messages', []))
+        chars_per_token = profile['chars_per_token']
+        prompt_tokens = max(1, len(prompt) // chars_per_token)
+        completion_tokens = max(1, len(output) // chars_per_token)
+        cached_tokens = min(
+            prompt_tokens,
+            self.fake.cached_prefix_chars(prompt, profile['cache_block_tokens'] * chars_per_token) // chars_per_token
+        )
+        return {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+            # 同时提供 DeepSeek 与 OpenAI 两种格式的缓存命中字段
+            'prompt_cache_hit_tokens': cached_tokens,
+            'prompt_cache_miss_tokens': prompt_tokens - cached_tokens,
+            'prompt_tokens_details': {'cached_tokens': cached_tokens},
+        }
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream(self, request: Dict[str, Any], output: str, profile: Dict[str, Any]):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = request.get('model', 'fake-model')
+
+        def event(delta, finish_reason=None, usage=None):
+            payload = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+            }
+            if usage is not None:
+                payload['usage'] = usage
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8')
+
+        size = max(1, profile['chars_per_token'])
+        interval = 1 / profile['tokens_per_sec'] if profile['tokens_per_sec'] > 0 else 0
+        try:
+            time.sleep(profile['first_token_ms'] / 1000)
+            self._write_chunk(event({'role': 'assistant', 'content': ''}))
+            for start in range(0, len(output), size):
+                if start and interval:
+                    time.sleep(interval)
+                self._write_chunk(event({'content': output[start:start + size]}))
+            usage = None
+            if (request.get('stream_options') or {}).get('include_usage'):
+                usage = self._usage(request, output, profile)
+            self._write_chunk(event({}, 'stop', usage))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端取消了请求（例如对冲请求中落败的一路）
+            self.fake.count(self._provider(), 'client_closed')
+            self.close_connection = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟的 OpenAI 兼容流式接口')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4100)
+    parser.add_argument('--first-token-ms', type=float, default=DEFAULT_PROFILE['first_token_ms'])
+    parser.add_argument('--tokens-per-sec', type=float, default=DEFAULT_PROFILE['tokens_per_sec'])
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--censor-rate', type=float, default=0.0)
+    parser.add_argument('--inspection-rate', type=float, default=0.0)
+    parser.add_argument('--profiles', default='{}', help='按云服务商覆盖的配置（JSON），例如 {"ali": {"error_rate": 0.1}}')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    profile = {
+        'first_token_ms': args.first_token_ms,
+        'tokens_per_sec': args.tokens_per_sec,
+        'error_rate': args.error_rate,
+        'rate_limit_rate': args.rate_limit_rate,
+        'censor_rate': args.censor_rate,
+        'inspection_rate': args.inspection_rate,
+    }
+    server = FakeOpenAIServer(args.host, args.port, profile, json.loads(args.profiles), args.seed)
+    print(f"\033[33m[模拟服务]OpenAI 兼容接口在 {server.base_url('<provider>')} 上启动\033[0m")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
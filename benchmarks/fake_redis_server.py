@@ -0,0 +1,314 @@
+"""
+本地模拟的 Redis 服务（RESP2 协议，单进程内存存储），用于在没有安装 Redis 时测试 cache.backend 为 redis 的多进程模式。
+
+只实现翻译缓存用到的命令：PING、AUTH、SELECT、GET、SET（支持 EX、NX）、DEL、EXISTS、HSET、HGET、HMGET、
+EXPIRE、TTL、SCAN（支持 MATCH / COUNT）、ZADD、ZREM、ZRANGEBYSCORE（支持 WITHSCORES / LIMIT）、
+ZREMRANGEBYSCORE、DBSIZE、FLUSHDB。
+
+    python benchmarks/fake_redis_server.py --port 6390
+"""
+import argparse
+import fnmatch
+import socketserver
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+class FakeRedisServer:
+    """在后台线程中运行的模拟服务，所有连接共用一份数据（不区分 SELECT 的数据库编号）"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 6390, password: Optional[str] = None):
+        self.password = password
+        self.lock = threading.Lock()
+        self.data: Dict[str, Any] = {}        # key -> str、dict（哈希）或 SortedSet
+        self.expires: Dict[str, float] = {}   # key -> 过期时间
+        self.commands = 0
+        self.server = socketserver.ThreadingTCPServer((host, port), self._handler_class(), bind_and_activate=False)
+        self.server.allow_reuse_address = True
+        self.server.daemon_threads = True
+        self.server.server_bind()
+        self.server.server_activate()
+        self.thread = None
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    @property
+    def url(self) -> str:
+        host = self.server.server_address[0]
+        auth = f":{self.password}@" if self.password else ''
+        return f"redis://{auth}{host}:{self.port}/0"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(FakeRedisHandler):
+            fake = server
+        return Handler
+
+    def _alive(self, key: str) -> bool:
+        """调用方需持有 self.lock"""
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.time():
+            self.data.pop(key, None)
+            del self.expires[key]
+        return key in self.data
+
+    def execute(self, args: List[str]) -> Any:
+        name = args[0].upper()
+        handler = getattr(self, f'cmd_{name.lower()}', None)
+        if handler is None:
+            return RespReplyError(f"ERR unknown command '{args[0]}'")
+        with self.lock:
+            self.commands += 1
+            try:
+                return handler(*args[1:])
+            except (TypeError, ValueError):
+                return RespReplyError(f"ERR wrong number of arguments or invalid value for '{args[0]}'")
+
+    def cmd_ping(self, message=None):
+        return SimpleString('PONG') if message is None else message
+
+    def cmd_auth(self, *args):
+        if self.password is None or args[-1] == self.password:
+            return SimpleString('OK')
+        return RespReplyError('WRONGPASS invalid password')
+
+    def cmd_select(self, index):
+        int(index)
+        return SimpleString('OK')
+
+    def cmd_get(self, key):
+        if not self._alive(key):
+            return None
+        value = self.data[key]
+        if isinstance(value, dict):
+            return RespReplyError('WRONGTYPE Operation against a key holding the wrong kind of value')
+        return value
+
+    def cmd_set(self, key, value, *options):
+        options = [option.upper() if option.upper() in ('EX', 'NX') else option for option in options]
+        if 'NX' in options and self._alive(key):
+            return None
+        self.data[key] = value
+        self.expires.pop(key, None)
+        if 'EX' in options:
+            self.expires[key] = time.time() + int(options[options.index('EX') + 1])
+        return SimpleString('OK')
+
+    def cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                del self.data[key]
+                self.expires.pop(key, None)
+                removed += 1
+        return removed
+
+    def cmd_exists(self, *keys):
+        return sum(1 for key in keys if self._alive(key))
+
+    def cmd_hset(self, key, *pairs):
+        if len(pairs) % 2:
+            raise ValueError
+        value = self.data.get(key) if self._alive(key) else None
+        if value is None:
+            value = self.data[key] = {}
+        added = 0
+        for field, field_value in zip(pairs[::2], pairs[1::2]):
+            added += field not in value
+            value[field] = field_value
+        return added
+
+    def cmd_hget(self, key, field):
+        return self.data[key].get(field) if self._alive(key) else None
+
+    def cmd_hmget(self, key, *fields):
+        value = self.data[key] if self._alive(key) else {}
+        return [value.get(field) for field in fields]
+
+    def cmd_expire(self, key, seconds):
+        if not self._alive(key):
+            return 0
+        self.expires[key] = time.time() + int(seconds)
+        return 1
+
+    def cmd_ttl(self, key):
+        if not self._alive(key):
+            return -2
+        expires = self.expires.get(key)
+        return -1 if expires is None else int(expires - time.time())
+
+    def cmd_scan(self, cursor, *options):
+        options = list(options)
+        pattern = options[options.index('MATCH') + 1] if 'MATCH' in options else '*'
+        count = int(options[options.index('COUNT') + 1]) if 'COUNT' in options else 10
+        keys = sorted(key for key in list(self.data) if self._alive(key))
+        start = int(cursor)
+        page = keys[start:start + count]
+        next_cursor = start + count if start + count < len(keys) else 0
+        return [str(next_cursor), [key for key in page if fnmatch.fnmatchcase(key, pattern)]]
+
+    def _zset(self, key) -> 'SortedSet':
+        value = self.data.get(key) if self._alive(key) else None
+        if value is None:
+            value = self.data[key] = SortedSet()
+        return value
+
+    def cmd_zadd(self, key, *pairs):
+        if not pairs or len(pairs) % 2:
+            raise ValueError
+        zset = self._zset(key)
+        added = 0
+        for score, member in zip(pairs[::2], pairs[1::2]):
+            added += member not in zset
+            zset[member] = float(score)
+        return added
+
+    def cmd_zrem(self, key, *members):
+        zset = self._zset(key)
+        removed = sum(1 for member in members if zset.pop(member, None) is not None)
+        if not zset:
+            del self.data[key]
+        return removed
+
+    @staticmethod
+    def _score_range(low, high):
+        def bound(value):
+            exclusive = value.startswith('(')
+            return float(value[1:] if exclusive else value), exclusive
+        (low, low_ex), (high, high_ex) = bound(low), bound(high)
+        return lambda score: (score > low if low_ex else score >= low) and (score < high if high_ex else score <= high)
+
+    def cmd_zrangebyscore(self, key, low, high, *options):
+        in_range = self._score_range(low, high)
+        zset = self.data.get(key) if self._alive(key) else None
+        items = sorted((score, member) for member, score in (zset or {}).items() if in_range(score))
+        upper = [option.upper() for option in options]
+        if 'LIMIT' in upper:
+            offset, count = int(options[upper.index('LIMIT') + 1]), int(options[upper.index('LIMIT') + 2])
+            items = items[offset:] if count < 0 else items[offset:offset + count]
+        reply = []
+        for score, member in items:
+            reply.append(member)
+            if 'WITHSCORES' in upper:
+                reply.append('%.17g' % score)
+        return reply
+
+    def cmd_zremrangebyscore(self, key, low, high):
+        in_range = self._score_range(low, high)
+        zset = self.data.get(key) if self._alive(key) else None
+        if not zset:
+            return 0
+        stale = [member for member, score in zset.items() if in_range(score)]
+        for member in stale:
+            del zset[member]
+        if not zset:
+            del self.data[key]
+        return len(stale)
+
+    def cmd_dbsize(self):
+        return sum(1 for key in list(self.data) if self._alive(key))
+
+    def cmd_flushdb(self, *args):
+        self.data.clear()
+        self.expires.clear()
+        return SimpleString('OK')
+
+
+class SortedSet(dict):
+    """有序集合：member -> score"""
+    pass
+
+
+class SimpleString(str):
+    pass
+
+
+class RespReplyError(str):
+    pass
+
+
+def encode_reply(value: Any) -> bytes:
+    if isinstance(value, RespReplyError):
+        return b'-' + value.encode('utf-8') + b'\r\n'
+    if isinstance(value, SimpleString):
+        return b'+' + value.encode('utf-8') + b'\r\n'
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, list):
+        return b'*%d\r\n' % len(value) + b''.join(encode_reply(item) for item in value)
+    data = str(value).encode('utf-8')
+    return b'$%d\r\n%s\r\n' % (len(data), data)
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    fake: FakeRedisServer = None
+
+    def read_command(self) -> Optional[List[str]]:
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            return line.decode('utf-8').split()  # 内联命令，例如 telnet 中输入的 PING
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2].decode('utf-8'))
+        return args
+
+    def handle(self):
+        authenticated = self.fake.password is None
+        while True:
+            try:
+                args = self.read_command()
+            except (OSError, ValueError):
+                return
+            if args is None:
+                return
+            if not args:
+                continue
+            if not authenticated and args[0].upper() not in ('AUTH', 'PING'):
+                reply = RespReplyError('NOAUTH Authentication required.')
+            else:
+                reply = self.fake.execute(args)
+                if args[0].upper() == 'AUTH' and not isinstance(reply, RespReplyError):
+                    authenticated = True
+            try:
+                self.wfile.write(encode_reply(reply))
+            except OSError:
+                return
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟的 Redis 服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6390)
+    parser.add_argument('--password', default=None)
+    args = parser.parse_args()
+
+    server = FakeRedisServer(args.host, args.port, args.password)
+    print(f"\033[33m[模拟服务]Redis 协议服务在 {server.url} 上启动\033[0m")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""
+大字典的加载耗时与内存占用测试：生成指定条数的随机字典（dictionary.json 格式），每种加载方式在单独的子进程中测量：
+
+- dict：只解析 JSON 并按 key 长度排序，即字典数据本身的占用（参照）
+- legacy：原先每个状态一个 dict 的匹配自动机
+- build：首次加载，解析 JSON、构建紧凑的匹配器并写出索引文件，再以内存映射方式打开
+- mmap：之后的加载，直接以内存映射方式打开索引文件
+
+报告加载耗时、加载后和匹配后的 RSS 增量、峰值 RSS 增量和平均每行的匹配耗时，并确认各方式的匹配结果一致。
+
+    python benchmarks/glossary_benchmark.py --sizes 10000,100000,1000000
+"""
+import argparse
+import hashlib
+import json
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from glossary_matcher import GlossaryMatcher  # noqa: E402
+
+KANA = 'あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん' \
+       'アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワヲン'
+MODES = ('dict', 'legacy', 'build', 'mmap')
+
+
+class LegacyMatcher:
+    """原先的实现：每个状态一个 字符 -> 状态 的 dict，仅保留构建和 find_matches 用于对比"""
+
+    def __init__(self, dictionary: Dict[str, str]):
+        self.keys = [k for k in dictionary if k]
+        self.values = [dictionary[k] for k in self.keys]
+        self.goto = [{}]
+        self.output = [-1]
+        for idx, key in enumerate(self.keys):
+            state = 0
+            for ch in key:
+                next_state = self.goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][ch] = next_state
+                    self.goto.append({})
+                    self.output.append(-1)
+                state = next_state
+            self.output[state] = idx
+        self.fail = [0] * len(self.goto)
+        self.dict_link = [-1] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self.goto[state].items():
+                queue.append(next_state)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                fail_state = self.fail[next_state]
+                self.dict_link[next_state] = fail_state if self.output[fail_state] != -1 else self.dict_link[fail_state]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def find_matches(self, text: str) -> Dict[str, str]:
+        occurrences = {}
+        goto, fail, output, dict_link, keys = self.goto, self.fail, self.output, self.dict_link, self.keys
+        state = 0
+        for pos, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            hit = state if output[state] != -1 else dict_link[state]
+            while hit != -1:
+                idx = output[hit]
+                occurrences.setdefault(idx, []).append(pos - len(keys[idx]) + 1)
+                hit = dict_link[hit]
+        matches = {}
+        covered = bytearray(len(text))
+        for idx in sorted(occurrences):
+            length = len(keys[idx])
+            for start in occurrences[idx]:
+                end = start + length
+                if covered.find(1, start, end) != -1:
+                    continue
+                covered[start:end] = b'\x01' * length
+                matches[keys[idx]] = self.values[idx]
+        return matches
+
+
+def memory_status() -> Dict[str, float]:
+    """当前 RSS 与峰值 RSS（MB），仅 Linux；其他系统安装 psutil 后只报告当前 RSS"""
+    values = {}
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('VmRSS', 'VmHWM'):
+                    values[key] = int(value.split()[0]) / 1024
+        return values
+    except OSError:
+        pass
+    try:
+        import psutil  # 非 Linux 系统需要安装：pip install psutil
+        values['VmRSS'] = psutil.Process().memory_info().rss / 1024 / 1024
+    except ImportError:
+        pass
+    return values
+
+
+def generate(workdir: Path, size: int, lines: int, seed: int):
+    """生成随机字典和测试文本（文本由字典词条和随机假名拼成）"""
+    rng = random.Random(seed)
+    dictionary = {}
+    while len(dictionary) < size:
+        key = ''.join(rng.choice(KANA) for _ in range(rng.randint(2, 8)))
+        dictionary[key] = ''.join(chr(0x4E00 + rng.randrange(6000)) for _ in range(rng.randint(2, 6)))
+    keys = list(dictionary)
+    texts = []
+    for _ in range(lines):
+        parts = [
+            rng.choice(keys) if rng.random() < 0.3 else ''.join(rng.choice(KANA) for _ in range(rng.randint(1, 4)))
+            for _ in range(rng.randint(4, 12))
+        ]
+        texts.append('、'.join(parts) + '。')
+    dict_path = workdir / f'dictionary_{size}.json'
+    dict_path.write_text(json.dumps(dictionary, ensure_ascii=False, indent=4), encoding='utf-8')
+    lines_path = workdir / f'lines_{size}.json'
+    lines_path.write_text(json.dumps(texts, ensure_ascii=False), encoding='utf-8')
+    return dict_path, lines_path
+
+
+def measure(mode: str, dict_path: Path, lines_path: Path) -> Dict[str, Any]:
+    """在子进程中执行：加载字典并匹配测试文本"""
+    texts = json.loads(lines_path.read_text(encoding='utf-8'))
+    index_path = dict_path.with_name(dict_path.name + '.idx')
+    before = memory_status()
+    start = time.perf_counter()
+    if mode == 'mmap':
+        matcher = GlossaryMatcher.open(index_path)
+    else:
+        with open(dict_path, 'r', encoding='utf8') as f:
+            dictionary = json.load(f)
+        order = sorted(dictionary, key=len, reverse=True)
+        if mode == 'dict':
+            matcher = {k: dictionary[k] for k in order}
+        elif mode == 'legacy':
+            matcher = LegacyMatcher({k: dictionary[k] for k in order})
+        else:
+            matcher = GlossaryMatcher(dictionary, order)
+            matcher.save(index_path)
+            matcher = GlossaryMatcher.open(index_path)
+        del dictionary, order
+    load_seconds = time.perf_counter() - start
+    loaded = memory_status()
+
+    result = {'mode': mode, 'entries': len(matcher), 'load_seconds': round(load_seconds, 3)}
+    if mode != 'dict':
+        digest = hashlib.sha1()
+        start = time.perf_counter()
+        for text in texts:
+            digest.update(json.dumps(matcher.find_matches(text), ensure_ascii=False).encode('utf-8'))
+        result['match_us'] = round((time.perf_counter() - start) / len(texts) * 1e6, 1)
+        result['digest'] = digest.hexdigest()
+    after = memory_status()
+    if 'VmRSS' in before:
+        result['rss_loaded_mb'] = round(loaded['VmRSS'] - before['VmRSS'], 1)
+        result['rss_matched_mb'] = round(after['VmRSS'] - before['VmRSS'], 1)
+    if 'VmHWM' in before:
+        result['peak_mb'] = round(after['VmHWM'] - before['VmRSS'], 1)
+    return result
+
+
+def run_child(mode: str, dict_path: Path, lines_path: Path) -> Optional[Dict[str, Any]]:
+    completed = subprocess.run(
+        [sys.executable, __file__, '--child', mode, str(dict_path), str(lines_path)],
+        capture_output=True, text=True, encoding='utf-8'
+    )
+    if completed.returncode != 0:
+        print(f"\033[31m[字典测试]{mode} 失败：{completed.stderr.strip()}\033[0m")
+        return None
+    return json.loads(completed.stdout)
+
+
+def print_report(results: List[Dict[str, Any]]):
+    columns = [
+        ('entries', '条目数'), ('mode', '方式'), ('load_seconds', '加载(秒)'), ('rss_loaded_mb', '加载后RSS(MB)'),
+        ('rss_matched_mb', '匹配后RSS(MB)'), ('peak_mb', '峰值RSS(MB)'), ('match_us', '匹配(us/行)'),
+    ]
+    rows = [[title for _, title in columns]]
+    for result in results:
+        rows.append(['-' if result.get(key) is None else str(result.get(key)) for key, _ in columns])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    for row in rows:
+        print('  '.join(cell.ljust(width) for cell, width in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='大字典的加载耗时与内存占用测试')
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='逗号分隔的字典条目数')
+    parser.add_argument('--modes', default=','.join(MODES), help='逗号分隔的加载方式：' + ','.join(MODES))
+    parser.add_argument('--lines', type=int, default=1000, help='匹配测试的文本行数')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='将结果写入 JSON 文件')
+    parser.add_argument('--child', nargs=3, metavar=('MODE', 'DICT', 'LINES'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mode, dict_path, lines_path = args.child
+        print(json.dumps(measure(mode, Path(dict_path), Path(lines_path))))
+        return
+
+    modes = args.modes.split(',')
+    if 'mmap' in modes and 'build' not in modes:
+        modes.insert(modes.index('mmap'), 'build')  # mmap 需要 build 写出的索引文件
+    results = []
+    with tempfile.TemporaryDirectory(prefix='xunity-glossary-') as workdir:
+        for size in (int(size) for size in args.sizes.split(',')):
+            dict_path, lines_path = generate(Path(workdir), size, args.lines, args.seed)
+            size_mb = dict_path.stat().st_size / 1024 / 1024
+            print(f"\033[33m[字典测试]{size} 条，dictionary.json {size_mb:.1f} MB\033[0m")
+            digests = set()
+            for mode in modes:
+                result = run_child(mode, dict_path, lines_path)
+                if result is None:
+                    continue
+                if 'digest' in result:
+                    digests.add(result.pop('digest'))
+                results.append(result)
+            index_path = dict_path.with_name(dict_path.name + '.idx')
+            if index_path.exists():
+                print(f"\033[33m[字典测试]索引文件 {index_path.stat().st_size / 1024 / 1024:.1f} MB\033[0m")
+            if len(digests) > 1:
+                print(f"\033[31m[字典测试]{size} 条：各方式的匹配结果不一致\033[0m")
+                sys.exit(1)
+
+    print_report(results)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+翻译记忆的查询耗时测试：用随机生成的游戏文本（含字典词条和数字）填充 TranslationMemory，
+再统计模板查询和参考译例查询（包括字典匹配和模板化）的 p50/p99 耗时。
+
+    python benchmarks/memory_benchmark.py --entries 200000 --queries 5000
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from glossary_matcher import GlossaryMatcher  # noqa: E402
+from hot_reload import DictionarySnapshot  # noqa: E402
+from translation_memory import TranslationMemory, normalize  # noqa: E402
+
+KANA = 'あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん'
+KATAKANA = 'アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワヲン'
+PATTERNS = [
+    '{name}は{num}のダメージを受けた',
+    '{name}の{word}が{num}上がった',
+    '{word}を{num}個手に入れた',
+    '{name}「{word}{word}、{word}！」',
+    '{word}{word}{word}{word}',
+]
+
+
+def random_word(rng):
+    alphabet = KANA if rng.random() < 0.5 else KATAKANA
+    return ''.join(rng.choice(alphabet) for _ in range(rng.randint(2, 6)))
+
+
+def random_line(rng, names):
+    pattern = rng.choice(PATTERNS)
+    line = pattern
+    while '{word}' in line:
+        line = line.replace('{word}', random_word(rng), 1)
+    return line.format(name=rng.choice(names), num=rng.randint(1, 9999))
+
+
+def fake_translation(text, dictionary):
+    # 模拟译文：字典词条换成译法，数字原样保留
+    for key, value in dictionary.items():
+        text = text.replace(key, value)
+    return '译:' + text
+
+
+def current_rss_mb():
+    """当前进程的内存占用（RSS，MB），仅 Linux；其他系统返回 None"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='翻译记忆查询耗时测试')
+    parser.add_argument('--entries', type=int, default=200000, help='写入的条目数')
+    parser.add_argument('--queries', type=int, default=5000, help='查询次数')
+    parser.add_argument('--few-shot', type=int, default=2, help='每次查询的参考译例数')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with open(ROOT / 'dictionary.json', 'r', encoding='utf8') as f:
+        dictionary = json.load(f)
+    dictionary = {k: dictionary[k] for k in sorted(dictionary, key=len, reverse=True)}
+    dict_snapshot = DictionarySnapshot(1, dictionary, GlossaryMatcher(dictionary), 0.0)
+    names = list(dictionary) or ['ルーシー']
+
+    rng = random.Random(args.seed)
+    rss_before = current_rss_mb()
+    memory = TranslationMemory({'max_entries': args.entries})
+    start = time.perf_counter()
+    for _ in range(args.entries):
+        line = random_line(rng, names)
+        memory.add(line, fake_translation(line, dictionary), dict_snapshot)
+    build_seconds = time.perf_counter() - start
+    rss_after = current_rss_mb()
+
+    lookup_times = []
+    example_times = []
+    hits = 0
+    examples = 0
+    for _ in range(args.queries):
+        line = random_line(rng, names)
+        start = time.perf_counter()
+        key, slots = normalize(line, dict_snapshot)
+        translation = memory.lookup(key, slots)
+        lookup_times.append(time.perf_counter() - start)
+        if translation is not None:
+            hits += 1
+            continue
+        start = time.perf_counter()
+        examples += len(memory.examples(key, line, args.few_shot, 0.5))
+        example_times.append(time.perf_counter() - start)
+
+    stats = memory.get_stats()
+    print(f"条目 {stats['indexed']}，模板 {stats['templates']}，写入耗时 {build_seconds:.1f} 秒"
+          f"（{build_seconds / args.entries * 1e6:.0f} us/条）")
+    if rss_before is not None:
+        print(f"内存占用增加 {rss_after - rss_before:.0f} MB（{(rss_after - rss_before) * 1024 * 1024 / args.entries:.0f} 字节/条）")
+    print(f"模板查询：命中 {hits}/{args.queries}，p50 {percentile(lookup_times, 0.5) * 1e6:.0f} us，"
+          f"p99 {percentile(lookup_times, 0.99) * 1e6:.0f} us")
+    if example_times:
+        print(f"参考译例：{len(example_times)} 次查询共找到 {examples} 条，p50 {percentile(example_times, 0.5) * 1e6:.0f} us，"
+              f"p99 {percentile(example_times, 0.99) * 1e6:.0f} us")
+
+
+if __name__ == '__main__':
+    main()
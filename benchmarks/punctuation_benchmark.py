@@ -0,0 +1,239 @@
+"""
+标点处理的微基准：比较 text_processing 中预编译的实现与原先逐条检查的实现（下方 reference_* 函数，原样保留）的耗时。
+两者输出一致由 tests/test_text_processing.py 在随机生成的文本上检查，随机文本的生成函数也在这里。
+
+    python benchmarks/punctuation_benchmark.py --number 2000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from text_processing import (  # noqa: E402
+    PAIRS_TO_CHECK, SPECIAL_CHARS, combined_chars,
+    handle_paired_symbols, remove_text_special_chars, restore_text_special_chars, restore_paired_symbols
+)
+
+SYMBOLS = sorted(set(combined_chars) | set(SPECIAL_CHARS))
+KANA = 'あいうえおかきくけこさしすせそアイウエオ漢字文本abcXYZ123\n\t'
+
+
+# ---- 原实现（用于对比） ----
+
+def reference_handle_paired_symbols(text: str) -> Tuple[str, List[tuple]]:
+    """检测并去除成对符号"""
+    removed_symbols = []
+    
+    while True:
+        removed = False
+        # 优先检查成对符号（开头和结尾刚好是一对）
+        for start_char, end_char in PAIRS_TO_CHECK:
+            if text.startswith(start_char) and text.endswith(end_char):
+                text = text[len(start_char):-len(end_char)]
+                removed_symbols.append(("pair", start_char, end_char))
+                removed = True
+                break
+        if removed:
+            continue
+            
+        # 检查开头单边符号（英文引号特殊处理）
+        for start_char, end_char in PAIRS_TO_CHECK:
+            if text.startswith(start_char):
+                # 英文引号特殊规则
+                if start_char == '"':
+                    quote_count = text.count('"')
+                    if quote_count % 2 == 1:  # 单数则去除
+                        text = text[len(start_char):]
+                        removed_symbols.append(("start", start_char))
+                        removed = True
+                        break
+                else:
+                    # 其他符号保持原规则
+                    start_count = text.count(start_char)
+                    end_count = text.count(end_char)
+                    if start_count > end_count:
+                        text = text[len(start_char):]
+                        removed_symbols.append(("start", start_char))
+                        removed = True
+                        break
+                        
+        # 检查结尾单边符号（英文引号特殊处理）
+        for start_char, end_char in PAIRS_TO_CHECK:
+            if text.endswith(end_char):
+                # 英文引号特殊规则
+                if end_char == '"':
+                    quote_count = text.count('"')
+                    if quote_count % 2 == 1:  # 单数则去除
+                        text = text[:-len(end_char)]
+                        removed_symbols.append(("end", end_char))
+                        removed = True
+                        break
+                else:
+                    # 其他符号保持原规则
+                    start_count = text.count(start_char)
+                    end_count = text.count(end_char)
+                    if end_count > start_count:
+                        text = text[:-len(end_char)]
+                        removed_symbols.append(("end", end_char))
+                        removed = True
+                        break
+                        
+        if not removed:
+            break
+    
+    return text, removed_symbols
+
+def reference_remove_text_special_chars(text: str) -> Tuple[str, List[str], List[str]]:
+    """检测句首和句末特殊符号，不做删除，返回完整文本、句首特殊符号列表、句末特殊符号列表"""
+
+    # 检测句首特殊符号
+    text_start_special_chars = []
+    i = 0
+    while i < len(text) and text[i] in combined_chars:
+        text_start_special_chars.append(text[i])
+        i += 1
+
+    # 检测句末特殊符号
+    text_end_special_chars = []
+    i = len(text) - 1
+    while i >= 0 and text[i] in combined_chars:
+        text_end_special_chars.insert(0, text[i])
+        i -= 1
+
+    return text, text_start_special_chars, text_end_special_chars
+
+
+def reference_restore_text_special_chars(
+    text: str,
+    text_start_special_chars: List[str],
+    text_end_special_chars: List[str]
+) -> str:
+    """去除当前文本句首/句末特殊符号，然后添加指定的句首/句末特殊符号"""
+
+    # 去除现有句首特殊符号
+    i = 0
+    while i < len(text) and text[i] in combined_chars:
+        i += 1
+    text = text[i:]
+
+    # 去除现有句末特殊符号
+    i = len(text) - 1
+    while i >= 0 and text[i] in combined_chars:
+        i -= 1
+    text = text[:i+1]
+
+    # 添加指定的特殊符号
+    text = ''.join(text_start_special_chars) + text + ''.join(text_end_special_chars)
+    return text
+
+def reference_restore_paired_symbols(text: str, removed_symbols: List[tuple]) -> str:
+    """还原成对符号"""
+    # 按相反顺序重新添加符号
+    for symbol_info in reversed(removed_symbols):
+        if symbol_info[0] == "pair":
+            _, start_char, end_char = symbol_info
+            text = start_char + text + end_char
+        elif symbol_info[0] == "start":
+            _, char = symbol_info
+            text = char + text
+        else:  # "end"
+            _, char = symbol_info
+            text = text + char
+    return text
+
+
+# ---- 随机文本（tests/test_text_processing.py 也使用） ----
+
+def random_text(rng: random.Random) -> str:
+    """随机文本：普通字符、特殊符号和成对符号混合，并经常在两端叠加多层括号"""
+    length = rng.choice([0, 1, 2, 3, 5, 8, 13, 30])
+    symbol_rate = rng.choice([0.1, 0.4, 0.8, 1.0])
+    chars = [rng.choice(SYMBOLS) if rng.random() < symbol_rate else rng.choice(KANA) for _ in range(length)]
+    text = ''.join(chars)
+    for _ in range(rng.choice([0, 0, 1, 2, 4])):
+        start_char, end_char = rng.choice(PAIRS_TO_CHECK)
+        text = rng.choice([start_char + text + end_char, start_char + text, text + end_char])
+    return text
+
+
+def random_translation(rng: random.Random) -> str:
+    """模拟模型返回的译文：两端可能带有或缺少特殊符号"""
+    return ''.join(rng.choice(SYMBOLS) for _ in range(rng.randint(0, 3))) \
+        + random_text(rng) \
+        + ''.join(rng.choice(SYMBOLS) for _ in range(rng.randint(0, 3)))
+
+
+def random_chunks(rng: random.Random, text: str) -> List[str]:
+    chunks = []
+    i = 0
+    while i < len(text):
+        size = rng.randint(1, 4)
+        chunks.append(text[i:i + size])
+        i += size
+    return chunks
+
+
+# ---- 微基准 ----
+
+def benchmark_corpus(rng: random.Random) -> List[str]:
+    corpus = [random_text(rng) for _ in range(200)]
+    corpus += [
+        '「こんにちは、ルーシーだよ！」',
+        '『「（"深くネストした括弧"）」』',
+        '「' * 40 + 'ネスト' + '」' * 40,
+        '「' * 40 + '閉じていない括弧',
+        '……！？' + 'あ' * 200 + '。。。♡',
+    ]
+    return corpus
+
+
+def time_call(func: Callable[[str], object], corpus: List[str], number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        for text in corpus:
+            func(text)
+    return (time.perf_counter() - start) / (number * len(corpus))
+
+
+def pipeline(handle, remove, restore_special, restore_paired) -> Callable[[str], str]:
+    """单个段落的完整处理：预处理 + 还原（以原文充当译文）"""
+    def run(text: str) -> str:
+        stripped, removed_symbols = handle(text)
+        stripped, start_chars, end_chars = remove(stripped)
+        return restore_paired(restore_special(stripped, start_chars, end_chars), removed_symbols)
+    return run
+
+
+def run_benchmark(number: int, seed: int):
+    corpus = benchmark_corpus(random.Random(seed))
+    rows: List[Tuple[str, Callable, Callable]] = [
+        ('handle_paired_symbols', reference_handle_paired_symbols, handle_paired_symbols),
+        ('remove_text_special_chars', reference_remove_text_special_chars, remove_text_special_chars),
+        ('段落完整处理',
+         pipeline(reference_handle_paired_symbols, reference_remove_text_special_chars,
+                  reference_restore_text_special_chars, reference_restore_paired_symbols),
+         pipeline(handle_paired_symbols, remove_text_special_chars,
+                  restore_text_special_chars, restore_paired_symbols)),
+    ]
+    print(f"{'函数':<28}{'原实现 (µs)':>14}{'新实现 (µs)':>14}{'加速':>8}")
+    for name, reference, current in rows:
+        before = time_call(reference, corpus, number) * 1e6
+        after = time_call(current, corpus, number) * 1e6
+        print(f"{name:<28}{before:>14.2f}{after:>14.2f}{before / after:>7.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='标点处理的微基准')
+    parser.add_argument('--number', type=int, default=200, help='微基准中语料的重复次数')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    run_benchmark(args.number, args.seed)
+
+
+if __name__ == '__main__':
+    main()
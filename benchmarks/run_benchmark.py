@@ -0,0 +1,383 @@
+"""
+离线性能测试：启动本地模拟的云服务商接口和翻译服务（run_app.py），按 XUnity 的典型请求模式发送请求，
+报告吞吐量、延迟分位数、线程数和内存占用，便于比较不同服务器模式和缓存配置。
+
+    python benchmarks/run_benchmark.py --modes gevent,async --scenarios burst,duplicates,long
+    python benchmarks/run_benchmark.py --no-cache --first-token-ms 800 --json result.json
+    python benchmarks/run_benchmark.py --workers 4 --redis
+
+测试在临时目录中运行，使用单独的 config.json 和缓存数据库，不会改动项目目录中的文件。
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from fake_openai_server import FakeOpenAIServer
+from fake_redis_server import FakeRedisServer
+
+ROOT = Path(__file__).resolve().parent.parent
+SERVICE_URL = 'http://127.0.0.1:4000'
+
+NAMES = ['ルーシー', 'アリス', 'カイト', 'ミナ', '先生', 'お姉ちゃん']
+PHRASES = [
+    'おはようございます', '今日はいい天気ですね', 'どこへ行くの？', 'ちょっと待って！', 'ありがとう',
+    'この剣を受け取ってください', '宝箱を開けた', 'HPが回復した', 'レベルが上がった！', 'クエストを受注しますか？',
+    '扉には鍵がかかっている', 'もう少しだけ一緒にいたい', '本当にそれでいいの？', '気をつけて行ってらっしゃい',
+]
+UI_LABELS = ['はい', 'いいえ', '戻る', 'セーブ', 'ロード', '設定', 'アイテム', 'スキル', '装備', 'ステータス']
+
+
+def make_line(rng: random.Random, index: int) -> str:
+    """生成一行类似游戏对话的文本，index 保证文本互不相同"""
+    name = rng.choice(NAMES)
+    phrase = rng.choice(PHRASES)
+    kind = rng.random()
+    if kind < 0.4:
+        return f"{name}「{phrase}」#{index}"
+    if kind < 0.7:
+        return f"【{name}】{phrase}……#{index}"
+    return f"{phrase}（{rng.choice(UI_LABELS)}）#{index}"
+
+
+def make_paragraphs(rng: random.Random, index: int) -> str:
+    """生成多段长文本（剧情对话、物品说明等）"""
+    return '\n'.join(make_line(rng, index * 100 + i) for i in range(rng.randint(4, 10)))
+
+
+class Scenario:
+    """一个测试场景：按波次生成请求，每个波次内的请求并发发送"""
+
+    def __init__(self, name: str, description: str, waves: List[List[str]], pause: float = 0.0):
+        self.name = name
+        self.description = description
+        self.waves = waves
+        self.pause = pause  # 波次之间的间隔（秒），模拟玩家在场景之间的停留
+
+
+def build_scenarios(names: List[str], requests: int, seed: int) -> List[Scenario]:
+    rng = random.Random(seed)
+    scenarios = []
+    for name in names:
+        if name == 'burst':
+            # 场景加载：短时间内大量互不相同的短文本（UI、物品名、对话）同时到达
+            texts = [make_line(rng, i) if rng.random() < 0.7 else f"{rng.choice(UI_LABELS)}#{i}" for i in range(requests)]
+            wave_size = max(1, requests // 5)
+            waves = [texts[i:i + wave_size] for i in range(0, len(texts), wave_size)]
+            scenarios.append(Scenario('burst', '场景加载突发（短文本，每波并发）', waves, pause=0.5))
+        elif name == 'duplicates':
+            # 重复文本：界面刷新时同一批文本被反复请求
+            hot = [make_line(rng, 10000 + i) for i in range(max(1, requests // 10))]
+            texts = [rng.choice(hot) if rng.random() < 0.8 else make_line(rng, 20000 + i) for i in range(requests)]
+            wave_size = max(1, requests // 5)
+            waves = [texts[i:i + wave_size] for i in range(0, len(texts), wave_size)]
+            scenarios.append(Scenario('duplicates', '重复文本（80% 来自少量热点文本）', waves, pause=0.2))
+        elif name == 'long':
+            # 长文本：多段剧情文本，逐个到达
+            count = max(1, requests // 5)
+            texts = [make_paragraphs(rng, 30000 + i) for i in range(count)]
+            waves = [texts[i:i + 4] for i in range(0, len(texts), 4)]
+            scenarios.append(Scenario('long', '多段长文本（4~10 段）', waves))
+        else:
+            raise ValueError(f"未知的测试场景: {name}")
+    return scenarios
+
+
+class ProcessSampler:
+    """定期采样服务进程（多进程模式下包括所有工作进程）的线程数和内存（RSS）之和"""
+
+    def __init__(self, pid: int, interval: float = 0.2):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _process_tree(self) -> List[int]:
+        pids = [self.pid]
+        for pid in pids:
+            children_path = Path(f"/proc/{pid}/task/{pid}/children")
+            try:
+                pids.extend(int(child) for child in children_path.read_text().split())
+            except OSError:
+                pass
+        return pids
+
+    def read(self) -> Optional[Dict[str, float]]:
+        if Path(f"/proc/{self.pid}/status").exists():
+            values = {}
+            for pid in self._process_tree():
+                try:
+                    lines = Path(f"/proc/{pid}/status").read_text().splitlines()
+                except OSError:
+                    continue
+                for line in lines:
+                    key, _, value = line.partition(':')
+                    if key == 'VmRSS':
+                        values['rss_mb'] = values.get('rss_mb', 0) + int(value.split()[0]) / 1024
+                    elif key == 'Threads':
+                        values['threads'] = values.get('threads', 0) + int(value)
+            return values or None
+        try:
+            import psutil  # 非 Linux 系统需要安装：pip install psutil
+        except ImportError:
+            return None
+        try:
+            root = psutil.Process(self.pid)
+            processes = [root] + root.children(recursive=True)
+            return {
+                'rss_mb': sum(process.memory_info().rss for process in processes) / 1024 / 1024,
+                'threads': sum(process.num_threads() for process in processes),
+            }
+        except psutil.Error:
+            return None
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            sample = self.read()
+            if sample:
+                self.samples.append(sample)
+
+    def start(self):
+        self.samples = []
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> Dict[str, Optional[float]]:
+        self.stop_event.set()
+        self.thread.join()
+        sample = self.read()
+        if sample:
+            self.samples.append(sample)
+        if not self.samples:
+            return {'threads_max': None, 'rss_max_mb': None}
+        return {
+            'threads_max': max(s.get('threads', 0) for s in self.samples),
+            'rss_max_mb': round(max(s.get('rss_mb', 0) for s in self.samples), 1),
+        }
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def send_request(text: str, timeout: float):
+    url = f"{SERVICE_URL}/translate?text={urllib.parse.quote(text)}"
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = 0
+    return status, time.perf_counter() - start
+
+
+def run_scenario(scenario: Scenario, sampler: ProcessSampler, concurrency: int, timeout: float) -> Dict[str, Any]:
+    latencies = []
+    statuses: Dict[str, int] = {}
+    sampler.start()
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for index, wave in enumerate(scenario.waves):
+            if index and scenario.pause:
+                time.sleep(scenario.pause)
+            for status, latency in executor.map(lambda text: send_request(text, timeout), wave):
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if status == 200:
+                    latencies.append(latency)
+    elapsed = time.perf_counter() - start
+    process_stats = sampler.stop()
+
+    total = sum(statuses.values())
+    return {
+        'scenario': scenario.name,
+        'description': scenario.description,
+        'requests': total,
+        'ok': statuses.get('200', 0),
+        'statuses': statuses,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 2) if elapsed > 0 else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+        **process_stats,
+    }
+
+
+def write_config(workdir: Path, fake: FakeOpenAIServer, args) -> None:
+    config = json.loads((ROOT / 'config.json').read_text(encoding='utf-8'))
+    for provider, settings in config['api_keys'].items():
+        settings['api_key'] = 'sk-benchmark'
+        settings['base_url'] = fake.base_url(provider)
+    config['dict_path'] = './dictionary.json'
+    config.setdefault('cache', {})['enabled'] = not args.no_cache
+    config['cache']['db_path'] = './translation_cache.db'
+    if args.redis_url:
+        config['cache'].update(backend='redis', redis_url=args.redis_url)
+    config.setdefault('server', {}).update(host='127.0.0.1', port=4000, workers=args.workers)
+    config.setdefault('server', {})['request_timeout'] = args.timeout
+    for override in args.set or []:
+        # --set server.max_workers=64
+        path, _, value = override.partition('=')
+        section = config
+        keys = path.split('.')
+        for key in keys[:-1]:
+            section = section.setdefault(key, {})
+        section[keys[-1]] = json.loads(value)
+    (workdir / 'config.json').write_text(json.dumps(config, ensure_ascii=False, indent=2), encoding='utf-8')
+    shutil.copy(ROOT / 'dictionary.json', workdir / 'dictionary.json')
+
+
+def wait_for_service(process: subprocess.Popen, timeout: float = 30) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(f"{SERVICE_URL}/stats", timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except Exception:
+            time.sleep(0.2)
+    return False
+
+
+def port_in_use(port: int) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        return sock.connect_ex(('127.0.0.1', port)) == 0
+
+
+def run_mode(mode: str, fake: FakeOpenAIServer, scenarios: List[Scenario], args) -> List[Dict[str, Any]]:
+    workdir = Path(tempfile.mkdtemp(prefix=f'xunity-bench-{mode}-'))
+    write_config(workdir, fake, args)
+    log_path = workdir / 'service.log'
+    with open(log_path, 'w', encoding='utf-8') as log:
+        process = subprocess.Popen(
+            [sys.executable, str(ROOT / 'run_app.py'), '--server', mode],
+            cwd=workdir, stdout=log, stderr=subprocess.STDOUT,
+            env={**os.environ, 'PYTHONIOENCODING': 'utf-8'},
+        )
+        try:
+            if not wait_for_service(process):
+                print(f"\033[31m[性能测试]{mode} 模式启动失败，日志: {log_path}\033[0m")
+                return []
+            sampler = ProcessSampler(process.pid)
+            idle = sampler.read() or {}
+            results = []
+            for scenario in scenarios:
+                result = run_scenario(scenario, sampler, args.concurrency, args.timeout + 5)
+                result['mode'] = mode
+                result['idle_threads'] = idle.get('threads')
+                result['idle_rss_mb'] = round(idle['rss_mb'], 1) if 'rss_mb' in idle else None
+                results.append(result)
+                print(f"\033[33m[性能测试]{mode}/{scenario.name} 完成：{result['throughput_rps']} req/s，"
+                      f"p95 {result['p95_ms']} ms\033[0m")
+            return results
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            if not args.keep_workdir:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_report(results: List[Dict[str, Any]]):
+    columns = [
+        ('mode', '模式'), ('scenario', '场景'), ('requests', '请求数'), ('ok', '成功'),
+        ('throughput_rps', '吞吐(req/s)'), ('p50_ms', 'p50(ms)'), ('p95_ms', 'p95(ms)'), ('p99_ms', 'p99(ms)'),
+        ('threads_max', '最大线程'), ('rss_max_mb', '最大RSS(MB)'),
+    ]
+    rows = [[title for _, title in columns]]
+    for result in results:
+        rows.append(['-' if result.get(key) is None else str(result.get(key)) for key, _ in columns])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    for row in rows:
+        print('  '.join(cell.ljust(width) for cell, width in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='翻译服务离线性能测试')
+    parser.add_argument('--modes', default='gevent', help='逗号分隔的服务器模式：gevent,async')
+    parser.add_argument('--scenarios', default='burst,duplicates,long', help='逗号分隔的测试场景：burst,duplicates,long')
+    parser.add_argument('--requests', type=int, default=200, help='每个场景的请求数（long 场景为其 1/5）')
+    parser.add_argument('--concurrency', type=int, default=50, help='客户端并发数')
+    parser.add_argument('--timeout', type=float, default=30, help='单个请求的超时时间（秒）')
+    parser.add_argument('--no-cache', action='store_true', help='关闭翻译缓存')
+    parser.add_argument('--workers', type=int, default=1, help='翻译服务的工作进程数（多进程模式）')
+    parser.add_argument('--redis', action='store_true', help='启动模拟的 Redis 服务作为共享缓存（cache.backend=redis）')
+    parser.add_argument('--set', action='append', metavar='KEY=JSON', help='覆盖配置项，例如 --set server.max_workers=64')
+    parser.add_argument('--fake-port', type=int, default=4100)
+    parser.add_argument('--first-token-ms', type=float, default=300)
+    parser.add_argument('--tokens-per-sec', type=float, default=60)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--censor-rate', type=float, default=0.0)
+    parser.add_argument('--inspection-rate', type=float, default=0.0)
+    parser.add_argument('--profiles', default='{}', help='按云服务商覆盖的模拟配置（JSON）')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子，保证多次测试的请求序列相同')
+    parser.add_argument('--json', help='将结果写入 JSON 文件')
+    parser.add_argument('--keep-workdir', action='store_true', help='保留临时目录（配置、日志和缓存数据库）')
+    args = parser.parse_args()
+
+    if port_in_use(4000):
+        print("\033[31m[性能测试]端口 4000 已被占用，请先停止正在运行的翻译服务\033[0m")
+        sys.exit(1)
+
+    profile = {
+        'first_token_ms': args.first_token_ms,
+        'tokens_per_sec': args.tokens_per_sec,
+        'error_rate': args.error_rate,
+        'rate_limit_rate': args.rate_limit_rate,
+        'censor_rate': args.censor_rate,
+        'inspection_rate': args.inspection_rate,
+    }
+    fake = FakeOpenAIServer('127.0.0.1', args.fake_port, profile, json.loads(args.profiles), args.seed).start()
+    scenarios = build_scenarios(args.scenarios.split(','), args.requests, args.seed)
+    redis = FakeRedisServer('127.0.0.1', 0).start() if args.redis else None
+    args.redis_url = redis.url if redis is not None else None
+
+    results = []
+    try:
+        for mode in args.modes.split(','):
+            results.extend(run_mode(mode, fake, scenarios, args))
+    finally:
+        fake.stop()
+        if redis is not None:
+            redis.stop()
+
+    print()
+    print_report(results)
+    print(f"\n\033[33m[性能测试]模拟服务请求统计: {json.dumps(fake.get_stats(), ensure_ascii=False)}\033[0m")
+    if args.json:
+        report = {
+            'settings': {k: v for k, v in vars(args).items() if k != 'json'},
+            'fake_server': fake.get_stats(),
+            'results': results,
+        }
+        Path(args.json).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+if __name__ == '__main__':
+    main()
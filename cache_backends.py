@@ -0,0 +1,360 @@
+import hashlib
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from translation_log import log
+
+
+class CacheBackendError(Exception):
+    """共享缓存存储读写失败"""
+    pass
+
+
+class SQLiteBackend:
+    """本机共享的 SQLite 存储（WAL 模式，多个工作进程可同时读写同一个文件）"""
+    name = 'sqlite'
+
+    def __init__(self, db_path: str, ttl: float = 0):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        try:
+            path = Path(db_path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.db = sqlite3.connect(str(path), check_same_thread=False, timeout=5)
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('PRAGMA synchronous=NORMAL')
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS translations ('
+                'key TEXT PRIMARY KEY, source TEXT NOT NULL, translation TEXT NOT NULL, created REAL NOT NULL)'
+            )
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS memory_templates ('
+                'key TEXT PRIMARY KEY, pieces TEXT NOT NULL, created REAL NOT NULL DEFAULT 0)'
+            )
+            # 旧版本创建的模板表没有写入时间，补上后旧模板按已过期处理
+            columns = [row[1] for row in self.db.execute('PRAGMA table_info(memory_templates)')]
+            if 'created' not in columns:
+                self.db.execute('ALTER TABLE memory_templates ADD COLUMN created REAL NOT NULL DEFAULT 0')
+            self.db.commit()
+            # 启动时顺便清理过期条目
+            if ttl > 0:
+                self.db.execute('DELETE FROM translations WHERE created < ?', (time.time() - ttl,))
+                self.db.execute('DELETE FROM memory_templates WHERE created < ?', (time.time() - ttl,))
+                self.db.commit()
+        except (OSError, sqlite3.Error) as e:
+            raise CacheBackendError(e) from e
+
+    def _execute(self, sql: str, params=(), many: bool = False, commit: bool = False):
+        try:
+            with self.lock:
+                cursor = self.db.executemany(sql, params) if many else self.db.execute(sql, params)
+                rows = cursor.fetchall() if not commit else cursor.rowcount
+                if commit:
+                    self.db.commit()
+                return rows
+        except sqlite3.Error as e:
+            raise CacheBackendError(e) from e
+
+    def get(self, key: str) -> Optional[Tuple[str, str, float]]:
+        """返回 (原文, 译文, 写入时间)"""
+        rows = self._execute('SELECT source, translation, created FROM translations WHERE key = ?', (key,))
+        return rows[0] if rows else None
+
+    def put_many(self, rows: List[Tuple[str, str, str, float]]):
+        """写入 (key, 原文, 译文, 写入时间)"""
+        self._execute(
+            'INSERT OR REPLACE INTO translations (key, source, translation, created) VALUES (?, ?, ?, ?)',
+            rows, many=True, commit=True
+        )
+
+    def delete_containing(self, terms: Iterable[str], once_key: Optional[str] = None) -> int:
+        removed = 0
+        for term in terms:
+            removed += max(self._execute('DELETE FROM translations WHERE instr(source, ?) > 0', (term,), commit=True), 0)
+        return removed
+
+    def entries(self, created_after: float, page_size: int = 1000) -> Iterator[Tuple[str, str]]:
+        """按写入顺序分页读取 (原文, 译文)，不会一次把整个表读入内存"""
+        last_rowid = 0
+        while True:
+            rows = self._execute(
+                'SELECT rowid, source, translation FROM translations WHERE rowid > ? AND created >= ? '
+                'ORDER BY rowid LIMIT ?', (last_rowid, created_after, page_size)
+            )
+            for _, source, translation in rows:
+                yield source, translation
+            if len(rows) < page_size:
+                return
+            last_rowid = rows[-1][0]
+
+    def get_template(self, key: str) -> Optional[str]:
+        created_after = time.time() - self.ttl if self.ttl > 0 else 0
+        rows = self._execute('SELECT pieces FROM memory_templates WHERE key = ? AND created >= ?', (key, created_after))
+        return rows[0][0] if rows else None
+
+    def put_template(self, key: str, pieces: str):
+        self._execute(
+            'INSERT OR REPLACE INTO memory_templates (key, pieces, created) VALUES (?, ?, ?)',
+            (key, pieces, time.time()), commit=True
+        )
+
+    def describe(self) -> str:
+        return f"SQLite {self.db_path}"
+
+
+INVALIDATE_LOCK_TTL = 3600  # 同一次字典修改的失效锁保留秒数
+
+
+class RespError(CacheBackendError):
+    """Redis 返回的错误回复"""
+    pass
+
+
+class RespConnection:
+    """最小的 Redis 协议（RESP2）连接，只实现缓存需要的命令，不依赖 redis 库"""
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('rb')
+
+    @staticmethod
+    def encode(*args) -> bytes:
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        return b''.join(parts)
+
+    def read_reply(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError('连接已关闭')
+        kind, body = line[:1], line[1:-2]
+        if kind == b'+':
+            return body.decode('utf-8')
+        if kind == b'-':
+            return RespError(body.decode('utf-8'))
+        if kind == b':':
+            return int(body)
+        if kind == b'$':
+            length = int(body)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2].decode('utf-8')
+        if kind == b'*':
+            length = int(body)
+            return None if length < 0 else [self.read_reply() for _ in range(length)]
+        raise ConnectionError(f'无法解析的回复: {line!r}')
+
+    def pipeline(self, commands: List[tuple]) -> list:
+        """一次发送多条命令再依次读取回复"""
+        self.sock.sendall(b''.join(self.encode(*command) for command in commands))
+        return [self.read_reply() for _ in commands]
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisBackend:
+    """Redis（或兼容 Redis 协议的存储）后端，多个进程/多台机器共享同一份缓存
+
+    每条译文保存为哈希 {prefix}t:{key}（source、translation、created），翻译记忆模板保存为 {prefix}m:{key}，
+    过期由 Redis 的 EXPIRE 处理。有序集合 {prefix}idx 按写入时间记录各条译文的 key，用于按写入顺序分页遍历。
+    """
+    name = 'redis'
+
+    def __init__(self, url: str = 'redis://127.0.0.1:6379/0', ttl: float = 0, prefix: str = 'xunity:',
+                 timeout: float = 2, max_idle: int = 16):
+        parsed = urlparse(url)
+        self.url = url
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.ttl = int(ttl) if ttl > 0 else 0
+        self.prefix = prefix
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.idle: List[RespConnection] = []
+        self.lock = threading.Lock()
+        self.index = f"{prefix}idx"
+        self.indexed = False  # 是否已确认写入顺序索引已建立（旧版本写入的数据没有索引）
+        self.execute(('PING',))
+
+    def _connect(self) -> RespConnection:
+        connection = RespConnection(self.host, self.port, self.timeout)
+        setup = []
+        if self.password:
+            setup.append(('AUTH', self.password))
+        if self.db:
+            setup.append(('SELECT', self.db))
+        for reply in connection.pipeline(setup) if setup else []:
+            if isinstance(reply, RespError):
+                connection.close()
+                raise reply
+        return connection
+
+    def pipeline(self, commands: List[tuple]) -> list:
+        """从连接池取一个连接执行命令；连接出错时丢弃，错误回复转换为 CacheBackendError"""
+        with self.lock:
+            connection = self.idle.pop() if self.idle else None
+        try:
+            if connection is None:
+                connection = self._connect()
+            replies = connection.pipeline(commands)
+        except (OSError, ConnectionError, ValueError) as e:
+            if connection is not None:
+                connection.close()
+            raise CacheBackendError(e) from e
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(connection)
+                connection = None
+        if connection is not None:
+            connection.close()
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    def execute(self, command: tuple):
+        return self.pipeline([command])[0]
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}t:{key}"
+
+    def get(self, key: str) -> Optional[Tuple[str, str, float]]:
+        source, translation, created = self.execute(('HMGET', self._key(key), 'source', 'translation', 'created'))
+        if translation is None:
+            return None
+        return source, translation, float(created)
+
+    def put_many(self, rows: List[Tuple[str, str, str, float]]):
+        commands = []
+        for i, (key, source, translation, created) in enumerate(rows):
+            commands.append(('HSET', self._key(key), 'source', source, 'translation', translation, 'created', created))
+            # 同一批写入的条目写入时间相同，按批内顺序错开，遍历顺序与 SQLite 的 rowid 顺序一致
+            commands.append(('ZADD', self.index, repr(created + i * 1e-6), key))
+            if self.ttl:
+                commands.append(('EXPIRE', self._key(key), self.ttl))
+        if commands:
+            self.pipeline(commands)
+
+    def _scan(self, pattern: str):
+        cursor = '0'
+        while True:
+            cursor, keys = self.execute(('SCAN', cursor, 'MATCH', pattern, 'COUNT', 500))
+            if keys:
+                yield keys
+            if cursor == '0':
+                return
+
+    def delete_containing(self, terms: Iterable[str], once_key: Optional[str] = None) -> int:
+        """删除原文包含任一词条的缓存（需要 SCAN 全部条目）
+
+        传入 once_key 时（例如字典文件的签名），多个工作进程对同一次字典修改只由第一个拿到锁的进程扫描，
+        其余进程直接返回 0。
+        """
+        terms = sorted(set(terms))
+        if once_key is not None:
+            digest = hashlib.sha1('\0'.join([once_key] + terms).encode('utf-8')).hexdigest()
+            lock = ('SET', f"{self.prefix}lock:invalidate:{digest}", os.getpid(), 'NX', 'EX', INVALIDATE_LOCK_TTL)
+            if self.execute(lock) is None:
+                return 0
+        removed = 0
+        for keys in self._scan(f"{self.prefix}t:*"):
+            sources = self.pipeline([('HGET', key, 'source') for key in keys])
+            stale = [key for key, source in zip(keys, sources) if source and any(term in source for term in terms)]
+            if stale:
+                removed += self.pipeline([
+                    ('DEL', *stale), ('ZREM', self.index, *(key[len(self.prefix) + 2:] for key in stale))
+                ])[0]
+        return removed
+
+    def _ensure_index(self):
+        """从已有的译文补建写入顺序索引（每个存储只补建一次，完成后写入标记 {prefix}idx:ready）"""
+        if self.indexed:
+            return
+        if not self.execute(('EXISTS', f"{self.index}:ready")):
+            for keys in self._scan(f"{self.prefix}t:*"):
+                created = self.pipeline([('HGET', key, 'created') for key in keys])
+                members = [
+                    item for key, value in zip(keys, created) if value is not None
+                    for item in (value, key[len(self.prefix) + 2:])
+                ]
+                if members:
+                    self.execute(('ZADD', self.index, *members))
+            self.execute(('SET', f"{self.index}:ready", 1))
+        self.indexed = True
+
+    def entries(self, created_after: float, page_size: int = 1000) -> Iterator[Tuple[str, str]]:
+        """按写入顺序分页读取 (原文, 译文)，与 SQLite 后端的顺序一致"""
+        self._ensure_index()
+        if self.ttl:
+            # 译文已由 Redis 过期删除，索引中对应的 key 一并清理
+            self.execute(('ZREMRANGEBYSCORE', self.index, '-inf', f'({time.time() - self.ttl}'))
+        min_score, skip = created_after, 0
+        while True:
+            reply = self.execute((
+                'ZRANGEBYSCORE', self.index, min_score, '+inf', 'WITHSCORES', 'LIMIT', skip, page_size
+            ))
+            members, scores = reply[0::2], reply[1::2]
+            if members:
+                rows = self.pipeline([('HMGET', self._key(member), 'source', 'translation') for member in members])
+                for source, translation in rows:
+                    if translation is not None:
+                        yield source, translation
+            if len(members) < page_size:
+                return
+            # 同一批写入的条目写入时间相同：下一页从最后一个写入时间开始，跳过已读取的同时间条目
+            last = scores[-1]
+            same = 0
+            for score in reversed(scores):
+                if score != last:
+                    break
+                same += 1
+            if min_score == last:
+                skip += same
+            else:
+                min_score, skip = last, same
+
+    def get_template(self, key: str) -> Optional[str]:
+        return self.execute(('GET', f"{self.prefix}m:{key}"))
+
+    def put_template(self, key: str, pieces: str):
+        command = ('SET', f"{self.prefix}m:{key}", pieces)
+        self.execute(command + ('EX', self.ttl) if self.ttl else command)
+
+    def describe(self) -> str:
+        return f"Redis {self.host}:{self.port}/{self.db}"
+
+
+def create_backend(cache_config: Dict[str, Any]) -> Optional[Any]:
+    """按 cache.backend 创建共享存储：sqlite（db_path 为空时不使用磁盘层）或 redis；失败时返回 None（仅使用内存缓存）"""
+    backend = cache_config.get('backend', 'sqlite')
+    ttl = cache_config.get('ttl', 7 * 24 * 3600)
+    try:
+        if backend == 'redis':
+            return RedisBackend(
+                cache_config.get('redis_url', 'redis://127.0.0.1:6379/0'),
+                ttl,
+                cache_config.get('redis_prefix', 'xunity:')
+            )
+        db_path = cache_config.get('db_path', './translation_cache.db')
+        return SQLiteBackend(db_path, ttl) if db_path else None
+    except CacheBackendError as e:
+        log.error(f"\033[31m[翻译缓存]无法连接共享缓存（{backend}），仅使用内存缓存: {e}\033[0m")
+        return None
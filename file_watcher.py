@@ -0,0 +1,191 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from translation_log import log
+
+# inotify 事件（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def file_signature(path: Path) -> Optional[Tuple[int, int]]:
+    """文件的 (修改时间, 大小)，文件不存在时返回 None"""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class _Inotify:
+    """通过 ctypes 调用 Linux inotify，监视文件所在目录（兼容先写临时文件再重命名的保存方式）"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.add_watch = libc.inotify_add_watch
+        self.add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 失败')
+        self.directories: Dict[int, Path] = {}
+
+    def watch_directory(self, directory: Path):
+        if directory in self.directories.values():
+            return
+        wd = self.add_watch(self.fd, os.fsencode(str(directory)), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'无法监视目录 {directory}')
+        self.directories[wd] = directory
+
+    def read_events(self) -> Optional[List[Path]]:
+        """读取已发生的事件，返回发生变化的路径；事件队列溢出时返回 None"""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b'\0')
+            offset += name_len
+            if mask & IN_Q_OVERFLOW:
+                return None
+            directory = self.directories.get(wd)
+            if directory is not None and name:
+                paths.append(directory / os.fsdecode(name))
+        return paths
+
+
+class FileWatcher:
+    """共享的文件监视服务：一个后台线程监视所有注册的文件
+
+    Linux 上使用 inotify，其他系统（或 inotify 不可用时）定期检查文件的修改时间和大小。
+    文件变化后等待 debounce 秒内不再有新的变化才通知订阅者，避免读到写了一半的文件。
+    """
+
+    def __init__(self, debounce: float = 0.3, poll_interval: float = 1.0, backend: str = 'auto'):
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.subscribers: Dict[Path, List[Callable[[], None]]] = {}
+        self.signatures: Dict[Path, Optional[Tuple[int, int]]] = {}  # 上次通知订阅者时的文件状态
+        self.observed: Dict[Path, Optional[Tuple[int, int]]] = {}    # 上次检查时的文件状态（用于定期检查）
+        self.pending: Dict[Path, float] = {}  # 文件 -> 最近一次变化的时间
+        self.inotify = None
+        if backend in ('auto', 'inotify') and sys.platform.startswith('linux'):
+            try:
+                self.inotify = _Inotify()
+            except (OSError, AttributeError) as e:
+                log.info(f"\033[33m[文件监视]inotify 不可用，改为定期检查: {e}\033[0m")
+        self.thread = threading.Thread(target=self._run, name='file-watcher', daemon=True)
+        self.thread.start()
+
+    @property
+    def backend(self) -> str:
+        return 'inotify' if self.inotify is not None else 'poll'
+
+    def watch(self, path, callback: Callable[[], None]):
+        """文件变化（防抖后）时在监视线程中调用 callback()"""
+        path = Path(path).resolve()
+        with self.lock:
+            self.subscribers.setdefault(path, []).append(callback)
+            self.signatures[path] = self.observed[path] = file_signature(path)
+            if self.inotify is not None:
+                try:
+                    self.inotify.watch_directory(path.parent)
+                except OSError as e:
+                    log.info(f"\033[33m[文件监视]inotify 无法监视 {path.parent}，改为定期检查: {e}\033[0m")
+                    self.inotify = None
+        log.info(f"\033[33m[文件监视]开始监视 {path.name}（{self.backend}）\033[0m")
+
+    def unwatch(self, path, callback: Callable[[], None]):
+        path = Path(path).resolve()
+        with self.lock:
+            callbacks = self.subscribers.get(path, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self.subscribers.pop(path, None)
+                self.signatures.pop(path, None)
+                self.observed.pop(path, None)
+                self.pending.pop(path, None)
+
+    def _mark_changed(self, paths):
+        now = time.monotonic()
+        with self.lock:
+            for path in paths:
+                if path in self.subscribers:
+                    self.pending[path] = now
+
+    def _poll_changes(self) -> List[Path]:
+        changed = []
+        with self.lock:
+            for path, observed in self.observed.items():
+                signature = file_signature(path)
+                if signature != observed:
+                    self.observed[path] = signature
+                    changed.append(path)
+        return changed
+
+    def _next_timeout(self) -> float:
+        with self.lock:
+            deadlines = [changed_at + self.debounce for changed_at in self.pending.values()]
+        timeout = self.poll_interval
+        if deadlines:
+            timeout = min(timeout, max(0.0, min(deadlines) - time.monotonic()))
+        return timeout
+
+    def _run(self):
+        while True:
+            try:
+                timeout = self._next_timeout()
+                inotify = self.inotify
+                if inotify is not None:
+                    ready, _, _ = select.select([inotify.fd], [], [], timeout)
+                    if ready:
+                        paths = inotify.read_events()
+                        self._mark_changed(self._poll_changes() if paths is None else paths)
+                else:
+                    time.sleep(timeout)
+                    self._mark_changed(self._poll_changes())
+                self._fire_due()
+            except Exception as e:
+                log.error(f"\033[31m[文件监视]监视线程出错: {e}\033[0m")
+                time.sleep(self.poll_interval)
+
+    def _fire_due(self):
+        now = time.monotonic()
+        with self.lock:
+            due = [path for path, changed_at in self.pending.items() if now - changed_at >= self.debounce]
+            for path in due:
+                del self.pending[path]
+            callbacks = []
+            for path in due:
+                signature = file_signature(path)
+                if signature == self.signatures.get(path):
+                    continue  # 内容没有变化（例如只是被打开后关闭）
+                self.signatures[path] = signature
+                callbacks.extend(self.subscribers.get(path, []))
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                log.error(f"\033[31m[文件监视]回调执行失败: {e}\033[0m")
@@ -0,0 +1,346 @@
+import json
+import mmap
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from collections import deque
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+INDEX_MAGIC = b'XUGLOSS\x01'
+INDEX_VERSION = 1
+# 索引文件中的各段：字符串池为 UTF-8 字节，其余为定长整数数组
+BLOB_SECTIONS = ('key_blob', 'value_blob')
+ARRAY_SECTIONS = (
+    ('key_offsets', 'I'),    # 第 i 个词条的原文位于 key_blob[key_offsets[i]:key_offsets[i + 1]]
+    ('value_offsets', 'I'),
+    ('key_lengths', 'I'),    # 原文的字符数
+    ('key_order', 'I'),      # 按原文排序的词条序号，用于按 key 查询
+    ('edge_start', 'I'),     # 状态 s 的转移位于 edge_chars[edge_start[s]:edge_start[s + 1]]，按字符排序
+    ('edge_chars', 'I'),     # 状态按 BFS 顺序编号，与转移一一对应：第 e 个转移到达状态 e + 1
+    ('fail', 'I'),
+    ('output', 'i'),         # 在该状态结束的词条序号，-1 表示无
+    ('dict_link', 'i'),      # 最近的、有输出的后缀状态，-1 表示无
+)
+
+
+class GlossaryMatcher(Mapping):
+    """基于 Aho-Corasick 自动机的字典匹配器，同时是只读的字典（key 为原文，value 为译法）
+
+    构建一次后只读，可在多线程间共享。匹配结果与逐条 `key in text` + `replace`
+    的旧实现一致：按字典顺序（key 长度降序）优先匹配，已被较长词条覆盖的位置不再参与较短词条的匹配。
+
+    词条和自动机都保存在紧凑的数组中：原文和译文分别拼接为一整段 UTF-8 字节，按偏移量取出；
+    每个状态的转移按字符排序后二分查找。save 写出的索引文件可以用 open 以内存映射方式加载，
+    无需解析 JSON 和重新构建，多个工作进程共用同一份只读内存页。
+    """
+
+    def __init__(self, dictionary: Dict[str, str], order: Optional[Iterable[str]] = None):
+        """order 为匹配优先级（默认为字典顺序，调用方已按 key 长度降序排序）"""
+        keys = [k for k in (dictionary if order is None else order) if k]
+        values = [dictionary[k] if isinstance(dictionary[k], str) else str(dictionary[k]) for k in keys]
+        self.has_empty_key = '' in dictionary
+        self.empty_value = dictionary.get('')
+        self.buffer = None
+        self._attach(self._build(keys, values))
+
+    @staticmethod
+    def _pack(strings: List[str]) -> Tuple[bytes, array]:
+        offsets = array('I', [0])
+        blob = bytearray()
+        for string in strings:
+            blob += string.encode('utf-8')
+            offsets.append(len(blob))
+        return bytes(blob), offsets
+
+    @staticmethod
+    def _build(keys: List[str], values: List[str]) -> Dict[str, object]:
+        sections = {}
+        sections['key_blob'], sections['key_offsets'] = GlossaryMatcher._pack(keys)
+        sections['value_blob'], sections['value_offsets'] = GlossaryMatcher._pack(values)
+        sections['key_lengths'] = array('I', map(len, keys))
+        key_order = sorted(range(len(keys)), key=keys.__getitem__)
+        sections['key_order'] = array('I', key_order)
+
+        # 按字典序排列的原文中，具有相同前缀的词条相邻：按层（BFS）展开前缀区间即得到各状态，
+        # 状态编号即 BFS 顺序，每个状态的转移按字符排好序
+        sorted_keys = [keys[idx] for idx in key_order]
+        edge_start = array('I', [0])
+        edge_chars = array('I')
+        output = array('i')
+        queue = deque([(0, 0, len(sorted_keys))])  # (深度, 区间起点, 区间终点)
+        next_state = 1
+        while queue:
+            depth, lo, hi = queue.popleft()
+            if lo < hi and len(sorted_keys[lo]) == depth:
+                output.append(key_order[lo])
+                lo += 1
+            else:
+                output.append(-1)
+            while lo < hi:
+                key = sorted_keys[lo]
+                ch = key[depth]
+                # 同一前缀下以 ch 开头的词条的结束位置
+                end = bisect_left(sorted_keys, key[:depth] + chr(ord(ch) + 1), lo, hi) if ord(ch) < 0x10FFFF else hi
+                edge_chars.append(ord(ch))
+                next_state += 1
+                queue.append((depth + 1, lo, end))
+                lo = end
+            edge_start.append(len(edge_chars))
+        del sorted_keys
+
+        # 按状态编号（BFS 顺序）计算失配指针和输出链接，父状态和更短的后缀状态总是先计算
+        fail = array('I', bytes(4 * next_state))
+        dict_link = array('i', [-1]) * next_state
+        for state in range(next_state):
+            for edge in range(edge_start[state], edge_start[state + 1]):
+                child = edge + 1
+                if state:
+                    ch = edge_chars[edge]
+                    f = fail[state]
+                    while True:
+                        lo, hi = edge_start[f], edge_start[f + 1]
+                        i = bisect_left(edge_chars, ch, lo, hi)
+                        if i < hi and edge_chars[i] == ch:
+                            fail[child] = i + 1
+                            break
+                        if not f:
+                            break
+                        f = fail[f]
+                fail_state = fail[child]
+                dict_link[child] = fail_state if output[fail_state] != -1 else dict_link[fail_state]
+
+        sections.update(
+            edge_start=edge_start, edge_chars=edge_chars, fail=fail, output=output, dict_link=dict_link
+        )
+        return sections
+
+    def _attach(self, sections: Dict[str, object]):
+        for name, value in sections.items():
+            setattr(self, name, value)
+        self.count = len(self.key_lengths)
+        # 根状态的转移最常用，单独建立字符 -> 状态的字典
+        self.root = {
+            chr(self.edge_chars[edge]): edge + 1
+            for edge in range(self.edge_start[0], self.edge_start[1])
+        }
+
+    # ---------------- 索引文件 ----------------
+
+    def save(self, path, source_signature=None):
+        """写出索引文件（先写临时文件再替换，其他进程不会读到写了一半的文件）"""
+        path = Path(path)
+        header = {
+            'version': INDEX_VERSION,
+            'byteorder': sys.byteorder,
+            'source': list(source_signature) if source_signature else None,
+            'has_empty_key': self.has_empty_key,
+            'empty_value': self.empty_value,
+            'sections': {},
+        }
+        chunks = []
+        offset = 0
+        for name in BLOB_SECTIONS + tuple(name for name, _ in ARRAY_SECTIONS):
+            data = getattr(self, name)
+            data = data if isinstance(data, (bytes, memoryview)) else data.tobytes()
+            length = len(data) if isinstance(data, bytes) else data.nbytes
+            header['sections'][name] = [offset, length]
+            padding = -length % 8  # 各段按 8 字节对齐
+            chunks.append((data, padding))
+            offset += length + padding
+
+        header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        header_bytes += b' ' * (-(len(INDEX_MAGIC) + 4 + len(header_bytes)) % 8)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(INDEX_MAGIC)
+                f.write(len(header_bytes).to_bytes(4, 'little'))
+                f.write(header_bytes)
+                for data, padding in chunks:
+                    f.write(data)
+                    f.write(b'\0' * padding)
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    @classmethod
+    def open(cls, path, source_signature=None) -> Optional['GlossaryMatcher']:
+        """以内存映射方式加载索引文件；文件不存在、格式不符或与 source_signature 不一致时返回 None"""
+        try:
+            with open(path, 'rb') as f:
+                if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                    return None
+                header_length = int.from_bytes(f.read(4), 'little')
+                header = json.loads(f.read(header_length))
+                if header.get('version') != INDEX_VERSION or header.get('byteorder') != sys.byteorder:
+                    return None
+                if source_signature is not None and header.get('source') != list(source_signature):
+                    return None
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        base = len(INDEX_MAGIC) + 4 + header_length
+        view = memoryview(buffer)
+        sections = {}
+        try:
+            for name in BLOB_SECTIONS:
+                offset, length = header['sections'][name]
+                sections[name] = view[base + offset:base + offset + length]
+            for name, typecode in ARRAY_SECTIONS:
+                offset, length = header['sections'][name]
+                sections[name] = view[base + offset:base + offset + length].cast(typecode)
+        except (KeyError, TypeError, ValueError):
+            return None
+
+        matcher = cls.__new__(cls)
+        matcher.has_empty_key = header['has_empty_key']
+        matcher.empty_value = header['empty_value']
+        matcher.buffer = buffer
+        matcher._attach(sections)
+        return matcher
+
+    # ---------------- 词条访问 ----------------
+
+    def key_at(self, idx: int) -> str:
+        offsets = self.key_offsets
+        return str(self.key_blob[offsets[idx]:offsets[idx + 1]], 'utf-8')
+
+    def value_at(self, idx: int) -> str:
+        offsets = self.value_offsets
+        return str(self.value_blob[offsets[idx]:offsets[idx + 1]], 'utf-8')
+
+    def _find(self, key: str) -> int:
+        """按原文二分查找词条序号，不存在时返回 -1"""
+        order = self.key_order
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key_at(order[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self.key_at(order[lo]) == key:
+            return order[lo]
+        return -1
+
+    def __getitem__(self, key: str) -> str:
+        if key == '' and self.has_empty_key:
+            return self.empty_value
+        idx = self._find(key) if isinstance(key, str) and key else -1
+        if idx == -1:
+            raise KeyError(key)
+        return self.value_at(idx)
+
+    def __iter__(self) -> Iterator[str]:
+        """按匹配优先级（key 长度降序）遍历原文"""
+        for idx in range(self.count):
+            yield self.key_at(idx)
+        if self.has_empty_key:
+            yield ''
+
+    def __len__(self):
+        return self.count + (1 if self.has_empty_key else 0)
+
+    def sorted_items(self) -> Iterator[Tuple[str, str]]:
+        """按原文排序遍历 (原文, 译文)，不含空 key"""
+        for idx in self.key_order:
+            yield self.key_at(idx), self.value_at(idx)
+
+    # ---------------- 匹配 ----------------
+
+    def find_matches(self, text: str) -> Dict[str, str]:
+        """单次线性扫描获取匹配的字典条目"""
+        matches = {}
+        if not text:
+            if self.has_empty_key:
+                matches[''] = self.empty_value
+            return matches
+
+        for idx, _ in self._claim(text):
+            matches[self.key_at(idx)] = self.value_at(idx)
+
+        if self.has_empty_key:
+            matches[''] = self.empty_value
+        return matches
+
+    def find_spans(self, text: str) -> List[Tuple[int, int, str, str]]:
+        """与 find_matches 相同的匹配规则，返回按位置排序的 (起点, 终点, 原文, 译文)"""
+        if not text:
+            return []
+        lengths = self.key_lengths
+        return sorted(
+            (start, start + lengths[idx], self.key_at(idx), self.value_at(idx)) for idx, start in self._claim(text)
+        )
+
+    def _claim(self, text: str) -> List[Tuple[int, int]]:
+        """返回各词条认领到的 (词条序号, 起点)，按优先级排列"""
+        # 1. 扫描文本，收集每个词条出现的起始位置
+        occurrences: Dict[int, List[int]] = {}
+        root, starts, chars = self.root, self.edge_start, self.edge_chars
+        fail, output, dict_link, lengths = self.fail, self.output, self.dict_link, self.key_lengths
+        state = 0
+        for pos, ch in enumerate(text):
+            code = ord(ch)
+            while state:
+                lo, hi = starts[state], starts[state + 1]
+                if hi - lo == 1:
+                    # 深层状态大多只有一个转移
+                    if chars[lo] == code:
+                        state = lo + 1
+                        break
+                elif lo != hi:
+                    i = bisect_left(chars, code, lo, hi)
+                    if i < hi and chars[i] == code:
+                        state = i + 1
+                        break
+                state = fail[state]
+            else:
+                state = root.get(ch, 0)
+            hit = state if output[state] != -1 else dict_link[state]
+            while hit != -1:
+                idx = output[hit]
+                occurrences.setdefault(idx, []).append(pos - lengths[idx] + 1)
+                hit = dict_link[hit]
+
+        # 2. 按优先级依次认领未被覆盖的位置（与 str.replace 一样，同一词条的多次出现互不重叠）
+        claimed = []
+        covered = bytearray(len(text))
+        for idx in sorted(occurrences):
+            length = lengths[idx]
+            for start in occurrences[idx]:
+                end = start + length
+                if covered.find(1, start, end) != -1:
+                    continue
+                covered[start:end] = b'\x01' * length
+                claimed.append((idx, start))
+        return claimed
+
+
+def changed_keys(old: Mapping, new: Mapping) -> Iterator[str]:
+    """两个字典之间新增、删除或译法变化的原文；两者都是 GlossaryMatcher 时按排序归并比较，不建立临时集合"""
+    if not (isinstance(old, GlossaryMatcher) and isinstance(new, GlossaryMatcher)):
+        for key in old.keys() | new.keys():
+            if old.get(key) != new.get(key):
+                yield key
+        return
+
+    if old.has_empty_key != new.has_empty_key or old.empty_value != new.empty_value:
+        yield ''
+    old_items, new_items = old.sorted_items(), new.sorted_items()
+    old_item, new_item = next(old_items, None), next(new_items, None)
+    while old_item is not None or new_item is not None:
+        if new_item is None or (old_item is not None and old_item[0] < new_item[0]):
+            yield old_item[0]
+            old_item = next(old_items, None)
+        elif old_item is None or new_item[0] < old_item[0]:
+            yield new_item[0]
+            new_item = next(new_items, None)
+        else:
+            if old_item[1] != new_item[1]:
+                yield new_item[0]
+            old_item, new_item = next(old_items, None), next(new_items, None)
@@ -0,0 +1,138 @@
+import concurrent.futures
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class HedgeLeg:
+    """对冲请求中的一路（主请求或备用请求）"""
+
+    def __init__(self, api_type: str, params: Dict[str, Any]):
+        self.api_type = api_type
+        self.params = params
+        self.first_token = threading.Event()  # 收到首个文本块（或请求结束）时置位
+        self.cancelled = threading.Event()
+        self.stream = None
+        self.blocked = False
+
+    def cancel(self):
+        """取消这一路请求，关闭流以中断阻塞中的读取"""
+        self.cancelled.set()
+        stream = self.stream
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+
+class RequestHedger:
+    """对冲请求：主请求在限定时间内没有首个文本块时，向下一个云服务商发出相同请求，取先成功者"""
+
+    def __init__(self, max_workers: int = 16):
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedge')
+        self.lock = threading.Lock()
+        self.slots: Dict[str, int] = {}  # 每个云服务商正在进行的备用请求数
+        self.stats = {
+            'requests': 0,
+            'hedged': 0,
+            'primary_wins': 0,
+            'backup_wins': 0,
+            'capped': 0,
+        }
+
+    def _acquire_slot(self, api_type: str, max_per_provider: int) -> bool:
+        with self.lock:
+            if self.slots.get(api_type, 0) >= max_per_provider:
+                self.stats['capped'] += 1
+                return False
+            self.slots[api_type] = self.slots.get(api_type, 0) + 1
+            return True
+
+    def _release_slot(self, api_type: str):
+        with self.lock:
+            self.slots[api_type] -= 1
+
+    def run(self, primary: HedgeLeg, backup: Optional[HedgeLeg],
+            attempt: Callable[[HedgeLeg], Tuple[Optional[str], bool]],
+            delay: float, max_per_provider: int) -> Tuple[HedgeLeg, Optional[str], bool]:
+        """执行对冲请求，返回 (获胜的一路, 译文, 是否被审查)
+
+        attempt(leg) 在 leg 上执行一次流式请求并返回 (译文, 是否被审查)。
+        主请求直接在调用线程中执行，从主请求开始时计时；线程池只用于备用请求，
+        请求较多时主请求不会因排队而误触发备用请求。
+        两路都失败时返回主请求的结果（或抛出主请求的异常），交由调用方按原有逻辑重试或切换云服务商。
+        """
+        with self.lock:
+            self.stats['requests'] += 1
+        if backup is None:
+            return (primary,) + attempt(primary)
+
+        launch_lock = threading.Lock()
+        state = {'primary_done': False, 'backup_future': None}
+
+        def launch_backup():
+            with launch_lock:
+                if state['primary_done'] or primary.first_token.is_set():
+                    return
+                if not self._acquire_slot(backup.api_type, max_per_provider):
+                    return
+                with self.lock:
+                    self.stats['hedged'] += 1
+                future = self.executor.submit(self._run_leg, attempt, backup)
+                future.add_done_callback(lambda f: self._on_backup_done(f, primary, backup))
+                state['backup_future'] = future
+
+        timer = threading.Timer(delay, launch_backup)
+        timer.daemon = True
+        timer.start()
+        try:
+            outcome = self._run_leg(attempt, primary)
+        except Exception as e:
+            outcome = e
+        finally:
+            timer.cancel()
+            with launch_lock:
+                state['primary_done'] = True
+                backup_future = state['backup_future']
+
+        if backup_future is not None:
+            primary_ok = not isinstance(outcome, Exception) and outcome[0] and not outcome[1]
+            if primary_ok and not primary.cancelled.is_set():
+                backup.cancel()
+                with self.lock:
+                    self.stats['primary_wins'] += 1
+                return (primary,) + outcome
+            try:
+                translation, is_blocked = backup_future.result()
+            except Exception:
+                translation, is_blocked = None, False
+            if translation and not is_blocked:
+                with self.lock:
+                    self.stats['backup_wins'] += 1
+                return backup, translation, is_blocked
+
+        if isinstance(outcome, Exception):
+            raise outcome
+        return (primary,) + outcome
+
+    def _on_backup_done(self, future: concurrent.futures.Future, primary: HedgeLeg, backup: HedgeLeg):
+        """备用请求结束：释放名额，成功时取消仍在进行的主请求"""
+        self._release_slot(backup.api_type)
+        if future.cancelled() or future.exception() is not None:
+            return
+        translation, is_blocked = future.result()
+        if translation and not is_blocked:
+            primary.cancel()
+
+    @staticmethod
+    def _run_leg(attempt, leg: HedgeLeg):
+        try:
+            return attempt(leg)
+        finally:
+            leg.first_token.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.stats)
+            stats['active_backups'] = {k: v for k, v in self.slots.items() if v}
+        return stats
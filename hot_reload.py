@@ -1,100 +1,246 @@
 import json
+import importlib.util
 import threading
 import time
+import httpx
 from pathlib import Path
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+from glossary_matcher import GlossaryMatcher
+from file_watcher import FileWatcher, file_signature
+from translation_log import log
+from types import MappingProxyType
 from typing import Dict, Any, Optional
 
+CLIENT_CLOSE_DELAY = 120  # 被替换的API客户端延迟关闭的秒数，等待仍在使用它的请求结束
+
+
+def freeze(value):
+    """递归转换为只读结构：dict -> MappingProxyType，list -> tuple"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class ConfigSnapshot:
+    """不可变的config快照
+
+    重载时创建新快照并通过一次引用替换发布，读取方无需加锁或复制；
+    每个请求在开始时取一次快照，整个请求内使用同一版本。
+    """
+    __slots__ = (
+        'version', 'config', 'loaded_at', 'api_priority', 'prompt_user', 'models',
+        'temperature', 'top_p', 'token_limit_ratio', 'min_tokens', 'max_tokens', 'max_auto_tokens',
+        'derived'
+    )
+
+    def __init__(self, version: int, config: Dict[str, Any], loaded_at: float):
+        self.version = version
+        self.config = freeze(config)
+        self.loaded_at = loaded_at
+        self.api_priority = tuple(config.get('api_priority', ()))
+        self.prompt_user = config.get('prompt_user', '')
+        api_keys = config.get('api_keys', {})
+        self.models = tuple(api_keys.get(api_type, {}).get('model_type', api_type) for api_type in self.api_priority)
+
+        # 预先取出计算 token 限制和模型参数所需的值
+        model_config = config.get('model_params', {})
+        self.temperature = model_config.get('temperature')
+        self.top_p = model_config.get('top_p')
+        self.token_limit_ratio = model_config.get('token_limit_ratio', 2.0)
+        self.min_tokens = model_config.get('min_tokens', 30)
+        self.max_tokens = model_config.get('max_tokens', 0)
+        self.max_auto_tokens = model_config.get('max_auto_tokens', 500)
+        self.derived: Dict[str, Any] = {}
+
+    def token_limit(self, text_length: int) -> int:
+        """根据文本长度计算 max_tokens（max_tokens 大于 0 时使用固定值）"""
+        if self.max_tokens > 0:
+            return self.max_tokens
+        return min(max(int(text_length * self.token_limit_ratio), self.min_tokens), self.max_auto_tokens)
+
+    def derive(self, key: str, factory):
+        """按快照缓存派生值（例如提示词前缀），每个版本只计算一次"""
+        value = self.derived.get(key)
+        if value is None:
+            # 并发时可能重复计算，但结果相同，无需加锁
+            value = self.derived[key] = factory(self)
+        return value
+
+
+class DictionarySnapshot:
+    """不可变的字典快照：字典内容与匹配自动机一起发布
+
+    dictionary 传入 GlossaryMatcher 时直接使用（匹配器本身就是只读字典，不再另存一份 dict）。
+    """
+    __slots__ = ('version', 'dictionary', 'matcher', 'build_seconds')
+
+    def __init__(self, version: int, dictionary, matcher: GlossaryMatcher, build_seconds: float):
+        self.version = version
+        self.dictionary = dictionary if isinstance(dictionary, GlossaryMatcher) else MappingProxyType(dictionary)
+        self.matcher = matcher
+        self.build_seconds = build_seconds
+
+
 class DictionaryManager:
-    def __init__(self, dict_path):
+    def __init__(self, dict_path, index_config: Optional[Dict[str, Any]] = None):
         self.dict_path = Path(dict_path)
-        self.dictionary = {}
+        # 字典索引文件：首次加载时由 JSON 构建并写出，之后字典文件未修改时直接以内存映射方式加载
+        self.index_config = index_config or {}
+        empty = GlossaryMatcher({})
+        self.current = DictionarySnapshot(0, empty, empty, 0.0)
         self.last_modified = 0
-        self.lock = threading.Lock()
+        self.last_signature = None
+        self.lock = threading.Lock()  # 只用于串行化重载，读取不加锁
+        self.reload_listeners = []
+        self.watcher = None
         self.load_dictionary()
+
+    @property
+    def dictionary(self):
+        return self.current.dictionary
+
+    @property
+    def matcher(self):
+        return self.current.matcher
+
+    @property
+    def last_build_seconds(self):
+        return self.current.build_seconds
         
     def load_dictionary(self):
         """加载或重新加载字典"""
+        with self.lock:
+            self._load_dictionary()
+
+    def _load_dictionary(self):
         try:
             if not self.dict_path.exists():
-                print(f"\033[33m[配置重载]警告：dictionary文件 {self.dict_path} 未找到\033[0m")
+                log.info(f"\033[33m[配置重载]警告：dictionary文件 {self.dict_path} 未找到\033[0m")
                 return {}
                 
-            current_modified = self.dict_path.stat().st_mtime
-            if current_modified <= self.last_modified:
+            signature = file_signature(self.dict_path)
+            if signature == self.last_signature:
                 return  # 文件未修改
-                
-            with open(self.dict_path, 'r', encoding='utf8') as f:
-                new_dict = json.load(f)
-                
-            if not isinstance(new_dict, dict):
-                print(f"\033[31m[配置重载]错误：dictionary文件 {self.dict_path} 不是有效的JSON对象\033[0m")
-                return
-                
-            # 按key长度降序排序
-            sorted_dict = {
-                k: new_dict[k] 
-                for k in sorted(new_dict.keys(), key=len, reverse=True)
-            }
-            
-            with self.lock:
-                self.dictionary = sorted_dict
-                self.last_modified = current_modified
-                
-            print(f"\033[33m[配置重载]dictionary已重新加载，修改时间: {time.ctime(current_modified)}，共 {len(sorted_dict)} 条记录\033[0m")
+            current_modified = signature[0] / 1e9
+
+            build_start = time.perf_counter()
+            index_path = self.index_path()
+            matcher = GlossaryMatcher.open(index_path, signature) if index_path is not None else None
+            from_index = matcher is not None
+            if matcher is None:
+                with open(self.dict_path, 'r', encoding='utf8') as f:
+                    new_dict = json.load(f)
+
+                if not isinstance(new_dict, dict):
+                    log.error(f"\033[31m[配置重载]错误：dictionary文件 {self.dict_path} 不是有效的JSON对象\033[0m")
+                    return
+
+                # 按key长度降序匹配，构建匹配自动机，完成后作为新快照发布
+                matcher = GlossaryMatcher(new_dict, sorted(new_dict, key=len, reverse=True))
+                del new_dict
+                if index_path is not None:
+                    matcher = self._write_index(matcher, index_path, signature)
+            build_seconds = time.perf_counter() - build_start
+
+            old_snapshot = self.current
+            self.current = DictionarySnapshot(old_snapshot.version + 1, matcher, matcher, build_seconds)
+            self.last_modified = current_modified
+            self.last_signature = signature
+
+            action = "从索引文件加载" if from_index else "索引构建"
+            log.info(f"\033[33m[配置重载]dictionary已重新加载（版本 {self.current.version}），修改时间: {time.ctime(current_modified)}，共 {len(matcher)} 条记录，{action}耗时 {build_seconds * 1000:.1f} ms\033[0m")
+
+            # 通知监听者（例如翻译缓存失效）
+            for callback in self.reload_listeners:
+                try:
+                    callback(old_snapshot.dictionary, self.current.dictionary)
+                except Exception as e:
+                    log.error(f"\033[31m[配置重载]dictionary重载回调执行失败: {e}\033[0m")
             
         except json.JSONDecodeError:
-            print(f"\033[31m[配置重载]错误：dictionary文件 {self.dict_path} JSON格式错误\033[0m")
+            log.error(f"\033[31m[配置重载]错误：dictionary文件 {self.dict_path} JSON格式错误\033[0m")
         except Exception as e:
-            print(f"\033[31m[配置重载]读取dictionary文件时发生错误: {e}\033[0m")
+            log.error(f"\033[31m[配置重载]读取dictionary文件时发生错误: {e}\033[0m")
             
-    def get_dict_matches(self, text):
-        """获取匹配的字典条目"""
-        with self.lock:
-            if not self.dictionary:
-                return {}
-                
-            matches = {}
-            remaining_text = text
-            
-            for key in self.dictionary:
-                if key in remaining_text:
-                    matches[key] = self.dictionary[key]
-                    remaining_text = remaining_text.replace(key, '')
-                    if not remaining_text:
-                        break
-                        
-            return matches
-
-    def start_watcher(self, interval=5):
-        """启动字典文件监视器"""
-        def watch():
-            while True:
-                self.load_dictionary()
-                time.sleep(interval)
-                
-        watcher_thread = threading.Thread(target=watch, daemon=True)
-        watcher_thread.start()
-        print(f"\033[33m[配置重载]dictionary文件监视器已启动，每 {interval} 秒检查一次更新\033[0m")
-    pass
+    def index_path(self) -> Optional[Path]:
+        """字典索引文件路径，未启用时返回 None"""
+        if not self.index_config.get('enabled', True):
+            return None
+        path = self.index_config.get('path', '')
+        return Path(path) if path else self.dict_path.with_name(self.dict_path.name + '.idx')
+
+    def _write_index(self, matcher: GlossaryMatcher, index_path: Path, signature) -> GlossaryMatcher:
+        """写出索引文件并改用内存映射加载（释放构建时的数组），写入失败时继续使用内存中的匹配器"""
+        try:
+            matcher.save(index_path, signature)
+        except OSError as e:
+            log.warning(f"\033[31m[配置重载]写入字典索引 {index_path} 失败，本次使用内存中的索引: {e}\033[0m")
+            return matcher
+        return GlossaryMatcher.open(index_path, signature) or matcher
+
+    def snapshot(self) -> DictionarySnapshot:
+        """当前字典快照（不加锁）"""
+        return self.current
+
+    def get_dict_matches(self, text, snapshot: Optional[DictionarySnapshot] = None):
+        """获取匹配的字典条目（不加锁，多个请求可同时匹配）"""
+        return (snapshot or self.current).matcher.find_matches(text)
+
+    def add_reload_listener(self, callback):
+        """注册字典重载回调，参数为 (旧字典, 新字典)"""
+        self.reload_listeners.append(callback)
+
+    def start_watcher(self, watcher: FileWatcher):
+        """在共享的文件监视服务中订阅字典文件的变化"""
+        self.watcher = watcher
+        watcher.watch(self.dict_path, self.load_dictionary)
+
+    def set_path(self, dict_path):
+        """config 中的 dict_path 变化时切换到新的字典文件"""
+        dict_path = Path(dict_path)
+        if dict_path == self.dict_path:
+            return
+        if self.watcher is not None:
+            self.watcher.unwatch(self.dict_path, self.load_dictionary)
+        self.dict_path = dict_path
+        self.last_signature = None
+        self.load_dictionary()
+        if self.watcher is not None:
+            self.watcher.watch(self.dict_path, self.load_dictionary)
 
 class ConfigManager:
     def __init__(self, config_path: str):
         self.config_path = Path(config_path)
-        self.config: Dict[str, Any] = {}
+        self.current = ConfigSnapshot(0, {}, time.time())
         self.last_modified: float = 0
-        self.lock = threading.Lock()
+        self.last_signature = None
+        self.lock = threading.Lock()  # 只用于串行化重载，读取不加锁
+        self.clients_lock = threading.Lock()
+        self.reload_listeners = []
+        self.client_specs: Dict[int, Dict[str, str]] = {}
+        self.h2_warned = False
         self.load_config()
         
+    @property
+    def config(self):
+        return self.current.config
+
     def load_config(self) -> Optional[Dict[str, Any]]:
         """加载或重新加载config文件"""
+        with self.lock:
+            return self._load_config()
+
+    def _load_config(self) -> Optional[Dict[str, Any]]:
         try:
             if not self.config_path.exists():
                 raise FileNotFoundError(f"Config file {self.config_path} not found")
                 
-            current_modified = self.config_path.stat().st_mtime
-            if current_modified <= self.last_modified:
+            signature = file_signature(self.config_path)
+            if signature == self.last_signature:
                 return None  # 文件未修改
+            current_modified = signature[0] / 1e9
                 
             with open(self.config_path, 'r', encoding='utf8') as f:
                 new_config = json.load(f)
@@ -105,77 +251,158 @@ class ConfigManager:
                 if section not in new_config:
                     raise ValueError(f"Missing required section: {section}")
             
-            with self.lock:
-                self.config = new_config
-                self.last_modified = current_modified
+            # 校验通过后发布新快照，读取方要么拿到旧config，要么拿到新config
+            old_snapshot = self.current
+            self.current = ConfigSnapshot(old_snapshot.version + 1, new_config, time.time())
+            self.last_modified = current_modified
+            self.last_signature = signature
                 
-            print(f"\033[33m[配置重载]config已重新加载，修改时间: {time.ctime(current_modified)}\033[0m")
-            return new_config
+            log.info(f"\033[33m[配置重载]config已重新加载（版本 {self.current.version}），修改时间: {time.ctime(current_modified)}\033[0m")
+
+            # 通知监听者（例如重建API客户端、重新配置日志）
+            if old_snapshot.version:
+                for callback in self.reload_listeners:
+                    try:
+                        callback(old_snapshot.config, self.current.config)
+                    except Exception as e:
+                        log.error(f"\033[31m[配置重载]config重载回调执行失败: {e}\033[0m")
+            return self.current.config
             
         except json.JSONDecodeError:
-            print(f"\033[31m[配置重载]错误：config文件 {self.config_path} JSON格式错误\033[0m")
+            log.error(f"\033[31m[配置重载]错误：config文件 {self.config_path} JSON格式错误\033[0m")
         except Exception as e:
-            print(f"\033[31m[配置重载]读取config文件时发生错误: {e}\033[0m")
+            log.error(f"\033[31m[配置重载]读取config文件时发生错误: {e}\033[0m")
         return None
             
     def get_config(self) -> Dict[str, Any]:
-        """获取当前config"""
-        with self.lock:
-            return self.config.copy()
+        """获取当前config（只读，不加锁也不复制）"""
+        return self.current.config
+
+    def snapshot(self) -> ConfigSnapshot:
+        """当前config快照（不加锁）"""
+        return self.current
+
+    def add_reload_listener(self, callback):
+        """注册config重载回调，参数为 (旧config, 新config)；首次加载不会触发"""
+        self.reload_listeners.append(callback)
             
-    def update_clients(self, clients: Dict[str, Any], model_types: Dict[str, Any]) -> bool:
-        """更新API客户端config"""
+    def update_clients(self, clients: Dict[str, Any], model_types: Dict[str, Any], client_class=OpenAI,
+                       on_retired=None) -> bool:
+        """更新API客户端config（client_class 可传入 AsyncOpenAI 以创建异步客户端）
+
+        每个云服务商使用独立的、带连接池的 httpx 客户端；只有 api_keys 中对应条目
+        （或 http 连接设置）发生变化的云服务商才会重建客户端，其余沿用已建立的连接。
+        被替换或删除的客户端交给 on_retired 关闭，默认在 CLIENT_CLOSE_DELAY 秒后关闭（仅适用于同步客户端）。
+        """
         try:
             config = self.get_config()
             if 'api_keys' not in config:
                 return False
-                
+
+            is_async = issubclass(client_class, AsyncOpenAI)
+            specs = self.client_specs.setdefault(id(clients), {})
             new_clients = {}
             new_model_types = {}
-            
-            # 腾讯云
-            if 'tencent' in config['api_keys']:
-                new_clients['tencent'] = OpenAI(
-                    api_key=config['api_keys']['tencent']['api_key'],
-                    base_url=config['api_keys']['tencent']['base_url']
-                )
-                new_model_types['tencent'] = config['api_keys']['tencent']['model_type']
-            
-            # 阿里云
-            if 'ali' in config['api_keys']:
-                new_clients['ali'] = OpenAI(
-                    api_key=config['api_keys']['ali']['api_key'],
-                    base_url=config['api_keys']['ali']['base_url']
-                )
-                new_model_types['ali'] = config['api_keys']['ali']['model_type']
-            
-            # DeepSeek
-            if 'deepseek' in config['api_keys']:
-                new_clients['deepseek'] = OpenAI(
-                    api_key=config['api_keys']['deepseek']['api_key'],
-                    base_url=config['api_keys']['deepseek']['base_url']
+            new_specs = {}
+            rebuilt = []
+            retired = []
+
+            # 腾讯云、阿里云、DeepSeek 以及其他兼容 OpenAI 接口的云服务商
+            for api_type, api_config in config['api_keys'].items():
+                http_settings = {**config.get('http', {}), **api_config.get('http', {})}
+                spec = json.dumps([api_config['api_key'], api_config['base_url'], http_settings], sort_keys=True)
+                new_specs[api_type] = spec
+                new_model_types[api_type] = api_config['model_type']
+
+                if specs.get(api_type) == spec and api_type in clients:
+                    new_clients[api_type] = clients[api_type]
+                    continue
+                if api_type in clients:
+                    retired.append(clients[api_type])
+
+                new_clients[api_type] = client_class(
+                    api_key=api_config['api_key'],
+                    base_url=api_config['base_url'],
+                    timeout=self._build_timeout(http_settings),
+                    http_client=self._build_http_client(http_settings, is_async),
+                    max_retries=0  # 429 等错误的重试由限速器和切换云服务商的逻辑处理，SDK 不再自行等待重试
                 )
-                new_model_types['deepseek'] = config['api_keys']['deepseek']['model_type']
-            
-            with self.lock:
-                clients.clear()
+                rebuilt.append(api_type)
+
+            # 先写入新条目再删除多余条目，正在处理的请求不会看到空的客户端表
+            with self.clients_lock:
                 clients.update(new_clients)
-                model_types.clear()
                 model_types.update(new_model_types)
-            
+                specs.update(new_specs)
+                for removed in set(clients) - set(new_clients):
+                    retired.append(clients.pop(removed))
+                for removed in set(model_types) - set(new_model_types):
+                    del model_types[removed]
+                for removed in set(specs) - set(new_specs):
+                    del specs[removed]
+
+            if rebuilt:
+                log.info(f"\033[33m[配置重载]已创建API客户端: {', '.join(rebuilt)}\033[0m")
+            if retired:
+                (on_retired or self.close_clients_later)(retired)
             return True
             
         except Exception as e:
-            print(f"\033[31m[配置重载]更新API客户端config失败: {e}\033[0m")
+            log.error(f"\033[31m[配置重载]更新API客户端config失败: {e}\033[0m")
             return False
 
-    def start_watcher(self, interval: int = 5):
-        """启动config文件监视器"""
-        def watch():
-            while True:
-                self.load_config()
-                time.sleep(interval)
-                
-        watcher_thread = threading.Thread(target=watch, daemon=True)
-        watcher_thread.start()
-        print(f"\033[33m[配置重载]config文件监视器已启动，每 {interval} 秒检查一次更新\033[0m")
\ No newline at end of file
+    @staticmethod
+    def close_clients_later(retired):
+        """CLIENT_CLOSE_DELAY 秒后关闭被替换的同步客户端及其连接池"""
+        def close():
+            for client in retired:
+                try:
+                    client.close()
+                except Exception:
+                    pass
+
+        timer = threading.Timer(CLIENT_CLOSE_DELAY, close)
+        timer.daemon = True
+        timer.start()
+
+    @staticmethod
+    def _build_timeout(http_settings: Dict[str, Any]) -> httpx.Timeout:
+        """连接超时与读取超时（流式响应中两个文本块之间的最长间隔）"""
+        return httpx.Timeout(
+            http_settings.get('read_timeout', 60),
+            connect=http_settings.get('connect_timeout', 5)
+        )
+
+    def _build_http_client(self, http_settings: Dict[str, Any], is_async: bool):
+        """创建带连接池和 keep-alive 的 httpx 客户端，安装了 h2 时启用 HTTP/2"""
+        limits = httpx.Limits(
+            max_connections=http_settings.get('max_connections', 20),
+            max_keepalive_connections=http_settings.get('max_keepalive_connections', 10),
+            keepalive_expiry=http_settings.get('keepalive_expiry', 60)
+        )
+        http2 = http_settings.get('http2', True)
+        if http2 and importlib.util.find_spec('h2') is None:
+            if not self.h2_warned:
+                log.info("\033[33m[配置重载]未安装 h2，HTTP/2 未启用（pip install httpx[http2]）\033[0m")
+                self.h2_warned = True
+            http2 = False
+
+        client_class = httpx.AsyncClient if is_async else httpx.Client
+        return client_class(limits=limits, timeout=self._build_timeout(http_settings), http2=http2)
+
+    def warmup_clients(self, clients: Dict[str, Any]):
+        """后台预先建立到各云服务商的连接（TLS 握手），降低首个请求的延迟"""
+        def warmup(api_type, client):
+            start = time.perf_counter()
+            try:
+                client.models.list()
+            except Exception:
+                pass  # 部分云服务商不支持 /models，连接已建立即可
+            log.info(f"\033[33m[连接预热]{api_type} 耗时 {(time.perf_counter() - start) * 1000:.0f} ms\033[0m")
+
+        for api_type, client in list(clients.items()):
+            threading.Thread(target=warmup, args=(api_type, client), daemon=True).start()
+
+    def start_watcher(self, watcher: FileWatcher):
+        """在共享的文件监视服务中订阅config文件的变化"""
+        watcher.watch(self.config_path, self.load_config)
\ No newline at end of file
@@ -0,0 +1,243 @@
+import json
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from translation_log import log
+
+# 耗时直方图的分桶上限（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+STAGE_HELP = {
+    'queue': '在工作线程池中排队',
+    'cache': '查询翻译缓存',
+    'dict_match': '匹配字典词条',
+    'memory': '查询翻译记忆',
+    'prompt': '构建提示词和模型参数（含字典匹配）',
+    'rate_wait': '按限速等待请求额度',
+    'ttft': '发出请求到收到首个文本块',
+    'stream': '首个文本块到流式响应结束',
+    'provider_loop': '重试与切换云服务商的整个循环',
+    'total': '请求总耗时',
+}
+
+COUNTER_HELP = {
+    'requests': '发往云服务商的请求数',
+    'retries': '出错后的重试次数',
+    'blocks': '被审查拦截的次数',
+    'failovers': '切换到下一个云服务商的次数',
+    'rate_limits': '限流错误次数',
+    'errors': '请求出错次数',
+    'prompt_tokens': '提示词 token 数（来自 usage）',
+    'completion_tokens': '输出 token 数（来自 usage）',
+    'cached_prompt_tokens': '命中提示词缓存的 token 数（来自 usage）',
+}
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class NullTrace:
+    """未启用统计时使用的空记录，所有方法都不做任何事"""
+    enabled = False
+    _span = _NullSpan()
+
+    def span(self, stage: str, provider: str = ""):
+        return self._span
+
+    def add(self, stage: str, seconds: float, provider: str = ""):
+        pass
+
+    def inc(self, name: str, provider: str = "", amount: int = 1):
+        pass
+
+    def set(self, **attrs):
+        pass
+
+    def finish(self, **attrs):
+        pass
+
+
+NULL_TRACE = NullTrace()
+
+
+class _Span:
+    __slots__ = ('trace', 'stage', 'provider', 'start')
+
+    def __init__(self, trace, stage, provider):
+        self.trace = trace
+        self.stage = stage
+        self.provider = provider
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.stage, time.perf_counter() - self.start, self.provider)
+        return False
+
+
+class RequestTrace:
+    """单个请求的分阶段耗时记录，同时汇总到 Metrics 的直方图和计数器
+
+    同一请求的多个段落可能在不同线程中并发记录。
+    """
+    enabled = True
+
+    def __init__(self, metrics: 'Metrics', kind: str, attrs: Dict[str, Any]):
+        self.metrics = metrics
+        self.kind = kind
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.attrs = attrs
+        self.spans = []
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def span(self, stage: str, provider: str = ""):
+        """with trace.span('prompt'): ... 记录代码块的耗时"""
+        return _Span(self, stage, provider)
+
+    def add(self, stage: str, seconds: float, provider: str = ""):
+        """记录一段已测得的耗时"""
+        with self.lock:
+            self.spans.append((stage, provider, time.perf_counter() - self.start - seconds, seconds))
+        self.metrics.observe(stage, seconds, provider)
+
+    def inc(self, name: str, provider: str = "", amount: int = 1):
+        key = f"{name}:{provider}" if provider else name
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+        self.metrics.inc(name, provider, amount)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self, **attrs):
+        """请求结束：记录总耗时，启用 trace_path 时写入一行 JSON"""
+        self.attrs.update(attrs)
+        total = time.perf_counter() - self.start
+        self.metrics.observe('total', total)
+        self.metrics.write_trace({
+            'time': round(self.started_at, 3),
+            'kind': self.kind,
+            'total_ms': round(total * 1000, 2),
+            'spans': [
+                {'stage': stage, 'provider': provider, 'offset_ms': round(offset * 1000, 2), 'ms': round(seconds * 1000, 2)}
+                for stage, provider, offset, seconds in self.spans
+            ],
+            'counters': self.counters,
+            **self.attrs,
+        })
+
+
+class Metrics:
+    """各阶段耗时直方图与按云服务商的计数器，可导出为 Prometheus 文本格式"""
+
+    def __init__(self, enabled: bool = False, trace_path: Optional[str] = None, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.trace_path = trace_path or None
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.histograms: Dict[Tuple[str, str], list] = {}  # (阶段, 云服务商) -> [各桶计数, 总和, 次数]
+        self.counters: Dict[Tuple[str, str], int] = {}
+        self.trace_lock = threading.Lock()
+        self.trace_file = None
+
+    def configure(self, enabled: bool, trace_path: Optional[str] = None):
+        """config重载时更新开关和 trace 文件路径"""
+        trace_path = trace_path or None
+        with self.trace_lock:
+            if trace_path != self.trace_path and self.trace_file is not None:
+                self.trace_file.close()
+                self.trace_file = None
+            self.trace_path = trace_path
+        self.enabled = enabled
+
+    def start_trace(self, kind: str, **attrs):
+        """开始记录一个请求；未启用时返回 NULL_TRACE"""
+        if not self.enabled:
+            return NULL_TRACE
+        return RequestTrace(self, kind, attrs)
+
+    def observe(self, stage: str, seconds: float, provider: str = ""):
+        key = (stage, provider)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[0][i] += 1
+                    break
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def inc(self, name: str, provider: str = "", amount: int = 1):
+        key = (name, provider)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def write_trace(self, record: Dict[str, Any]):
+        if not self.trace_path:
+            return
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self.trace_lock:
+            try:
+                if self.trace_file is None:
+                    self.trace_file = open(self.trace_path, 'a', encoding='utf-8')
+                self.trace_file.write(line)
+                self.trace_file.flush()
+            except OSError as e:
+                log.error(f"\033[31m[统计]写入 trace 文件失败，已停止记录: {str(e)}\033[0m")
+                self.trace_path = None
+
+    @staticmethod
+    def _labels(**labels) -> str:
+        parts = []
+        for name, value in labels.items():
+            if value == "":
+                continue
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            parts.append(f'{name}="{value}"')
+        return '{' + ','.join(parts) + '}' if parts else ''
+
+    def render_prometheus(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """导出为 Prometheus 文本格式；gauges 为额外的瞬时值（如排队深度）"""
+        with self.lock:
+            histograms = {key: (list(counts), total, count) for key, (counts, total, count) in self.histograms.items()}
+            counters = dict(self.counters)
+
+        lines = [
+            '# HELP xunity_stage_seconds 各阶段耗时（秒）：' + '；'.join(f"{k}={v}" for k, v in STAGE_HELP.items()),
+            '# TYPE xunity_stage_seconds histogram',
+        ]
+        for (stage, provider), (counts, total, count) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"xunity_stage_seconds_bucket{self._labels(stage=stage, provider=provider, le=bound)} {cumulative}")
+            lines.append(f"xunity_stage_seconds_bucket{self._labels(stage=stage, provider=provider, le='+Inf')} {count}")
+            lines.append(f"xunity_stage_seconds_sum{self._labels(stage=stage, provider=provider)} {total:.6f}")
+            lines.append(f"xunity_stage_seconds_count{self._labels(stage=stage, provider=provider)} {count}")
+
+        names = sorted({name for name, _ in counters} | set(COUNTER_HELP))
+        for name in names:
+            lines.append(f"# HELP xunity_{name}_total {COUNTER_HELP.get(name, name)}")
+            lines.append(f"# TYPE xunity_{name}_total counter")
+            for (counter_name, provider), value in sorted(counters.items()):
+                if counter_name == name:
+                    lines.append(f"xunity_{name}_total{self._labels(provider=provider)} {value}")
+
+        for name, value in (gauges or {}).items():
+            if value is None:
+                continue
+            lines.append(f"# TYPE xunity_{name} gauge")
+            lines.append(f"xunity_{name} {value}")
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,71 @@
+import concurrent.futures
+import threading
+from typing import Callable, List, Optional
+
+
+class MicroBatcher:
+    """服务端微批处理：在短时间窗口内收集并发的单行请求，合并为一次批量翻译
+
+    不另开线程：请求在调用方的工作线程（共享的 WorkerPool）中等待，批次中的第一个请求等待窗口结束后
+    在自己的线程中执行整批翻译，批次提前凑满时由凑满它的请求直接执行。
+    """
+
+    def __init__(self, batch_func: Callable[[List[str]], List[str]], window: float = 0.02, max_batch: int = 16):
+        self.batch_func = batch_func
+        self.window = window
+        self.max_batch = max_batch
+        self.lock = threading.Lock()
+        self.flushed = threading.Condition(self.lock)
+        self.pending = []  # [(text, future)]
+        self.generation = 0  # 每取出一批加一，批次中的第一个请求据此判断自己的批次是否已被取走
+        self.stats = {
+            'requests': 0,
+            'batches': 0,
+        }
+
+    def translate(self, text: str, timeout: Optional[float] = None) -> str:
+        """提交一条待翻译文本并等待译文（在工作线程中调用）"""
+        future = concurrent.futures.Future()
+        with self.lock:
+            self.pending.append((text, future))
+            self.stats['requests'] += 1
+            generation = self.generation
+            if len(self.pending) >= self.max_batch:
+                batch = self._take_pending()
+            elif len(self.pending) == 1:
+                # 批次中的第一个请求：等待窗口结束或批次被凑满它的请求取走
+                self.flushed.wait_for(lambda: self.generation != generation, timeout=self.window)
+                batch = self._take_pending() if self.generation == generation else None
+            else:
+                batch = None
+
+        if batch:
+            self._run_batch(batch)
+        return future.result(timeout=timeout)
+
+    def _take_pending(self):
+        """取出当前等待中的请求（调用方需持有 self.lock）"""
+        batch = self.pending
+        self.pending = []
+        self.generation += 1
+        self.flushed.notify_all()
+        return batch
+
+    def _run_batch(self, batch):
+        with self.lock:
+            self.stats['batches'] += 1
+        texts = [text for text, _ in batch]
+        try:
+            results = self.batch_func(texts)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats['avg_batch_size'] = stats['requests'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
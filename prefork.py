@@ -0,0 +1,135 @@
+"""
+多进程模式：主进程监听端口后启动多个工作进程，每个工作进程各自运行一份完整的翻译服务
+（run_app.setup + serve），共同处理同一端口上的请求，绕开单进程 GIL 的限制。
+
+工作进程之间通过共享缓存存储（cache.backend：SQLite WAL 或 Redis）共用翻译缓存和翻译模板；
+每个工作进程各自监视 config.json 和字典文件，文件修改后所有工作进程都会重载。
+"""
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from multiprocessing.connection import wait
+
+from translation_log import log
+
+RESTART_BACKOFF_MAX = 30  # 工作进程反复崩溃时，重启间隔的上限（秒）
+STABLE_SECONDS = 10       # 运行超过该时间后退出的工作进程立即重启
+
+
+def create_listener(host: str, port: int, reuse_port: bool = False, listen: bool = True) -> socket.socket:
+    """创建并绑定监听 socket（reuse_port 为 True 时设置 SO_REUSEPORT，多个进程可绑定同一端口）"""
+    family = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)[0][0]
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    if os.name != 'nt':
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    if listen:
+        sock.listen(1024)
+    return sock
+
+
+def _worker_main(worker_id: int, mode: str, host: str, port: int, sock):
+    """工作进程入口：sock 为 None 时（SO_REUSEPORT 模式）自行绑定端口"""
+    os.environ['XUNITY_WORKER_ID'] = str(worker_id)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # 由主进程统一处理 Ctrl+C
+    if sock is None:
+        sock = create_listener(host, port, reuse_port=True)
+
+    import run_app
+    run_app.setup()
+    log.info(f"\033[33m[多进程]工作进程 {worker_id} 已启动（pid {os.getpid()}）\033[0m")
+    run_app.serve(mode, host, port, sock)
+
+
+class PreforkMaster:
+    """启动并看护工作进程：工作进程意外退出时自动重启，收到 Ctrl+C / SIGTERM 时结束所有工作进程"""
+
+    def __init__(self, workers: int, mode: str = 'gevent', host: str = '127.0.0.1', port: int = 4000,
+                 reuse_port: bool = False):
+        self.workers = workers
+        self.mode = mode
+        self.host = host
+        self.port = port
+        self.reuse_port = reuse_port and hasattr(socket, 'SO_REUSEPORT')
+        if reuse_port and not self.reuse_port:
+            log.warning("\033[31m[多进程]当前系统不支持 SO_REUSEPORT，改为由主进程监听后共享给工作进程\033[0m")
+        # 工作进程以 spawn 方式启动，不继承主进程的线程和锁
+        self.context = multiprocessing.get_context('spawn')
+        self.processes = {}   # 工作进程编号 -> (进程, 启动时间)
+        self.failures = {}    # 工作进程编号 -> 连续快速退出次数
+        self.stopping = False
+        self.sock = None
+
+    def run(self):
+        # SO_REUSEPORT 模式下主进程只绑定不监听：占住端口并尽早发现端口冲突，但不会分到连接
+        self.sock = create_listener(self.host, self.port, self.reuse_port, listen=not self.reuse_port)
+        signal.signal(signal.SIGTERM, self._on_signal)
+        log.info(
+            f"\033[33m[服务启动]翻译服务在 http://{self.host}:{self.port}/translate 上启动，"
+            f"{self.workers} 个工作进程（{'SO_REUSEPORT' if self.reuse_port else '共享监听 socket'}）\n\033[0m"
+        )
+        try:
+            for worker_id in range(1, self.workers + 1):
+                self._start(worker_id)
+            self._supervise()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def _on_signal(self, signum, frame):
+        raise KeyboardInterrupt
+
+    def _start(self, worker_id: int):
+        sock = None if self.reuse_port else self.sock
+        process = self.context.Process(
+            target=_worker_main, args=(worker_id, self.mode, self.host, self.port, sock),
+            name=f'translate-worker-{worker_id}', daemon=True
+        )
+        process.start()
+        self.processes[worker_id] = (process, time.monotonic())
+
+    def _supervise(self):
+        restart_at = {}  # 工作进程编号 -> 计划重启的时间
+        while not self.stopping:
+            sentinels = {process.sentinel: worker_id for worker_id, (process, _) in self.processes.items()}
+            for sentinel in wait(list(sentinels), timeout=1):
+                worker_id = sentinels[sentinel]
+                process, started = self.processes.pop(worker_id)
+                process.join()
+                if time.monotonic() - started < STABLE_SECONDS:
+                    self.failures[worker_id] = self.failures.get(worker_id, 0) + 1
+                else:
+                    self.failures[worker_id] = 0
+                delay = min(2 ** self.failures[worker_id] - 1, RESTART_BACKOFF_MAX)
+                log.error(
+                    f"\033[31m[多进程]工作进程 {worker_id} 已退出（退出码 {process.exitcode}），"
+                    f"{delay} 秒后重启\033[0m"
+                )
+                restart_at[worker_id] = time.monotonic() + delay
+            now = time.monotonic()
+            for worker_id, when in list(restart_at.items()):
+                if when <= now:
+                    del restart_at[worker_id]
+                    self._start(worker_id)
+
+    def stop(self, timeout: float = 5):
+        """结束所有工作进程"""
+        self.stopping = True
+        for process, _ in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + timeout
+        for process, _ in self.processes.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.kill()
+        self.processes.clear()
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        log.info("\033[33m[多进程]所有工作进程已退出\033[0m")
@@ -0,0 +1,61 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# 固定在前缀中的字典说明；字典内容本身随请求变化，放在前缀之后
+GLOSSARY_RULE = '字典：若提示词末尾给出字典（JSON，键为原文、值为译文），翻译时请使用字典中的译法。'
+TEXT_HEADER = '以下是待翻译的游戏文本：'
+EXAMPLES_HEADER = '参考译例（相近句子的已有译文，请保持译法一致）：'
+
+
+class PromptBuilder:
+    """构建系统提示词：不变的前缀在前，每次请求变化的内容在后
+
+    DeepSeek 等兼容接口会缓存相同的提示词前缀（命中部分按折扣计费，首字也更快），
+    因此主提示词、额外提示词和字典说明组成的前缀每个config版本只拼接一次，
+    分隔符说明、命中的字典条目和参考译例追加在前缀之后。
+    """
+
+    def __init__(self, base_prompt: str):
+        self.base_prompt = base_prompt
+
+    def _prefix(self, snapshot) -> str:
+        prompt = self.base_prompt + "\n"
+        if snapshot.prompt_user:
+            prompt += snapshot.prompt_user + "\n"
+        return prompt + GLOSSARY_RULE + "\n"
+
+    def prefix(self, snapshot) -> str:
+        """当前config版本的固定前缀"""
+        return snapshot.derive('prompt_prefix', self._prefix)
+
+    @staticmethod
+    def format_glossary(dict_inuse: Dict[str, str]) -> str:
+        """紧凑的 JSON 格式（无多余空格），条目顺序与字典优先级一致，相同命中得到相同文本"""
+        return json.dumps(dict_inuse, ensure_ascii=False, separators=(',', ':'))
+
+    @staticmethod
+    def format_examples(examples: List[Tuple[str, str]]) -> str:
+        return '\n'.join(source + " → " + translation for source, translation in examples)
+
+    def build(self, snapshot, separator_symbol: str = "", dict_inuse: Optional[Dict[str, str]] = None,
+              examples: Optional[List[Tuple[str, str]]] = None) -> str:
+        prompt = self.prefix(snapshot)
+        if separator_symbol:
+            prompt += "格式例外：请不要对“" + separator_symbol + "”进行翻译！此符号为内容分段标志。\n"
+        if dict_inuse:
+            prompt += "字典：" + self.format_glossary(dict_inuse) + "\n"
+        if examples:
+            prompt += EXAMPLES_HEADER + "\n" + self.format_examples(examples) + "\n"
+        return prompt + TEXT_HEADER
+
+
+def cached_prompt_tokens(usage: Any) -> int:
+    """从 usage 中取出命中提示词缓存的 token 数（兼容 DeepSeek 与 OpenAI 的字段），没有时返回 0"""
+    cached = getattr(usage, 'prompt_cache_hit_tokens', None)
+    if cached is None:
+        details = getattr(usage, 'prompt_tokens_details', None)
+        if isinstance(details, dict):
+            cached = details.get('cached_tokens')
+        elif details is not None:
+            cached = getattr(details, 'cached_tokens', None)
+    return cached or 0
@@ -0,0 +1,135 @@
+import threading
+import time
+from typing import Any, Dict, List
+
+from translation_log import log
+
+
+class ProviderStats:
+    """单个云服务商的滚动统计（EWMA）与熔断状态"""
+
+    def __init__(self):
+        self.requests = 0
+        self.ttft = None          # 首个文本块耗时（秒）
+        self.tokens_per_sec = None  # 以流式文本块数近似 token 数
+        self.error_rate = 0.0
+        self.censor_rate = 0.0
+        self.rate_limits = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0     # 熔断截止时间，0 表示未熔断
+        self.trial_at = 0.0       # 冷却结束后放行试探请求的时间，试探期间不再放行其他请求
+
+
+class ProviderScheduler:
+    """根据各云服务商的实际表现调整 api_priority 的顺序，并对持续失败的云服务商熔断"""
+
+    def __init__(self, alpha: float = 0.3, failure_threshold: int = 5, cooldown: float = 30,
+                 default_ttft: float = 1.0):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.default_ttft = default_ttft
+        self.lock = threading.Lock()
+        self.providers: Dict[str, ProviderStats] = {}
+        self.last_decision: Dict[str, Any] = {}
+
+    def _get(self, api_type: str) -> ProviderStats:
+        stats = self.providers.get(api_type)
+        if stats is None:
+            stats = self.providers[api_type] = ProviderStats()
+        return stats
+
+    def _ewma(self, old, value):
+        return value if old is None else old + self.alpha * (value - old)
+
+    def score(self, stats: ProviderStats) -> float:
+        """分数越低越优先：首字耗时按错误率和审查率加权"""
+        ttft = stats.ttft if stats.ttft is not None else self.default_ttft
+        return ttft * (1 + 4 * stats.error_rate + 2 * stats.censor_rate)
+
+    def order(self, api_priority: List[str]) -> List[str]:
+        """返回本次请求使用的云服务商顺序（长度与 api_priority 相同，以保持原有的重试次数）"""
+        now = time.time()
+        with self.lock:
+            candidates = []
+            skipped = []
+            for position, api_type in enumerate(dict.fromkeys(api_priority)):
+                stats = self._get(api_type)
+                if stats.open_until > now:
+                    skipped.append(api_type)
+                    continue
+                if stats.open_until:
+                    # 冷却结束：放行一次试探请求（试探结果迟迟未返回时，下一个冷却周期后再放行）
+                    if stats.trial_at and now - stats.trial_at < self.cooldown:
+                        skipped.append(api_type)
+                        continue
+                    stats.trial_at = now
+                candidates.append((self.score(stats), position, api_type))
+
+            if not candidates:
+                # 全部熔断时按原顺序尝试，避免完全不可用
+                self.last_decision = {'order': list(api_priority), 'skipped': skipped, 'reason': '全部云服务商熔断，使用原顺序'}
+                return list(api_priority)
+
+            candidates.sort()
+            ordered = [api_type for _, _, api_type in candidates]
+            # 用表现最好的云服务商补足重试次数
+            while len(ordered) < len(api_priority):
+                ordered.append(ordered[0])
+            ordered = ordered[:max(len(api_priority), 1)]
+
+            self.last_decision = {
+                'order': ordered,
+                'skipped': skipped,
+                'scores': {api_type: round(score, 4) for score, _, api_type in candidates},
+                'reason': '按分数排序（首字耗时 × (1 + 4 × 错误率 + 2 × 审查率)）',
+            }
+            return ordered
+
+    def record_success(self, api_type: str, ttft: float, duration: float, chunks: int, censored: bool = False):
+        """记录一次完成的流式请求"""
+        with self.lock:
+            stats = self._get(api_type)
+            stats.requests += 1
+            stats.ttft = self._ewma(stats.ttft, ttft)
+            stream_time = duration - ttft
+            if chunks > 1 and stream_time > 0:
+                stats.tokens_per_sec = self._ewma(stats.tokens_per_sec, (chunks - 1) / stream_time)
+            stats.error_rate = self._ewma(stats.error_rate, 0.0)
+            stats.censor_rate = self._ewma(stats.censor_rate, 1.0 if censored else 0.0)
+            stats.consecutive_failures = 0
+            stats.open_until = 0.0
+            stats.trial_at = 0.0
+
+    def record_error(self, api_type: str, rate_limited: bool = False):
+        """记录一次失败的请求，连续失败达到阈值（或试探请求失败）时熔断"""
+        with self.lock:
+            stats = self._get(api_type)
+            stats.requests += 1
+            stats.error_rate = self._ewma(stats.error_rate, 1.0)
+            if rate_limited:
+                stats.rate_limits += 1
+            stats.consecutive_failures += 1
+            if stats.trial_at or stats.consecutive_failures >= self.failure_threshold:
+                stats.open_until = time.time() + self.cooldown
+                stats.trial_at = 0.0
+                log.error(f"\033[31m[调度]{api_type} 连续失败 {stats.consecutive_failures} 次，熔断 {self.cooldown} 秒\033[0m")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各云服务商的统计和最近一次的调度决策"""
+        now = time.time()
+        with self.lock:
+            providers = {
+                api_type: {
+                    'requests': stats.requests,
+                    'ttft_ms': round(stats.ttft * 1000, 1) if stats.ttft is not None else None,
+                    'tokens_per_sec': round(stats.tokens_per_sec, 1) if stats.tokens_per_sec is not None else None,
+                    'error_rate': round(stats.error_rate, 4),
+                    'censor_rate': round(stats.censor_rate, 4),
+                    'rate_limits': stats.rate_limits,
+                    'circuit': 'open' if stats.open_until > now else ('half_open' if stats.open_until else 'closed'),
+                    'score': round(self.score(stats), 4),
+                }
+                for api_type, stats in self.providers.items()
+            }
+            return {'providers': providers, 'last_decision': dict(self.last_decision)}
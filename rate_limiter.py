@@ -0,0 +1,271 @@
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# OpenAI 风格的重置时间，例如 "1s"、"6m0s"、"20ms"
+DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def parse_duration(value) -> Optional[float]:
+    """解析 Retry-After / x-ratelimit-reset-* 中的时长（秒），无法解析时返回 None"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = DURATION_PART.findall(value)
+    if not parts or ''.join(number + unit for number, unit in parts) != value:
+        return None  # 例如 HTTP 日期格式
+    return sum(float(number) * DURATION_UNITS[unit] for number, unit in parts)
+
+
+def retry_after(error) -> Optional[float]:
+    """从 429 错误的响应头中取出需要等待的秒数"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    milliseconds = parse_duration(headers.get('retry-after-ms'))
+    if milliseconds is not None:
+        return milliseconds / 1000
+    for name in ('retry-after', 'x-ratelimit-reset-requests', 'x-ratelimit-reset-tokens'):
+        seconds = parse_duration(headers.get(name))
+        if seconds is not None:
+            return seconds
+    return None
+
+
+class TokenBucket:
+    """令牌桶：以 rate 个/秒的速度补充，最多积累 capacity 个（调用方负责加锁）
+
+    取出的数量可以超过当前余额：余额变为负数，相当于预约了之后的额度，后续请求的等待时间会相应变长。
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """取出 amount 个令牌需要等待的秒数（超过 capacity 时按 capacity 计算）"""
+        self._refill(now)
+        need = min(amount, self.capacity)
+        return max(0.0, (need - self.tokens) / self.rate)
+
+    def take(self, amount: float):
+        self.tokens -= amount
+
+    def limit(self, remaining: float):
+        """按服务端返回的剩余额度收紧余额"""
+        self.tokens = min(self.tokens, remaining)
+
+
+class ProviderLimit:
+    """一个云服务商的限速状态：每分钟请求数（rpm）、每分钟 token 数（tpm）和服务端要求的暂停时间"""
+
+    def __init__(self, rpm: float, tpm: float, burst_seconds: float):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.burst_seconds = burst_seconds
+        self.requests = self._bucket(rpm)
+        self.tokens = self._bucket(tpm)
+        self.blocked_until = 0.0
+        self.stats = {'requests': 0, 'waited_seconds': 0.0, 'spilled': 0, 'throttled': 0}
+
+    def _bucket(self, per_minute: float) -> Optional[TokenBucket]:
+        if per_minute <= 0:
+            return None
+        rate = per_minute / 60
+        return TokenBucket(rate, rate * self.burst_seconds)
+
+    def learn(self, rpm: float = 0, tpm: float = 0):
+        """未配置限额时使用响应头中的 x-ratelimit-limit-*"""
+        if rpm > 0 and self.rpm <= 0:
+            self.rpm, self.requests = rpm, self._bucket(rpm)
+        if tpm > 0 and self.tpm <= 0:
+            self.tpm, self.tokens = tpm, self._bucket(tpm)
+
+    def delay(self, tokens: float, now: float) -> float:
+        delay = max(0.0, self.blocked_until - now)
+        if self.requests is not None:
+            delay = max(delay, self.requests.delay(1, now))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.delay(tokens, now))
+        return delay
+
+    def take(self, tokens: float):
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(tokens)
+
+    def give_back(self, tokens: float):
+        """归还 take 取出的额度"""
+        for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+            if bucket is not None:
+                bucket.tokens = min(bucket.capacity, bucket.tokens + amount)
+
+
+class ProviderRateLimiter:
+    """按云服务商的请求数和 token 数限速，所有请求共享
+
+    发送请求前调用 reserve 预约额度：需要等待的时间不超过 max_wait 时返回等待秒数（由调用方等待，
+    异步服务中使用 asyncio.sleep），否则不占用额度并返回 None，调用方改用 api_priority 中的下一个云服务商。
+    收到 429 或 x-ratelimit-* 响应头时按服务端给出的时间暂停该云服务商。
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.lock = threading.Lock()
+        self.providers: Dict[str, ProviderLimit] = {}
+        self.overrides: Dict[str, float] = {}
+        self.configure(config or {})
+
+    def configure(self, config: Dict[str, Any]):
+        """按 config 的 rate_limit 段与 api_keys 中的 rpm/tpm 设置限额（config重载时调用）"""
+        rate_config = config.get('rate_limit', {})
+        with self.lock:
+            self.enabled = rate_config.get('enabled', True)
+            self.max_wait = rate_config.get('max_wait', 1.0)
+            self.burst_seconds = rate_config.get('burst_seconds', 10)
+            self.default_backoff = rate_config.get('default_backoff', 5)
+            self.use_headers = rate_config.get('use_headers', True)
+            self.limits = {
+                api_type: (
+                    api_config.get('rpm', rate_config.get('rpm', 0)),
+                    api_config.get('tpm', rate_config.get('tpm', 0))
+                )
+                for api_type, api_config in config.get('api_keys', {}).items()
+            }
+            self.default_limits = (rate_config.get('rpm', 0), rate_config.get('tpm', 0))
+            # 限额变化的云服务商重新创建令牌桶，暂停时间和统计保留
+            for api_type, provider in list(self.providers.items()):
+                rpm, tpm = self._limits(api_type)
+                if (rpm, tpm) != (provider.rpm, provider.tpm):
+                    self.providers[api_type] = self._rebuild(provider, rpm, tpm)
+
+    def override(self, rpm: float = None, tpm: float = None, final_wait: float = None):
+        """统一设置所有云服务商的限额（例如预翻译时的 --tokens-per-sec），优先于 config
+
+        final_wait 为最后一个云服务商等待额度的最长秒数（批量任务可设为 inf，一直等到有额度）。
+        """
+        with self.lock:
+            for name, value in (('rpm', rpm), ('tpm', tpm), ('final_wait', final_wait)):
+                if value is not None:
+                    self.overrides[name] = value
+            for api_type, provider in list(self.providers.items()):
+                self.providers[api_type] = self._rebuild(provider, *self._limits(api_type))
+
+    def _limits(self, api_type: str):
+        rpm, tpm = self.limits.get(api_type, self.default_limits)
+        return self.overrides.get('rpm', rpm), self.overrides.get('tpm', tpm)
+
+    def _rebuild(self, provider: ProviderLimit, rpm: float, tpm: float) -> ProviderLimit:
+        rebuilt = ProviderLimit(rpm, tpm, self.burst_seconds)
+        rebuilt.blocked_until = provider.blocked_until
+        rebuilt.stats = provider.stats
+        return rebuilt
+
+    def _provider(self, api_type: str) -> ProviderLimit:
+        """调用方需持有 self.lock"""
+        provider = self.providers.get(api_type)
+        if provider is None:
+            provider = self.providers[api_type] = ProviderLimit(*self._limits(api_type), self.burst_seconds)
+        return provider
+
+    def reserve(self, api_type: str, tokens: float, max_wait: float = None) -> Optional[float]:
+        """预约一次请求（tokens 为预计消耗的 token 数），返回需要等待的秒数；超过 max_wait 时返回 None
+
+        还可以切换到下一个云服务商时 max_wait 传入 None（使用 rate_limit.max_wait），
+        最后一个云服务商由调用方传入可接受的等待时间。
+        """
+        if not self.enabled and not self.overrides:
+            return 0.0
+        if max_wait is None:
+            max_wait = self.max_wait
+        else:
+            max_wait = max(max_wait, self.overrides.get('final_wait', 0))
+        now = time.monotonic()
+        with self.lock:
+            provider = self._provider(api_type)
+            delay = provider.delay(tokens, now)
+            if delay > max_wait:
+                provider.stats['spilled'] += 1
+                return None
+            provider.take(tokens)
+            provider.stats['requests'] += 1
+            provider.stats['waited_seconds'] += delay
+            return delay
+
+    def release(self, api_type: str, tokens: float, waited: float = 0):
+        """撤销一次 reserve 的预约（预约后决定不发送请求时调用，waited 为 reserve 返回的等待秒数）"""
+        with self.lock:
+            provider = self._provider(api_type)
+            provider.give_back(tokens)
+            provider.stats['requests'] -= 1
+            provider.stats['waited_seconds'] -= waited
+
+    def sleep_limit(self) -> float:
+        """服务端工作线程中最多原地等待额度的秒数（rate_limit.max_wait；批量任务设置了 final_wait 时按 final_wait）"""
+        with self.lock:
+            return max(self.max_wait, self.overrides.get('final_wait', 0))
+
+    def delay(self, api_type: str, tokens: float = 0) -> float:
+        """当前预约需要等待的秒数（不占用额度）"""
+        with self.lock:
+            return self._provider(api_type).delay(tokens, time.monotonic())
+
+    def penalize(self, api_type: str, seconds: Optional[float] = None):
+        """收到 429：在服务端要求的时间内（没有给出时为 default_backoff）不再向该云服务商发送请求"""
+        seconds = self.default_backoff if seconds is None else seconds
+        with self.lock:
+            provider = self._provider(api_type)
+            provider.blocked_until = max(provider.blocked_until, time.monotonic() + seconds)
+            provider.stats['throttled'] += 1
+
+    def update_from_headers(self, api_type: str, headers):
+        """根据响应头 x-ratelimit-* 同步剩余额度，额度用完时暂停到重置时间"""
+        if not headers or not self.enabled or not self.use_headers:
+            return
+        limit_requests = parse_duration(headers.get('x-ratelimit-limit-requests'))
+        limit_tokens = parse_duration(headers.get('x-ratelimit-limit-tokens'))
+        remaining_requests = parse_duration(headers.get('x-ratelimit-remaining-requests'))
+        remaining_tokens = parse_duration(headers.get('x-ratelimit-remaining-tokens'))
+        if remaining_requests is None and remaining_tokens is None and limit_requests is None and limit_tokens is None:
+            return
+        now = time.monotonic()
+        with self.lock:
+            provider = self._provider(api_type)
+            provider.learn(limit_requests or 0, limit_tokens or 0)
+            for remaining, bucket, reset_header in (
+                (remaining_requests, provider.requests, 'x-ratelimit-reset-requests'),
+                (remaining_tokens, provider.tokens, 'x-ratelimit-reset-tokens'),
+            ):
+                if remaining is None:
+                    continue
+                if bucket is not None:
+                    bucket.limit(remaining)
+                if remaining <= 0:
+                    reset = parse_duration(headers.get(reset_header))
+                    provider.blocked_until = max(provider.blocked_until, now + (reset or self.default_backoff))
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self.lock:
+            return {
+                api_type: {
+                    'rpm': provider.rpm,
+                    'tpm': provider.tpm,
+                    **provider.stats,
+                    'waited_seconds': round(provider.stats['waited_seconds'], 3),
+                    'blocked_for': round(max(0.0, provider.blocked_until - now), 3),
+                }
+                for api_type, provider in self.providers.items()
+            }
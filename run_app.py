@@ -1,50 +1,270 @@
+import argparse  # 导入 argparse，用于解析命令行参数
 import concurrent.futures  # 导入 concurrent.futures，用于线程池
-from flask import Flask, request  # 导入 Flask 库，用于创建 Web 应用，需要安装：pip install Flask
+import json
+import time
+from flask import Flask, Response, request, jsonify  # 导入 Flask 库，用于创建 Web 应用，需要安装：pip install Flask
+from gevent.threadpool import ThreadPoolExecutor  # 导入 gevent 的线程池，其 Future 可在协程中等待而不阻塞事件循环
 from gevent.pywsgi import WSGIServer  # 导入 gevent 的 WSGIServer，用于提供高性能的异步服务器，需要安装：pip install gevent
-from queue import Queue  # 导入 Queue，用于创建线程安全的队列
+from gevent import socket as gevent_socket
 from translation_service import TranslationService
+from micro_batcher import MicroBatcher
+from worker_pool import WorkerPool, PoolFullError
+from translation_log import log
 
 app = Flask(__name__) # 创建 Flask 应用实例
-translation_service = TranslationService()
+
+# 以下对象由 setup() 创建：多进程模式下每个工作进程各自创建一份
+translation_service = None
+worker_pool = None
+micro_batcher = None
+request_timeout = 30
+retry_after = '2'
+
+def setup():
+    """创建翻译服务、工作线程池和微批处理"""
+    global translation_service, worker_pool, micro_batcher, request_timeout, retry_after
+    translation_service = TranslationService()
+
+    # 全局共享的工作线程池：线程数和等待队列长度由 config.json 的 server 段配置
+    server_config = translation_service.get_current_config().get('server', {})
+    worker_pool = WorkerPool(
+        max_workers=server_config.get('max_workers', 32),
+        max_pending=server_config.get('max_pending', 64),
+        executor_factory=ThreadPoolExecutor
+    )
+    request_timeout = server_config.get('request_timeout', 30)
+    retry_after = str(server_config.get('retry_after', 2))
+
+    # 可选的服务端微批处理：短时间窗口内收集并发的单行请求，合并为一次 API 调用
+    batch_config = translation_service.get_current_config().get('batching', {})
+    if batch_config.get('micro_batch', False):
+        micro_batcher = MicroBatcher(
+            translation_service.translate_batch,
+            window=batch_config.get('window_ms', 20) / 1000,
+            max_batch=batch_config.get('max_batch', 16)
+        )
+
+def wait_micro_batch(text):
+    return micro_batcher.translate(text, timeout=request_timeout)
+
+def run_queued(queue_trace, submitted_at, func, *args, **kwargs):
+    """在工作线程中执行 func，并记录在线程池中的排队耗时（func 的参数中也可以有 trace）"""
+    queue_trace.add('queue', time.perf_counter() - submitted_at)
+    return func(*args, **kwargs)
 
 @app.route('/translate', methods=['GET'])
 def translate():
     """同步接口（优化打印逻辑）"""
     text = request.args.get('text')
-    
-    print(f"\033[36m[原文]\033[0m \033[35m{text}\033[0m")
-    
-    translation_queue = Queue()
-    
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future = executor.submit(
-            translation_service.handle_translation,
-            text,
-            translation_queue,
-            print_debug=True
-        )
+    log_results = log.enabled('results')  # 按 logging.sample_rate 抽样，同一请求的原文和译文一起输出
+    if log_results:
+        log.info(f"\033[36m[原文]\033[0m \033[35m{text}\033[0m")
+
+    trace = translation_service.metrics.start_trace('translate')
+    status = 200
+    try:
+        # 内存缓存命中时直接返回，不经过线程池；共享存储（SQLite / Redis）的查询在工作线程中进行，不阻塞事件循环
+        with trace.span('cache'):
+            cached = translation_service.lookup_cache(text, memory_only=True)
+        if cached is not None:
+            trace.set(cache_hit=True)
+            if log_results:
+                log.info(f"\033[36m[译文][缓存]\033[0m \033[1;32m{cached}\n\033[0m")
+            return cached
+
+        if micro_batcher is not None and text and '\n' not in text:
+            future = worker_pool.submit(run_queued, trace, time.perf_counter(), wait_micro_batch, text)
+        else:
+            future = worker_pool.submit(
+                run_queued, trace, time.perf_counter(),
+                translation_service.translate, text, print_debug=True, trace=trace
+            )
+        result = future.result(timeout=request_timeout)
+
+        if result.startswith("[ERROR]"):
+            status = 500
+            return result, 500
+
+        if log_results:
+            log.info(f"\033[36m[译文]\033[0m \033[1;32m{result}\n\033[0m")
+        return result
+
+    except PoolFullError:
+        status = 503
+        return "[ERROR]服务繁忙，请稍后重试", 503, {'Retry-After': retry_after}
+    except concurrent.futures.TimeoutError:
+        status = 500
+        return "[ERROR]翻译超时", 500
+    except Exception as e:
+        status = 500
+        return f"[ERROR]系统错误: {str(e)}", 500
+    finally:
+        trace.finish(status=status)
+
+@app.route('/translate/stream', methods=['GET'])
+def translate_stream():
+    """流式接口：边翻译边返回（默认分块传输纯文本，format=sse 或 Accept: text/event-stream 时使用 SSE）"""
+    text = request.args.get('text')
+    if not text:
+        return "[ERROR]缺少 text 参数", 400
+    use_sse = request.args.get('format') == 'sse' or 'text/event-stream' in request.headers.get('Accept', '')
+
+    log_results = log.enabled('results')
+    if log_results:
+        log.info(f"\033[36m[原文][流式]\033[0m \033[35m{text}\033[0m")
+
+    trace = translation_service.metrics.start_trace('stream')
+    pieces = translation_service.iter_translation(text, print_debug=True, trace=trace)
+    sentinel = object()
+
+    def close_after(future):
+        """生成器可能仍在工作线程中执行，等这一步结束后再关闭（释放云服务商连接和并发名额）"""
+        future.add_done_callback(lambda _: pieces.close())
+
+    # 生成器在工作线程中逐段推进，协程只等待结果，不阻塞事件循环
+    try:
+        future = worker_pool.submit(run_queued, trace, time.perf_counter(), next, pieces, sentinel)
+        first = future.result(timeout=request_timeout)
+    except PoolFullError:
+        pieces.close()
+        trace.finish(status=503)
+        return "[ERROR]服务繁忙，请稍后重试", 503, {'Retry-After': retry_after}
+    except concurrent.futures.TimeoutError:
+        close_after(future)
+        trace.finish(status=500)
+        return "[ERROR]翻译超时", 500
+    except Exception as e:
+        close_after(future)
+        trace.finish(status=500)
+        return f"[ERROR]系统错误: {str(e)}", 500
+
+    def generate():
+        piece = first
+        last = future
         try:
-            future.result(timeout=30)
-            result = translation_queue.get()
-            
-            if result.startswith("[ERROR]"):
-                return result, 500
-                  
-            print(f"\n\033[36m[译文]\033[0m \033[1;32m{result}\n\033[0m")
-            return result
-            
-        except concurrent.futures.TimeoutError:
-            return "[ERROR]翻译超时", 500
-        except Exception as e:
-            return f"[ERROR]系统错误: {str(e)}", 500
+            while piece is not sentinel:
+                if use_sse:
+                    yield ''.join(f"data: {line}\n" for line in piece.split('\n')) + "\n"
+                else:
+                    yield piece
+                last = worker_pool.submit_continuation(next, pieces, sentinel)
+                piece = last.result(timeout=request_timeout)
+            if use_sse:
+                yield "event: done\ndata: \n\n"
+        finally:
+            close_after(last)
+            trace.finish(status=200)
+
+    mimetype = 'text/event-stream' if use_sse else 'text/plain'
+    return Response(generate(), mimetype=mimetype, headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/translate/batch', methods=['POST'])
+def translate_batch():
+    """批量接口：请求体为 {"texts": [...]}，返回 {"translations": [...]}"""
+    payload = request.get_json(silent=True)
+    texts = payload.get('texts') if isinstance(payload, dict) else payload
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+        return jsonify({"error": "请求体应为 {\"texts\": [\"...\"]}"}), 400
+
+    log_results = log.enabled('results')
+    if log_results:
+        log.info(f"\033[36m[批量原文]\033[0m \033[35m{len(texts)} 条\033[0m")
+
+    trace = translation_service.metrics.start_trace('batch', texts=len(texts))
+    status = 200
+    try:
+        future = worker_pool.submit(
+            run_queued, trace, time.perf_counter(),
+            translation_service.translate_batch, texts, print_debug=True, trace=trace
+        )
+        results = future.result(timeout=max(request_timeout, 5 * len(texts)))
+        return jsonify({"translations": results})
+    except PoolFullError:
+        status = 503
+        return jsonify({"error": "服务繁忙，请稍后重试"}), 503, {'Retry-After': retry_after}
+    except concurrent.futures.TimeoutError:
+        status = 500
+        return jsonify({"error": "翻译超时"}), 500
+    except Exception as e:
+        status = 500
+        return jsonify({"error": f"系统错误: {str(e)}"}), 500
+    finally:
+        trace.finish(status=status)
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """运行统计（缓存命中率等）"""
+    stats = translation_service.get_stats()
+    stats['worker_pool'] = worker_pool.get_stats()
+    if micro_batcher is not None:
+        stats['micro_batch'] = micro_batcher.get_stats()
+    return jsonify(stats)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus 格式的分阶段耗时与计数（需在 config.json 中开启 metrics.enabled）"""
+    pool_stats = worker_pool.get_stats()
+    cache_stats = translation_service.cache.get_stats() if translation_service.cache is not None else {}
+    gauges = {
+        'queue_depth': pool_stats['queue_depth'],
+        'running_workers': pool_stats['running'],
+        'cache_entries': cache_stats.get('memory_entries'),
+        'cache_hit_rate': cache_stats.get('hit_rate'),
+    }
+    body = translation_service.metrics.render_prometheus(gauges)
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+def serve(mode, host, port, sock=None):
+    """启动 gevent 服务器（mode 为 async 时改用 asyncio + AsyncOpenAI 的异步服务）
+
+    sock 为多进程模式下已绑定端口的监听 socket，为 None 时自行监听 host:port。
+    """
+    if mode == 'async':
+        from async_app import serve as serve_async
+        serve_async(translation_service, host, port, sock=sock)
+        return
+
+    if sock is None:
+        log.info(f"\033[33m[服务启动]翻译服务在 http://{host}:{port}/translate 上启动\n\033[0m") # 打印服务器启动信息，提示用户访问地址
+        listener = (host, port)
+    else:
+        listener = gevent_socket.socket(sock.family, sock.type, fileno=sock.detach()) # 转换为 gevent 的 socket，accept 时不阻塞事件循环
+    http_server = WSGIServer(listener, app, log=None, error_log=None) # 创建 gevent WSGIServer 实例，使用 Flask app 处理请求，禁用访问日志和错误日志 (log=None, error_log=None)
+    http_server.serve_forever() # 启动 gevent 服务器，无限循环运行，等待和处理客户端请求
+
+def load_server_config(config_path='config.json'):
+    """读取 config.json 的 server 段（多进程模式的主进程不创建翻译服务，只需要监听设置）"""
+    try:
+        with open(config_path, 'r', encoding='utf8') as f:
+            return json.load(f).get('server', {})
+    except (OSError, ValueError):
+        return {}
 
 def main():
     """
-    主函数，启动 Flask 应用和 gevent 服务器。
+    主函数，启动 Flask 应用和 gevent 服务器（--server async 时改用 asyncio + AsyncOpenAI 的异步服务，
+    --workers 大于 1 时启动多个工作进程共同监听同一端口）。
     """
-    print("\033[33m[服务启动]翻译服务在 http://127.0.0.1:4000/translate 上启动\n\033[0m") # 打印服务器启动信息，提示用户访问地址
-    http_server = WSGIServer(('127.0.0.1', 4000), app, log=None, error_log=None) # 创建 gevent WSGIServer 实例，监听 127.0.0.1:4000 端口，使用 Flask app 处理请求，禁用访问日志和错误日志 (log=None, error_log=None)
-    http_server.serve_forever() # 启动 gevent 服务器，无限循环运行，等待和处理客户端请求
+    server_config = load_server_config()
+    parser = argparse.ArgumentParser(description='XUnity.AutoTranslator 翻译服务')
+    parser.add_argument('--server', choices=['gevent', 'async'], default=server_config.get('mode', 'gevent'),
+                        help='服务器模式：gevent（默认，Flask + 线程池）或 async（asyncio + AsyncOpenAI）')
+    parser.add_argument('--host', default=server_config.get('host', '127.0.0.1'),
+                        help='监听地址，局域网内其他机器访问时设为 0.0.0.0')
+    parser.add_argument('--port', type=int, default=server_config.get('port', 4000), help='监听端口')
+    parser.add_argument('--workers', type=int, default=server_config.get('workers', 1),
+                        help='工作进程数，大于 1 时启用多进程模式')
+    parser.add_argument('--reuse-port', action='store_true', default=server_config.get('reuse_port', False),
+                        help='多进程模式下每个工作进程各自监听（SO_REUSEPORT，由内核分配连接，仅 Linux/BSD）')
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        from prefork import PreforkMaster
+        PreforkMaster(args.workers, args.server, args.host, args.port, args.reuse_port).run()
+        return
+
+    setup()
+    serve(args.server, args.host, args.port)
 
 if __name__ == '__main__':
     main() # 当脚本作为主程序运行时，调用 main 函数启动服务器
@@ -0,0 +1,110 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """合并相同的并发请求：同一 key 同时只执行一次，其余调用等待并共享同一结果"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight: Dict[Hashable, concurrent.futures.Future] = {}
+        self.stats = {
+            'calls': 0,
+            'executed': 0,
+            'deduplicated': 0,
+        }
+
+    def do(self, key: Hashable, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """执行 func，若相同 key 的调用正在进行中则等待其结果"""
+        with self.lock:
+            self.stats['calls'] += 1
+            future = self.in_flight.get(key)
+            if future is not None:
+                self.stats['deduplicated'] += 1
+                leader = False
+            else:
+                future = concurrent.futures.Future()
+                self.in_flight[key] = future
+                self.stats['executed'] += 1
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.stats)
+            stats['in_flight'] = len(self.in_flight)
+        return stats
+
+
+class AsyncSingleFlight:
+    """SingleFlight 的 asyncio 版本，需在同一个事件循环内使用
+
+    翻译在单独的任务中执行，某个等待者超时或被取消不会影响其他等待者；所有等待者都离开后才取消该任务。
+    """
+
+    def __init__(self):
+        self.in_flight: Dict[Hashable, list] = {}  # key -> [任务, 等待者数量]
+        self.stats = {
+            'calls': 0,
+            'executed': 0,
+            'deduplicated': 0,
+        }
+
+    async def do(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """执行协程函数 func，若相同 key 的调用正在进行中则等待其结果"""
+        self.stats['calls'] += 1
+        flight = self.in_flight.get(key)
+        if flight is not None:
+            self.stats['deduplicated'] += 1
+        else:
+            flight = [asyncio.ensure_future(func(*args, **kwargs)), 0]
+            self.in_flight[key] = flight
+            flight[0].add_done_callback(lambda task: self._finished(key, flight))
+            self.stats['executed'] += 1
+
+        task = flight[0]
+        flight[1] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.done():
+                # 任务本身被取消（而不是当前等待者），按超时处理
+                raise asyncio.TimeoutError("合并的翻译请求已被取消")
+            raise
+        finally:
+            flight[1] -= 1
+            if flight[1] == 0 and not task.done():
+                task.cancel()
+                self._forget(key, flight)
+
+    def _forget(self, key: Hashable, flight: list):
+        if self.in_flight.get(key) is flight:
+            del self.in_flight[key]
+
+    def _finished(self, key: Hashable, flight: list):
+        self._forget(key, flight)
+        task = flight[0]
+        if not task.cancelled():
+            # 没有等待者时避免 "exception was never retrieved" 警告
+            task.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats['in_flight'] = len(self.in_flight)
+        return stats
@@ -0,0 +1,94 @@
+"""
+标点处理的等价性测试：text_processing 中预编译的实现应与原先逐条检查的实现（保留在
+benchmarks/punctuation_benchmark.py 的 reference_* 函数中）在随机生成的文本上输出完全一致。
+
+    python -m pytest tests/test_text_processing.py
+"""
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+
+from text_processing import (  # noqa: E402
+    StreamingRestorer, handle_paired_symbols, remove_text_special_chars,
+    restore_text_special_chars, restore_paired_symbols
+)
+from punctuation_benchmark import (  # noqa: E402
+    random_chunks, random_text, random_translation,
+    reference_handle_paired_symbols, reference_remove_text_special_chars,
+    reference_restore_text_special_chars, reference_restore_paired_symbols
+)
+
+SEEDS = range(8)
+CASES = 2500  # 每个种子的随机用例数
+
+FIXED_TEXTS = [
+    '',
+    '「こんにちは、ルーシーだよ！」',
+    '『「（"深くネストした括弧"）」』',
+    '「' * 40 + 'ネスト' + '」' * 40,
+    '「' * 40 + '閉じていない括弧',
+    '"引号不成对',
+    '……！？' + 'あ' * 20 + '。。。♡',
+]
+
+
+def random_cases(seed):
+    rng = random.Random(seed)
+    for _ in range(CASES):
+        yield rng, random_text(rng), random_translation(rng)
+
+
+@pytest.mark.parametrize('text', FIXED_TEXTS)
+def test_fixed_texts(text):
+    stripped, removed_symbols = handle_paired_symbols(text)
+    assert (stripped, removed_symbols) == reference_handle_paired_symbols(text)
+    assert remove_text_special_chars(stripped) == reference_remove_text_special_chars(stripped)
+    _, start_chars, end_chars = remove_text_special_chars(stripped)
+    restored = restore_paired_symbols(restore_text_special_chars(stripped, start_chars, end_chars), removed_symbols)
+    assert restored == text
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_handle_paired_symbols(seed):
+    for _, source, _ in random_cases(seed):
+        assert handle_paired_symbols(source) == reference_handle_paired_symbols(source), source
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_remove_text_special_chars(seed):
+    for _, source, _ in random_cases(seed):
+        stripped, _ = handle_paired_symbols(source)
+        assert remove_text_special_chars(stripped) == reference_remove_text_special_chars(stripped), stripped
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_restore(seed):
+    for _, source, translation in random_cases(seed):
+        stripped, removed_symbols = handle_paired_symbols(source)
+        _, start_chars, end_chars = remove_text_special_chars(stripped)
+
+        restored = restore_text_special_chars(translation, start_chars, end_chars)
+        assert restored == reference_restore_text_special_chars(translation, start_chars, end_chars), translation
+        assert restore_paired_symbols(restored, removed_symbols) == \
+            reference_restore_paired_symbols(restored, removed_symbols), (restored, removed_symbols)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_streaming_restorer(seed):
+    """流式还原：依次输出的内容拼接后应与对完整译文还原的结果一致"""
+    for rng, source, translation in random_cases(seed):
+        stripped, removed_symbols = handle_paired_symbols(source)
+        _, start_chars, end_chars = remove_text_special_chars(stripped)
+        expected = reference_restore_paired_symbols(
+            reference_restore_text_special_chars(translation, start_chars, end_chars), removed_symbols
+        )
+
+        restorer = StreamingRestorer(start_chars, end_chars, removed_symbols, holdback=rng.choice([0, 9]))
+        streamed = ''.join(restorer.feed(chunk) for chunk in random_chunks(rng, translation)) + restorer.finish()
+        assert streamed == expected, (translation, start_chars, end_chars, removed_symbols)
@@ -1,4 +1,4 @@
-from typing import Tuple, List
+from typing import Dict, Tuple, List
 
 SPECIAL_CHARS = [
         '，', '。', '？', '！', '、', '…', '—', '~', '～',
@@ -22,87 +22,113 @@ for pair in PAIRS_TO_CHECK:
 # 合并两个列表，并去除可能重复的元素
 combined_chars = list(set(SPECIAL_CHARS + new_chars))
 
+class PunctuationEngine:
+    """预编译的标点处理：由 SPECIAL_CHARS 和 PAIRS_TO_CHECK 生成查找表，结果与逐条检查的实现一致
+
+    - 成对符号：用下标收缩文本窗口，并维护窗口内各符号的计数，不再反复调用 text.count 和切片
+    - 句首/句末特殊符号：用 str.lstrip/rstrip 一次扫描
+    - 还原：前缀和后缀各拼接一次
+    """
+
+    def __init__(self, special_chars, pairs):
+        # PAIRS_TO_CHECK 中的每一项按 (开头符号, 结尾符号) 解包，与原实现相同
+        pairs = [(start_char, end_char) for start_char, end_char in pairs]
+        for start_char, end_char in pairs:
+            if len(start_char) != 1 or len(end_char) != 1:
+                raise ValueError(f"成对符号必须是单个字符: {start_char!r}, {end_char!r}")
+        # 开头符号、结尾符号各自不重复，因此每个字符最多对应一项
+        self.end_of: Dict[str, str] = dict(pairs)
+        self.start_of: Dict[str, str] = {end_char: start_char for start_char, end_char in pairs}
+        if len(self.end_of) != len(pairs) or len(self.start_of) != len(pairs):
+            raise ValueError("成对符号的开头符号和结尾符号不能重复")
+        self.symbols = tuple({char for pair in pairs for char in pair})
+        self.special_set = frozenset(special_chars) | frozenset(self.symbols)
+        self.special_str = ''.join(sorted(self.special_set))
+
+    def handle_paired_symbols(self, text: str) -> Tuple[str, List[tuple]]:
+        removed_symbols = []
+        end_of, start_of = self.end_of, self.start_of
+        counts = None  # 窗口内各符号的数量，第一次需要比较数量时才统计
+        lo, hi = 0, len(text)
+        while lo < hi:
+            first, last = text[lo], text[hi - 1]
+            if first not in end_of and last not in start_of:
+                break  # 两端都不是成对符号（大多数文本）
+
+            # 优先检查成对符号（开头和结尾刚好是一对）
+            if end_of.get(first) == last:
+                removed_symbols.append(("pair", first, last))
+                if hi - lo == 1:  # 只剩一个引号，同时作为开头和结尾
+                    lo = hi
+                    break
+                if counts is not None:
+                    counts[first] -= 1
+                    counts[last] -= 1
+                lo += 1
+                hi -= 1
+                continue
+
+            if counts is None:
+                counts = {char: text.count(char, lo, hi) for char in self.symbols}
+
+            removed = False
+            # 检查开头单边符号（英文引号数量为单数时去除，其他符号在开头多于结尾时去除）
+            end_char = end_of.get(first)
+            if end_char is not None:
+                if counts[first] % 2 == 1 if first == '"' else counts[first] > counts[end_char]:
+                    removed_symbols.append(("start", first))
+                    counts[first] -= 1
+                    lo += 1
+                    removed = True
+
+            # 检查结尾单边符号
+            if lo < hi:
+                last = text[hi - 1]
+                start_char = start_of.get(last)
+                if start_char is not None:
+                    if counts[last] % 2 == 1 if last == '"' else counts[last] > counts[start_char]:
+                        removed_symbols.append(("end", last))
+                        counts[last] -= 1
+                        hi -= 1
+                        removed = True
+
+            if not removed:
+                break
+        return text[lo:hi], removed_symbols
+
+    def remove_text_special_chars(self, text: str) -> Tuple[str, List[str], List[str]]:
+        start_length = len(text) - len(text.lstrip(self.special_str))
+        end_length = len(text) - len(text.rstrip(self.special_str))
+        return text, list(text[:start_length]), list(text[len(text) - end_length:])
+
+    def restore_text_special_chars(self, text: str, text_start_special_chars: List[str],
+                                   text_end_special_chars: List[str]) -> str:
+        return ''.join(text_start_special_chars) + text.strip(self.special_str) + ''.join(text_end_special_chars)
+
+    def restore_paired_symbols(self, text: str, removed_symbols: List[tuple]) -> str:
+        # 先去除的符号在最外层：前缀按去除顺序、后缀按相反顺序拼接
+        prefix = [info[1] for info in removed_symbols if info[0] in ("pair", "start")]
+        suffix = [info[-1] for info in reversed(removed_symbols) if info[0] != "start"]
+        if not prefix and not suffix:
+            return text
+        return ''.join(prefix) + text + ''.join(suffix)
+
+
+ENGINE = PunctuationEngine(SPECIAL_CHARS, PAIRS_TO_CHECK)
+
+
 def handle_paired_symbols(text: str) -> Tuple[str, List[tuple]]:
     """检测并去除成对符号"""
-    removed_symbols = []
-    
-    while True:
-        removed = False
-        # 优先检查成对符号（开头和结尾刚好是一对）
-        for start_char, end_char in PAIRS_TO_CHECK:
-            if text.startswith(start_char) and text.endswith(end_char):
-                text = text[len(start_char):-len(end_char)]
-                removed_symbols.append(("pair", start_char, end_char))
-                removed = True
-                break
-        if removed:
-            continue
-            
-        # 检查开头单边符号（英文引号特殊处理）
-        for start_char, end_char in PAIRS_TO_CHECK:
-            if text.startswith(start_char):
-                # 英文引号特殊规则
-                if start_char == '"':
-                    quote_count = text.count('"')
-                    if quote_count % 2 == 1:  # 单数则去除
-                        text = text[len(start_char):]
-                        removed_symbols.append(("start", start_char))
-                        removed = True
-                        break
-                else:
-                    # 其他符号保持原规则
-                    start_count = text.count(start_char)
-                    end_count = text.count(end_char)
-                    if start_count > end_count:
-                        text = text[len(start_char):]
-                        removed_symbols.append(("start", start_char))
-                        removed = True
-                        break
-                        
-        # 检查结尾单边符号（英文引号特殊处理）
-        for start_char, end_char in PAIRS_TO_CHECK:
-            if text.endswith(end_char):
-                # 英文引号特殊规则
-                if end_char == '"':
-                    quote_count = text.count('"')
-                    if quote_count % 2 == 1:  # 单数则去除
-                        text = text[:-len(end_char)]
-                        removed_symbols.append(("end", end_char))
-                        removed = True
-                        break
-                else:
-                    # 其他符号保持原规则
-                    start_count = text.count(start_char)
-                    end_count = text.count(end_char)
-                    if end_count > start_count:
-                        text = text[:-len(end_char)]
-                        removed_symbols.append(("end", end_char))
-                        removed = True
-                        break
-                        
-        if not removed:
-            break
-    
-    return text, removed_symbols
+    return ENGINE.handle_paired_symbols(text)
 
 def remove_text_special_chars(text: str) -> Tuple[str, List[str], List[str]]:
     """检测句首和句末特殊符号，不做删除，返回完整文本、句首特殊符号列表、句末特殊符号列表"""
+    return ENGINE.remove_text_special_chars(text)
 
-    # 检测句首特殊符号
-    text_start_special_chars = []
-    i = 0
-    while i < len(text) and text[i] in combined_chars:
-        text_start_special_chars.append(text[i])
-        i += 1
 
-    # 检测句末特殊符号
-    text_end_special_chars = []
-    i = len(text) - 1
-    while i >= 0 and text[i] in combined_chars:
-        text_end_special_chars.insert(0, text[i])
-        i -= 1
-
-    return text, text_start_special_chars, text_end_special_chars
+def strip_text_special_chars(text: str) -> str:
+    """去除句首和句末特殊符号"""
+    return text.strip(ENGINE.special_str)
 
 
 def restore_text_special_chars(
@@ -111,34 +137,60 @@ def restore_text_special_chars(
     text_end_special_chars: List[str]
 ) -> str:
     """去除当前文本句首/句末特殊符号，然后添加指定的句首/句末特殊符号"""
+    return ENGINE.restore_text_special_chars(text, text_start_special_chars, text_end_special_chars)
+
+def restore_paired_symbols(text: str, removed_symbols: List[tuple]) -> str:
+    """还原成对符号"""
+    return ENGINE.restore_paired_symbols(text, removed_symbols)
 
-    # 去除现有句首特殊符号
-    i = 0
-    while i < len(text) and text[i] in combined_chars:
-        i += 1
-    text = text[i:]
+class StreamingRestorer:
+    """流式输出时增量还原标点
 
-    # 去除现有句末特殊符号
-    i = len(text) - 1
-    while i >= 0 and text[i] in combined_chars:
-        i -= 1
-    text = text[:i+1]
+    依次输出的内容拼接后，与对完整译文调用 restore_text_special_chars + restore_paired_symbols 的结果一致：
+    跳过译文句首的特殊符号，暂缓输出句末可能出现的特殊符号串，最后补上原文的句末符号和成对符号。
+    """
 
-    # 添加指定的特殊符号
-    text = ''.join(text_start_special_chars) + text + ''.join(text_end_special_chars)
-    return text
+    def __init__(self, text_start_special_chars: List[str], text_end_special_chars: List[str],
+                 removed_symbols: List[tuple], holdback: int = 0):
+        # 成对符号还原后的前后缀
+        paired_prefix, paired_suffix = restore_paired_symbols('\0', removed_symbols).split('\0')
+        self.prefix = paired_prefix + ''.join(text_start_special_chars)
+        self.suffix = ''.join(text_end_special_chars) + paired_suffix
+        self.holdback = holdback  # 末尾暂缓输出的字符数（用于审查话术检测）
+        self.started = False      # 是否已输出过正文
+        self.leading = True       # 仍在跳过译文句首特殊符号
+        self.pending = ''
 
-def restore_paired_symbols(text: str, removed_symbols: List[tuple]) -> str:
-    """还原成对符号"""
-    # 按相反顺序重新添加符号
-    for symbol_info in reversed(removed_symbols):
-        if symbol_info[0] == "pair":
-            _, start_char, end_char = symbol_info
-            text = start_char + text + end_char
-        elif symbol_info[0] == "start":
-            _, char = symbol_info
-            text = char + text
-        else:  # "end"
-            _, char = symbol_info
-            text = text + char
-    return text
\ No newline at end of file
+    def feed(self, chunk: str) -> str:
+        """输入一个文本块，返回当前可以安全输出的内容"""
+        if self.leading:
+            chunk = chunk.lstrip(ENGINE.special_str)
+            if not chunk:
+                return ''
+            self.leading = False
+
+        self.pending += chunk
+        end = min(len(self.pending.rstrip(ENGINE.special_str)), len(self.pending) - self.holdback)
+        if end <= 0:
+            return ''
+
+        output = self.pending[:end]
+        self.pending = self.pending[end:]
+        if not self.started:
+            output = self.prefix + output
+            self.started = True
+        return output
+
+    def finish(self, discard_pending: bool = False) -> str:
+        """译文结束，返回剩余内容（去掉译文句末特殊符号并补上原文的符号）
+
+        discard_pending 为 True 时丢弃暂缓输出的内容（例如其中包含审查话术）。
+        """
+        if discard_pending:
+            self.pending = ''
+        output = self.pending.rstrip(ENGINE.special_str) + self.suffix
+        self.pending = ''
+        if not self.started:
+            output = self.prefix + output
+            self.started = True
+        return output
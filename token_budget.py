@@ -0,0 +1,264 @@
+import math
+import re
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from translation_log import log
+
+try:
+    import tiktoken  # 可选：pip install tiktoken，未安装时按字符类别估算
+except ImportError:
+    tiktoken = None
+
+# 估算规则参考 DeepSeek 官方说明：1 个中文字符约 0.6 个 token，1 个英文字符约 0.3 个 token
+CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff66-\uff9f]')  # 假名、汉字、半角片假名
+CJK_TOKENS_PER_CHAR = 0.6
+OTHER_TOKENS_PER_CHAR = 0.3
+MESSAGE_OVERHEAD = 8  # 每条消息的角色、分隔等额外 token
+
+# 句子结束位置（句末标点及其后的闭合引号），超长文本在这些位置切分
+SENTENCE_END = re.compile(r'[。！？!?…♪]+[」』）)】”’]*')
+CLAUSE_END = re.compile(r'[、，,；;：:]')
+
+
+class TokenCounter:
+    """计算文本的 token 数，相同文本的结果会被缓存
+
+    安装了 tiktoken 时使用 encoding 指定的编码，否则按字符类别估算（不需要下载任何文件）。
+    """
+
+    def __init__(self, tokenizer: str = 'auto', encoding: str = 'cl100k_base', cache_size: int = 10000):
+        self.encoder = None
+        if tokenizer in ('auto', 'tiktoken'):
+            if tiktoken is None:
+                if tokenizer == 'tiktoken':
+                    log.info("\033[33m[token预算]未安装 tiktoken，改为按字符估算（pip install tiktoken）\033[0m")
+            else:
+                try:
+                    self.encoder = tiktoken.get_encoding(encoding)
+                except Exception as e:
+                    log.info(f"\033[33m[token预算]无法加载编码 {encoding}，改为按字符估算: {e}\033[0m")
+        self.tokenizer = tokenizer
+        self.encoding = encoding
+        self.count = lru_cache(maxsize=cache_size)(self._count)
+
+    @property
+    def backend(self) -> str:
+        return 'tiktoken' if self.encoder is not None else 'estimate'
+
+    def _count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoder is not None:
+            return len(self.encoder.encode(text, disallowed_special=()))
+        cjk = len(CJK_PATTERN.findall(text))
+        return math.ceil(cjk * CJK_TOKENS_PER_CHAR + (len(text) - cjk) * OTHER_TOKENS_PER_CHAR)
+
+    def get_stats(self) -> Dict[str, Any]:
+        info = self.count.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            'backend': self.backend,
+            'cache_entries': info.currsize,
+            'cache_hit_rate': round(info.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class BudgetSettings:
+    """某个config版本的 token 预算设置（通过 ConfigSnapshot.derive 每个版本只解析一次）"""
+
+    def __init__(self, snapshot):
+        budget_config = snapshot.config.get('token_budget', {})
+        self.enabled = budget_config.get('enabled', True)
+        self.output_ratio = budget_config.get('output_ratio', 1.5)
+        self.margin_tokens = budget_config.get('margin_tokens', 16)
+        self.split_long_text = budget_config.get('split_long_text', True)
+        self.track_usage = budget_config.get('track_usage', True)
+        default_context = budget_config.get('context_tokens', 65536)
+        default_output = budget_config.get('max_output_tokens', 8192)
+
+        self.min_tokens = snapshot.min_tokens
+        self.fixed_tokens = snapshot.max_tokens
+        self.max_auto_tokens = snapshot.max_auto_tokens
+        self.context_tokens: Dict[str, int] = {}
+        self.max_output_tokens: Dict[str, int] = {}
+        self.prices: Dict[str, Dict[str, float]] = {}
+        for api_type, api_config in snapshot.config.get('api_keys', {}).items():
+            self.context_tokens[api_type] = api_config.get('context_tokens', default_context)
+            self.max_output_tokens[api_type] = api_config.get('max_output_tokens', default_output)
+            if 'price' in api_config:
+                self.prices[api_type] = dict(api_config['price'])
+        self.default_context = default_context
+        self.default_output = default_output
+
+    def output_cap(self) -> int:
+        """单次请求允许的最大输出 token 数"""
+        return self.fixed_tokens if self.fixed_tokens > 0 else self.max_auto_tokens
+
+
+class TokenBudget:
+    """按 token 数计算 max_tokens、切分超长文本，并按云服务商累计 token 用量和费用"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.counter = TokenCounter(
+            config.get('tokenizer', 'auto'),
+            config.get('encoding', 'cl100k_base'),
+            config.get('cache_size', 10000)
+        )
+        self.lock = threading.Lock()
+        self.spend: Dict[str, Dict[str, float]] = {}
+        self.splits = 0
+        self.capped = 0
+
+    def configure(self, config: Dict[str, Any]):
+        """config重载时，分词方式变化才重新创建计数器"""
+        tokenizer = config.get('tokenizer', 'auto')
+        encoding = config.get('encoding', 'cl100k_base')
+        if (tokenizer, encoding) != (self.counter.tokenizer, self.counter.encoding):
+            self.counter = TokenCounter(tokenizer, encoding, config.get('cache_size', 10000))
+
+    @staticmethod
+    def settings(snapshot) -> BudgetSettings:
+        return snapshot.derive('token_budget', BudgetSettings)
+
+    def count(self, text: str) -> int:
+        return self.counter.count(text)
+
+    def prompt_tokens(self, prompt: str, text: str, prefix: str = "") -> int:
+        """请求的输入 token 数；prompt 以 prefix 开头时前缀部分的计数可复用缓存"""
+        count = self.counter.count
+        if prefix and prompt.startswith(prefix):
+            system_tokens = count(prefix) + count(prompt[len(prefix):])
+        else:
+            system_tokens = count(prompt)
+        return system_tokens + count(text) + 2 * MESSAGE_OVERHEAD
+
+    def output_tokens(self, settings: BudgetSettings, text: str) -> int:
+        """按原文 token 数预估译文所需的 max_tokens"""
+        if settings.fixed_tokens > 0:
+            return settings.fixed_tokens
+        estimate = math.ceil(self.count(text) * settings.output_ratio) + settings.margin_tokens
+        return min(max(estimate, settings.min_tokens), settings.max_auto_tokens)
+
+    def provider_max_tokens(self, settings: BudgetSettings, api_type: str, max_tokens: int, prompt_tokens: int) -> int:
+        """按云服务商的上下文长度和输出上限收紧 max_tokens"""
+        context = settings.context_tokens.get(api_type, settings.default_context)
+        limit = min(settings.max_output_tokens.get(api_type, settings.default_output), context - prompt_tokens)
+        if max_tokens > limit:
+            with self.lock:
+                self.capped += 1
+            return max(1, limit)
+        return max_tokens
+
+    def input_limit(self, settings: BudgetSettings, api_priority, prompt_tokens: int = 0) -> int:
+        """单段原文的 token 上限：译文要放得下 max_tokens，请求要放得下所有云服务商的上下文"""
+        output_cap = settings.output_cap()
+        limit = int((output_cap - settings.margin_tokens) / settings.output_ratio)
+        for api_type in api_priority:
+            context = settings.context_tokens.get(api_type, settings.default_context)
+            limit = min(limit, context - prompt_tokens - output_cap)
+        return max(limit, 1)
+
+    def split(self, text: str, max_tokens: int) -> List[str]:
+        """在句子边界切分超长文本，各部分拼接后与原文完全一致"""
+        if self.count(text) <= max_tokens:
+            return [text]
+        pieces = self._split_at(text, SENTENCE_END)
+        parts = []
+        current = ""
+        for piece in pieces:
+            if self.count(piece) > max_tokens:
+                # 单句仍然过长：先在逗号等位置切分，再按长度硬切
+                if current:
+                    parts.append(current)
+                    current = ""
+                parts.extend(self._split_clauses(piece, max_tokens))
+            elif current and self.count(current + piece) > max_tokens:
+                parts.append(current)
+                current = piece
+            else:
+                current += piece
+        if current:
+            parts.append(current)
+        with self.lock:
+            self.splits += 1
+        return parts
+
+    @staticmethod
+    def _split_at(text: str, pattern) -> List[str]:
+        pieces = []
+        start = 0
+        for match in pattern.finditer(text):
+            pieces.append(text[start:match.end()])
+            start = match.end()
+        if start < len(text):
+            pieces.append(text[start:])
+        return pieces
+
+    def _split_clauses(self, text: str, max_tokens: int) -> List[str]:
+        parts = []
+        current = ""
+        for piece in self._split_at(text, CLAUSE_END):
+            while self.count(piece) > max_tokens:
+                # 没有可用的切分位置，按估算的字符数硬切
+                size = max(1, int(len(piece) * max_tokens / self.count(piece)))
+                if current:
+                    parts.append(current)
+                    current = ""
+                parts.append(piece[:size])
+                piece = piece[size:]
+            if current and self.count(current + piece) > max_tokens:
+                parts.append(current)
+                current = piece
+            else:
+                current += piece
+        if current:
+            parts.append(current)
+        return parts
+
+    def record(self, settings: BudgetSettings, api_type: str, prompt_tokens: int, completion_tokens: int,
+               cached_tokens: int = 0, estimated: bool = False):
+        """累计一次请求的 token 用量；配置了 price（每百万 token 的价格）时同时累计费用"""
+        price = settings.prices.get(api_type)
+        cost = 0.0
+        if price:
+            cost = (
+                (prompt_tokens - cached_tokens) * price.get('input', 0)
+                + cached_tokens * price.get('cached_input', price.get('input', 0))
+                + completion_tokens * price.get('output', 0)
+            ) / 1_000_000
+        with self.lock:
+            spend = self.spend.get(api_type)
+            if spend is None:
+                spend = self.spend[api_type] = {
+                    'requests': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+                    'cached_prompt_tokens': 0, 'estimated_requests': 0, 'cost': 0.0
+                }
+            spend['requests'] += 1
+            spend['prompt_tokens'] += prompt_tokens
+            spend['completion_tokens'] += completion_tokens
+            spend['cached_prompt_tokens'] += cached_tokens
+            spend['estimated_requests'] += 1 if estimated else 0
+            spend['cost'] += cost
+
+    def messages_tokens(self, messages) -> int:
+        return sum(self.count(message['content']) + MESSAGE_OVERHEAD for message in messages)
+
+    def request_tokens(self, model_params: Dict[str, Any]) -> int:
+        """一次请求最多消耗的 token 数（输入 + max_tokens），用于限速"""
+        return self.messages_tokens(model_params['messages']) + model_params.get('max_tokens', 0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            providers = {
+                api_type: {**spend, 'cost': round(spend['cost'], 6)}
+                for api_type, spend in self.spend.items()
+            }
+            return {
+                **self.counter.get_stats(),
+                'splits': self.splits,
+                'capped': self.capped,
+                'providers': providers,
+            }
@@ -0,0 +1,153 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Iterable, Iterator, Tuple
+
+from cache_backends import CacheBackendError, SQLiteBackend
+from translation_log import log
+
+
+class TranslationCache:
+    """两级翻译缓存：内存 LRU（容量 + TTL 淘汰）+ 共享存储层（SQLite 或 Redis，重启后仍有效，多个工作进程共用）"""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 7 * 24 * 3600, db_path: Optional[str] = None,
+                 backend=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # key -> (译文, 过期时间, 原文)
+        self.memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'puts': 0,
+            'evictions': 0,
+            'invalidations': 0,
+        }
+
+        self.backend = backend
+        if backend is None and db_path:
+            try:
+                self.backend = SQLiteBackend(db_path, ttl)
+            except CacheBackendError as e:
+                log.error(f"\033[31m[翻译缓存]打开磁盘缓存 {db_path} 失败，仅使用内存缓存: {e}\033[0m")
+
+    def get(self, key: str, memory_only: bool = False) -> Optional[str]:
+        """查询缓存，先查内存再查共享存储，共享存储命中会提升到内存
+
+        memory_only 为 True 时只查内存层（不做磁盘或网络 I/O），未命中时返回 None 且不计入未命中次数，
+        由调用方随后在工作线程中完整查询。
+        """
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                if entry[1] >= now:
+                    self.memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return entry[0]
+                del self.memory[key]
+                self.stats['evictions'] += 1
+        if memory_only and self.backend is not None:
+            return None
+
+        row = None
+        if self.backend is not None:
+            try:
+                row = self.backend.get(key)
+            except CacheBackendError as e:
+                log.error(f"\033[31m[翻译缓存]读取共享缓存失败: {e}\033[0m")
+
+        if row is not None and (self.ttl <= 0 or row[2] + self.ttl >= now):
+            source, translation, created = row
+            with self.lock:
+                self._put_memory(key, translation, source, created)
+                self.stats['disk_hits'] += 1
+            return translation
+
+        with self.lock:
+            self.stats['misses'] += 1
+        return None
+
+    def put(self, key: str, source: str, translation: str):
+        """写入缓存（内存 + 共享存储）"""
+        self.put_many([(key, source, translation)])
+
+    def put_many(self, items: Iterable[tuple]) -> int:
+        """批量写入 (key, 原文, 译文)，共享存储只提交一次，返回写入条数"""
+        items = list(items)
+        now = time.time()
+        with self.lock:
+            for key, source, translation in items:
+                self._put_memory(key, translation, source, now)
+            self.stats['puts'] += len(items)
+
+        if self.backend is not None and items:
+            try:
+                self.backend.put_many([(key, source, translation, now) for key, source, translation in items])
+            except CacheBackendError as e:
+                log.error(f"\033[31m[翻译缓存]写入共享缓存失败: {e}\033[0m")
+        return len(items)
+
+    def entries(self) -> Iterator[Tuple[str, str]]:
+        """按写入顺序遍历未过期的 (原文, 译文)，有共享存储时分批读取共享存储（包含已被移出内存的条目，SQLite 与 Redis 的顺序一致）"""
+        now = time.time()
+        if self.backend is None:
+            with self.lock:
+                snapshot = [(entry[2], entry[0]) for entry in self.memory.values() if entry[1] >= now]
+            yield from snapshot
+            return
+        try:
+            yield from self.backend.entries(now - self.ttl if self.ttl > 0 else 0)
+        except CacheBackendError as e:
+            log.error(f"\033[31m[翻译缓存]读取共享缓存失败: {e}\033[0m")
+
+    def _put_memory(self, key: str, translation: str, source: str, created: float):
+        """写入内存层并按容量淘汰最久未使用的条目（调用方需持有 self.lock）"""
+        expires_at = created + self.ttl if self.ttl > 0 else float('inf')
+        self.memory[key] = (translation, expires_at, source)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def invalidate_terms(self, terms: Iterable[str], once_key: Optional[str] = None) -> int:
+        """使原文中包含任一指定词条的缓存失效，返回失效条目数
+
+        once_key 标识这一次修改（例如字典文件的签名），共享存储据此让多个工作进程只清理一次。
+        """
+        terms = [t for t in terms if t]
+        if not terms:
+            return 0
+
+        with self.lock:
+            stale_keys = [
+                key for key, entry in self.memory.items()
+                if any(term in entry[2] for term in terms)
+            ]
+            for key in stale_keys:
+                del self.memory[key]
+        removed = len(stale_keys)
+
+        if self.backend is not None:
+            try:
+                # 内存层的条目一定也在共享存储中，取较大值避免重复计数
+                removed = max(removed, self.backend.delete_containing(terms, once_key))
+            except CacheBackendError as e:
+                log.error(f"\033[31m[翻译缓存]清理共享缓存失败: {e}\033[0m")
+
+        with self.lock:
+            self.stats['invalidations'] += removed
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存命中统计"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats['memory_entries'] = len(self.memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        if self.backend is not None:
+            stats['backend'] = self.backend.describe()
+        return stats
@@ -0,0 +1,135 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict
+
+ANSI_PATTERN = re.compile(r'\x1b\[[0-9;]*m')
+
+# 可单独开关的详细日志类别
+CATEGORIES = {
+    'prompt': False,   # 每次请求的提示词和发送文本
+    'chunks': False,   # 流式返回的各个文本块
+    'results': True,   # 原文和译文
+}
+
+
+class _PlainFormatter(logging.Formatter):
+    """写入文件时去掉 ANSI 颜色代码，并加上时间和级别"""
+
+    def format(self, record):
+        return ANSI_PATTERN.sub('', super().format(record))
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """队列已满时丢弃日志而不是阻塞调用线程"""
+
+    def __init__(self, log_queue, pipeline):
+        super().__init__(log_queue)
+        self.pipeline = pipeline
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.pipeline.lock:
+                self.pipeline.dropped += 1
+
+
+class LogPipeline:
+    """分级日志：调用方只把日志放入有界队列，由后台线程写入控制台和（可选的）滚动日志文件"""
+
+    def __init__(self):
+        self.logger = logging.getLogger('xunity_translator')
+        self.logger.propagate = False
+        self.lock = threading.Lock()
+        self.listener = None
+        self.handler = None
+        self.categories = dict(CATEGORIES)
+        self.sample_rate = 1.0
+        self.dropped = 0
+        self.configure({})
+        atexit.register(self.stop)
+
+    def configure(self, config: Dict[str, Any]):
+        """按 config.json 的 logging 段（重新）配置日志输出"""
+        level = getattr(logging, str(config.get('level', 'INFO')).upper(), logging.INFO)
+        handlers = []
+        if config.get('console', True):
+            console = logging.StreamHandler()
+            console.setFormatter(logging.Formatter('%(message)s'))
+            handlers.append(console)
+        log_file = config.get('file', '')
+        file_error = None
+        if log_file:
+            try:
+                Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+                file_handler = logging.handlers.RotatingFileHandler(
+                    log_file,
+                    maxBytes=config.get('max_bytes', 10 * 1024 * 1024),
+                    backupCount=config.get('backup_count', 5),
+                    encoding='utf-8'
+                )
+                file_handler.setFormatter(_PlainFormatter('%(asctime)s %(levelname)s %(message)s'))
+                handlers.append(file_handler)
+            except OSError as e:
+                file_error = e
+        log_queue = queue.Queue(maxsize=config.get('queue_size', 10000))
+        handler = _DroppingQueueHandler(log_queue, self)
+        listener = logging.handlers.QueueListener(log_queue, *handlers)
+
+        with self.lock:
+            old_listener, old_handler = self.listener, self.handler
+            self.categories = {**CATEGORIES, **config.get('categories', {})}
+            self.sample_rate = config.get('sample_rate', 1.0)
+            self.logger.setLevel(level)
+            listener.start()
+            self.logger.addHandler(handler)
+            self.listener, self.handler = listener, handler
+            if old_handler is not None:
+                self.logger.removeHandler(old_handler)
+        if old_listener is not None:
+            old_listener.stop()  # 写完旧队列中剩余的日志
+        if file_error is not None:
+            self.error(f"\033[31m[日志]打开日志文件 {log_file} 失败，仅输出到控制台: {file_error}\033[0m")
+
+    def enabled(self, category: str) -> bool:
+        """该类别是否开启；sample_rate 小于 1 时按比例抽样，每次调用独立判断"""
+        if not self.categories.get(category, False):
+            return False
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def debug(self, message: str):
+        self.logger.debug(message)
+
+    def info(self, message: str):
+        self.logger.info(message)
+
+    def warning(self, message: str):
+        self.logger.warning(message)
+
+    def error(self, message: str):
+        self.logger.error(message)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'queued': self.handler.queue.qsize() if self.handler is not None else 0,
+                'dropped': self.dropped,
+                'categories': dict(self.categories),
+                'sample_rate': self.sample_rate,
+            }
+
+    def stop(self):
+        """停止后台线程（会先写完队列中剩余的日志）"""
+        with self.lock:
+            listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.stop()
+
+
+log = LogPipeline()
@@ -0,0 +1,302 @@
+import heapq
+import json
+import random
+import re
+import threading
+from array import array
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from cache_backends import CacheBackendError
+from translation_log import log
+
+# 模板中的占位符：字典词条和数字分别用私用区字符表示，译文模板中记录对应的序号
+TERM_MARK = '\ue000'
+NUMBER_MARK = '\ue001'
+NUMBER_PATTERN = re.compile(r'[0-9０-９]+(?:[.,．][0-9０-９]+)*')
+
+HASH_MASK = (1 << 32) - 1
+BUCKET_LIMIT = 64     # 每个 LSH 桶最多保留的条目数（同一模板的大量变体只保留最近的）
+MAX_CANDIDATES = 16   # 计算精确相似度的候选条目数
+
+
+def normalize(text: str, dict_snapshot) -> Tuple[str, List[Tuple[str, str]]]:
+    """把字典词条和数字替换为占位符，返回 (模板, [(占位符, 该位置在译文中的写法)])
+
+    字典词条在译文中写作字典给出的译法，数字原样保留。
+    """
+    key_parts = []
+    slots = []
+    pos = 0
+
+    def add_numbers(segment):
+        last = 0
+        for match in NUMBER_PATTERN.finditer(segment):
+            key_parts.append(segment[last:match.start()])
+            key_parts.append(NUMBER_MARK)
+            slots.append((NUMBER_MARK, match.group()))
+            last = match.end()
+        key_parts.append(segment[last:])
+
+    for start, end, _, value in dict_snapshot.matcher.find_spans(text):
+        if not value:
+            continue
+        add_numbers(text[pos:start])
+        key_parts.append(TERM_MARK)
+        slots.append((TERM_MARK, value))
+        pos = end
+    add_numbers(text[pos:])
+    return ''.join(key_parts), slots
+
+
+def make_template(translation: str, slots: List[Tuple[str, str]]) -> Optional[tuple]:
+    """在译文中找到每个占位符的写法，返回由文字和占位符序号组成的译文模板；无法唯一定位时返回 None"""
+    targets = [target for _, target in slots]
+    if len(set(targets)) != len(targets):
+        return None  # 同一写法出现多次，无法确定译文中的对应关系
+    positions = []
+    for index, (mark, target) in enumerate(slots):
+        if mark == NUMBER_MARK:
+            found = [m.start() for m in NUMBER_PATTERN.finditer(translation) if m.group() == target]
+        else:
+            start = translation.find(target)
+            found = [start] if start != -1 and translation.find(target, start + 1) == -1 else []
+        if len(found) != 1:
+            return None
+        positions.append((found[0], found[0] + len(target), index))
+
+    positions.sort()
+    pieces = []
+    pos = 0
+    for start, end, index in positions:
+        if start < pos:
+            return None  # 两个占位符的写法重叠
+        if start > pos:
+            pieces.append(translation[pos:start])
+        pieces.append(index)
+        pos = end
+    if pos < len(translation):
+        pieces.append(translation[pos:])
+    return tuple(pieces)
+
+
+def fill_template(pieces: tuple, slots: List[Tuple[str, str]]) -> str:
+    return ''.join(slots[piece][1] if isinstance(piece, int) else piece for piece in pieces)
+
+
+class MinHashIndex:
+    """字符 n-gram 的 MinHash + LSH 近似匹配索引
+
+    每条记录计算 bands * rows 个 MinHash 值，分为 bands 组，任意一组完全相同即成为候选；
+    候选按命中组数排序后只对前 MAX_CANDIDATES 条计算精确的 Jaccard 相似度，查询耗时与条目总数无关。
+    超过 max_entries 后覆盖最早的条目。
+
+    各条目的桶键连续存放在一个 64 位整数数组中；大多数桶只有一个条目，直接保存条目序号，
+    第二个条目加入时才换成列表。
+    """
+
+    def __init__(self, max_entries: int = 200000, ngram: int = 2, bands: int = 8, rows: int = 4, seed: int = 1):
+        rng = random.Random(seed)
+        self.perms = [(rng.randrange(1, HASH_MASK) | 1, rng.randrange(0, HASH_MASK)) for _ in range(bands * rows)]
+        self.max_entries = max_entries
+        self.ngram = ngram
+        self.bands = bands
+        self.rows = rows
+        self.entries: List[Optional[tuple]] = []  # (原文, 译文, 模板)
+        self.band_table = array('q')  # 第 i 个条目的桶键位于 [i * bands, (i + 1) * bands)
+        self.ids: Dict[str, int] = {}
+        self.buckets: List[Dict[int, Union[int, List[int]]]] = [{} for _ in range(bands)]
+        self.next_id = 0
+        self.lock = threading.Lock()
+
+    def shingles(self, key: str) -> frozenset:
+        n = self.ngram
+        if len(key) <= n:
+            return frozenset((key,))
+        return frozenset(key[i:i + n] for i in range(len(key) - n + 1))
+
+    def band_keys(self, shingles: frozenset) -> Tuple[int, ...]:
+        hashes = [hash(shingle) & HASH_MASK for shingle in shingles]
+        signature = [min([(a * h + b) & HASH_MASK for h in hashes]) for a, b in self.perms]
+        rows = self.rows
+        return tuple(hash(tuple(signature[i:i + rows])) for i in range(0, len(signature), rows))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, source: str, translation: str, key: str):
+        band_keys = self.band_keys(self.shingles(key))
+        with self.lock:
+            entry_id = self.ids.get(source)
+            if entry_id is not None:
+                self.entries[entry_id] = (source, translation, self.entries[entry_id][2])
+                return
+            entry_id = self.next_id
+            self.next_id = (self.next_id + 1) % self.max_entries
+            if entry_id < len(self.entries):
+                self._remove(entry_id)
+                self.entries[entry_id] = (source, translation, key)
+                self.band_table[entry_id * self.bands:(entry_id + 1) * self.bands] = array('q', band_keys)
+            else:
+                self.entries.append((source, translation, key))
+                self.band_table.extend(band_keys)
+            self.ids[source] = entry_id
+            for buckets, band_key in zip(self.buckets, band_keys):
+                bucket = buckets.get(band_key)
+                if bucket is None:
+                    buckets[band_key] = entry_id
+                elif isinstance(bucket, int):
+                    buckets[band_key] = [bucket, entry_id]
+                else:
+                    bucket.append(entry_id)
+                    if len(bucket) > BUCKET_LIMIT:
+                        del bucket[0]
+
+    def _remove(self, entry_id: int):
+        """移除被覆盖的条目（调用方需持有 self.lock）"""
+        del self.ids[self.entries[entry_id][0]]
+        band_keys = self.band_table[entry_id * self.bands:(entry_id + 1) * self.bands]
+        for buckets, band_key in zip(self.buckets, band_keys):
+            bucket = buckets.get(band_key)
+            if bucket == entry_id:
+                del buckets[band_key]
+            elif isinstance(bucket, list) and entry_id in bucket:
+                bucket.remove(entry_id)
+                if len(bucket) == 1:
+                    buckets[band_key] = bucket[0]
+
+    def similar(self, key: str, limit: int, min_similarity: float, exclude: str = "") -> List[Tuple[float, str, str]]:
+        """返回与模板 key 相似度不低于 min_similarity 的最多 limit 条 (相似度, 原文, 译文)，相似度高的在前"""
+        shingles = self.shingles(key)
+        band_keys = self.band_keys(shingles)
+        counts: Dict[int, int] = {}
+        with self.lock:
+            for buckets, band_key in zip(self.buckets, band_keys):
+                bucket = buckets.get(band_key)
+                if bucket is None:
+                    continue
+                for entry_id in (bucket,) if isinstance(bucket, int) else bucket:
+                    counts[entry_id] = counts.get(entry_id, 0) + 1
+            candidates = [
+                self.entries[entry_id]
+                for entry_id, _ in heapq.nlargest(MAX_CANDIDATES, counts.items(), key=lambda item: item[1])
+            ]
+
+        results = []
+        for source, translation, entry_key in candidates:
+            if source == exclude:
+                continue
+            other = self.shingles(entry_key)
+            similarity = len(shingles & other) / len(shingles | other)
+            if similarity >= min_similarity:
+                results.append((similarity, source, translation))
+        results.sort(key=lambda item: item[0], reverse=True)
+        return results[:limit]
+
+
+class TranslationMemory:
+    """翻译记忆：只有数字、字典词条不同的句子直接套用已有译文，相近的句子作为参考译例提供给模型
+
+    原文中的字典词条和数字被替换为占位符得到模板；译文中能唯一定位这些词条译法和数字时，
+    保存对应的译文模板，之后同一模板的句子在本地填入新的词条译法和数字即可得到译文。
+    传入 store（cache_backends 中的共享存储）时模板同时写入共享存储，多个工作进程之间共用；
+    参考译例的近似匹配索引仍在每个进程内各自维护。
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, store=None):
+        config = config or {}
+        self.store = store
+        self.max_entries = config.get('max_entries', 200000)
+        self.templates: Dict[str, tuple] = {}
+        self.index = MinHashIndex(
+            self.max_entries,
+            config.get('ngram', 2),
+            config.get('bands', 8),
+            config.get('rows', 4)
+        )
+        self.lock = threading.Lock()
+        self.stats = {
+            'lookups': 0, 'template_hits': 0, 'shared_hits': 0, 'example_lookups': 0, 'examples': 0, 'added': 0
+        }
+
+    def lookup(self, key: str, slots: List[Tuple[str, str]], scope: str = "") -> Optional[str]:
+        """按模板查询译文，命中时填入本句的词条译法和数字
+
+        scope 为提示词和模型的指纹，不同配置下记录的模板互不套用。
+        """
+        template_key = f"{scope}:{key}" if scope else key
+        pieces = self.templates.get(template_key) if slots else None
+        if pieces is None and slots and self.store is not None:
+            pieces = self._load_shared(template_key)
+        with self.lock:
+            self.stats['lookups'] += 1
+            if pieces is not None:
+                self.stats['template_hits'] += 1
+        if pieces is None:
+            return None
+        return fill_template(pieces, slots)
+
+    def _load_shared(self, key: str) -> Optional[tuple]:
+        """从共享存储读取其他工作进程保存的模板"""
+        try:
+            data = self.store.get_template(key)
+        except CacheBackendError as e:
+            log.error(f"\033[31m[翻译记忆]读取共享模板失败: {e}\033[0m")
+            return None
+        if data is None:
+            return None
+        pieces = tuple(json.loads(data))
+        self._remember(key, pieces)
+        with self.lock:
+            self.stats['shared_hits'] += 1
+        return pieces
+
+    def _remember(self, key: str, pieces: tuple):
+        with self.lock:
+            if len(self.templates) >= self.max_entries:
+                # 按写入顺序淘汰最早的模板
+                del self.templates[next(iter(self.templates))]
+            self.templates[key] = pieces
+
+    def examples(self, key: str, source: str, limit: int, min_similarity: float) -> List[Tuple[str, str]]:
+        """相近句子的 [(原文, 译文)]，用作提示词中的参考译例"""
+        if limit <= 0 or not len(self.index):
+            return []
+        found = self.index.similar(key, limit, min_similarity, exclude=source)
+        with self.lock:
+            self.stats['example_lookups'] += 1
+            self.stats['examples'] += len(found)
+        return [(source, translation) for _, source, translation in found]
+
+    def add(self, source: str, translation: str, dict_snapshot, key: str = None, slots=None, scope: str = "",
+            template: bool = True):
+        """记录一条译文（原文与译文都应已去除句首句末标点和成对符号）
+
+        scope 同 lookup；template 为 False 时只加入参考译例的索引，不记录模板
+        （例如从翻译缓存重建时，无法确定已有译文是在哪套提示词和模型下得到的）。
+        """
+        if not source.strip() or not translation:
+            return
+        if key is None:
+            key, slots = normalize(source, dict_snapshot)
+        template_key = f"{scope}:{key}" if scope else key
+        if template and slots and template_key not in self.templates:
+            pieces = make_template(translation, slots)
+            if pieces is not None:
+                self._remember(template_key, pieces)
+                if self.store is not None:
+                    try:
+                        self.store.put_template(template_key, json.dumps(pieces, ensure_ascii=False))
+                    except CacheBackendError as e:
+                        log.error(f"\033[31m[翻译记忆]写入共享模板失败: {e}\033[0m")
+        self.index.add(source, translation, key)
+        with self.lock:
+            self.stats['added'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.stats)
+        lookups = stats['lookups']
+        stats['template_hit_rate'] = round(stats['template_hits'] / lookups, 4) if lookups else 0.0
+        stats['templates'] = len(self.templates)
+        stats['indexed'] = len(self.index)
+        return stats
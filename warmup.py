@@ -0,0 +1,310 @@
+"""
+预翻译与导入：把 XUnity.AutoTranslator 的翻译文件或游戏脚本导出的文本批量翻译进翻译缓存，
+游戏中遇到这些文本时直接命中缓存；也可以把缓存中的译文导出为 XUnity 的翻译文件格式。
+
+    python warmup.py translate _AutoGeneratedTranslations.txt script_dump.txt --concurrency 16 --tokens-per-sec 20000
+    python warmup.py translate _Translations.txt --use-existing
+    python warmup.py export _AutoGeneratedTranslations.txt -o _Translations.txt
+
+translate 会跳过已在缓存中的原文，中断后使用相同参数重新运行即可从断点继续；
+进度和失败的原文保存在 --checkpoint 指定的文件中。需要启用 config.json 的 cache（建议设置 db_path）。
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import unquote
+
+from translation_log import log
+
+# XUnity 翻译文件的转义字符（见 XUnity.AutoTranslator 的 TextHelper.Escape/Unescape）
+UNESCAPES = {'\\': '\\', '=': '=', 'n': '\n', 'r': '\r', 't': '\t', '/': '/'}
+ESCAPES = {'\\': '\\\\', '=': '\\=', '\n': '\\n', '\r': '\\r', '\t': '\\t'}
+REGEX_PREFIXES = ('r:', 'sr:')  # 正则表达式翻译，不参与预翻译
+
+
+def unescape(text: str) -> str:
+    if '\\' not in text:
+        return text
+    out = []
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == '\\' and i + 1 < len(text) and text[i + 1] in UNESCAPES:
+            out.append(UNESCAPES[text[i + 1]])
+            i += 2
+        else:
+            out.append(char)
+            i += 1
+    return ''.join(out)
+
+
+def escape(text: str) -> str:
+    escaped = ''.join(ESCAPES.get(char, char) for char in text)
+    # 以 // 开头的行会被当作注释
+    return '\\' + escaped if escaped.startswith('//') else escaped
+
+
+def split_entry(line: str) -> Optional[Tuple[str, str]]:
+    """按第一个未转义的 = 拆分 key=value，没有 = 时返回 None"""
+    i = 0
+    while i < len(line):
+        if line[i] == '\\':
+            i += 2
+            continue
+        if line[i] == '=':
+            return line[:i], line[i + 1:]
+        i += 1
+    return None
+
+
+def detect_format(path: str, lines: List[str]) -> str:
+    """文件名以 Translations.txt 结尾，或大部分非注释行是 key=value 时按 XUnity 格式读取"""
+    if path.endswith('Translations.txt'):
+        return 'xunity'
+    content = [line for line in lines if line.strip() and not line.startswith('//')]
+    if not content:
+        return 'lines'
+    entries = sum(1 for line in content[:200] if split_entry(line) is not None)
+    return 'xunity' if entries * 2 > min(len(content), 200) else 'lines'
+
+
+def read_sources(path: str, file_format: str = 'auto') -> List[Tuple[str, str]]:
+    """读取文件，返回 [(原文, 已有译文)]；纯文本格式中每个非空行是一条原文，已有译文为空"""
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        lines = f.read().splitlines()
+    if file_format == 'auto':
+        file_format = detect_format(path, lines)
+
+    if file_format == 'lines':
+        return [(line, '') for line in lines if line.strip()]
+
+    entries = []
+    for line in lines:
+        if not line.strip() or line.startswith('//') or line.startswith(REGEX_PREFIXES):
+            continue
+        entry = split_entry(line)
+        key, value = entry if entry is not None else (line, '')
+        key = unescape(key)
+        if key.strip():
+            entries.append((key, unescape(value)))
+    return entries
+
+
+def collect_sources(paths: Iterable[str], file_format: str = 'auto') -> Dict[str, str]:
+    """合并所有文件并去重（保持首次出现的顺序），返回 {原文: 已有译文}"""
+    sources: Dict[str, str] = {}
+    for path in paths:
+        entries = read_sources(path, file_format)
+        before = len(sources)
+        for key, value in entries:
+            if key not in sources or (value and not sources[key]):
+                sources[key] = value
+        log.info(f"\033[36m[预翻译]读取 {path}：{len(entries)} 条，新增 {len(sources) - before} 条\033[0m")
+    return sources
+
+
+class Checkpoint:
+    """预翻译进度：已完成数和失败的原文，每次保存先写临时文件再替换，中断时不会损坏"""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.data = {'total': 0, 'translated': 0, 'cached': 0, 'imported': 0, 'failed': []}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.data.update(json.load(f))
+            except (OSError, ValueError) as e:
+                log.warning(f"\033[33m[预翻译]无法读取进度文件 {path}，将重新记录: {e}\033[0m")
+
+    @property
+    def failed(self) -> List[str]:
+        return self.data['failed']
+
+    def save(self):
+        if not self.path:
+            return
+        self.data['updated'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def import_existing(service, sources: Dict[str, str]) -> int:
+    """把翻译文件中已有的译文写入缓存（只写入缓存中还没有的条目）"""
+    snapshot = service.config_manager.snapshot()
+    dict_snapshot = service.dict_manager.snapshot()
+    items = []
+    for key, value in sources.items():
+        if value and service.lookup_cache(key, "", snapshot, dict_snapshot) is None:
+            source = unquote(key)
+            items.append((service._cache_key(source, "", snapshot, dict_snapshot), source, value))
+    return service.cache.put_many(items)
+
+
+def translate_sources(service, texts: List[str], concurrency: int, checkpoint: Checkpoint,
+                      progress_interval: float = 10.0):
+    """并发翻译，同时提交的任务不超过 concurrency 的两倍；译文写入缓存即视为完成"""
+    failed = set(checkpoint.failed)
+    done = 0
+    started = time.monotonic()
+    last_report = started
+
+    def work(text):
+        service.translate(text)
+        return service.lookup_cache(text) is not None
+
+    pending = {}  # future -> 原文
+    texts_iter = iter(texts)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='warmup') as executor:
+        try:
+            while True:
+                while len(pending) < concurrency * 2:
+                    text = next(texts_iter, None)
+                    if text is None:
+                        break
+                    pending[executor.submit(work, text)] = text
+                if not pending:
+                    break
+                finished, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    text = pending.pop(future)
+                    try:
+                        ok = future.result()
+                    except Exception as e:
+                        log.error(f"\033[31m[预翻译]翻译失败: {e}\033[0m")
+                        ok = False
+                    done += 1
+                    if ok:
+                        checkpoint.data['translated'] += 1
+                        failed.discard(text)
+                    else:
+                        failed.add(text)
+
+                now = time.monotonic()
+                if now - last_report >= progress_interval:
+                    last_report = now
+                    rate = done / (now - started)
+                    remaining = (len(texts) - done) / rate if rate else 0
+                    log.info(f"\033[36m[预翻译]进度 {done}/{len(texts)}，失败 {len(failed)}，"
+                             f"{rate:.1f} 条/秒，预计剩余 {remaining:.0f} 秒\033[0m")
+                    checkpoint.data['failed'] = sorted(failed)
+                    checkpoint.save()
+        except KeyboardInterrupt:
+            log.warning("\033[33m[预翻译]已中断，正在等待进行中的请求完成（再次运行即可继续）\033[0m")
+            for future in pending:
+                future.cancel()
+            raise
+        finally:
+            checkpoint.data['failed'] = sorted(failed)
+            checkpoint.save()
+    return done, len(failed)
+
+
+def cmd_translate(service, args) -> int:
+    sources = collect_sources(args.inputs, args.format)
+    checkpoint = Checkpoint(args.checkpoint)
+    checkpoint.data['total'] = len(sources)
+
+    if args.use_existing:
+        imported = import_existing(service, sources)
+        checkpoint.data['imported'] += imported
+        log.info(f"\033[32m[预翻译]已导入 {imported} 条已有译文\033[0m")
+
+    # 已在缓存中的原文（之前运行完成的、导入的）直接跳过
+    snapshot = service.config_manager.snapshot()
+    dict_snapshot = service.dict_manager.snapshot()
+    skip_failed = set(checkpoint.failed) if args.skip_failed else set()
+    todo = [
+        text for text in sources
+        if text not in skip_failed and service.lookup_cache(text, "", snapshot, dict_snapshot) is None
+    ]
+    checkpoint.data['cached'] = len(sources) - len(todo) - len(skip_failed & sources.keys())
+    if args.limit:
+        todo = todo[:args.limit]
+    log.info(f"\033[33m[预翻译]共 {len(sources)} 条原文，已缓存 {checkpoint.data['cached']} 条，"
+             f"本次翻译 {len(todo)} 条（并发 {args.concurrency}）\033[0m")
+
+    if args.tokens_per_sec > 0:
+        service.rate_limiter.override(tpm=args.tokens_per_sec * 60, final_wait=float('inf'))
+    else:
+        # 预翻译在自己的线程中执行，最后一个云服务商可以像以前一样原地等待额度，而不是直接失败
+        provider_wait = service.get_current_config().get('server', {}).get('provider_wait', 10)
+        service.rate_limiter.override(final_wait=provider_wait)
+
+    started = time.monotonic()
+    done, failed = translate_sources(service, todo, args.concurrency, checkpoint, args.progress_interval)
+    elapsed = time.monotonic() - started
+    log.info(f"\033[32m[预翻译]完成 {done} 条，失败 {failed} 条，用时 {elapsed:.1f} 秒\033[0m")
+    log.info(f"\033[36m[预翻译]token 用量: {json.dumps(service.token_budget.get_stats()['providers'], ensure_ascii=False)}\033[0m")
+    return 1 if failed else 0
+
+
+def cmd_export(service, args) -> int:
+    """导出缓存中的译文；指定输入文件时只导出其中的原文（按当前config和字典查询缓存）"""
+    if args.inputs:
+        sources = collect_sources(args.inputs, args.format)
+        snapshot = service.config_manager.snapshot()
+        dict_snapshot = service.dict_manager.snapshot()
+        pairs = []
+        for text in sources:
+            translation = service.lookup_cache(text, "", snapshot, dict_snapshot)
+            if translation is not None:
+                pairs.append((unquote(text), translation))
+    else:
+        pairs = list(dict(service.cache.entries()).items())
+
+    lines = [escape(source) + '=' + escape(translation) for source, translation in pairs]
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + ('\n' if lines else ''))
+        log.info(f"\033[32m[预翻译]已导出 {len(lines)} 条到 {args.output}\033[0m")
+    else:
+        sys.stdout.write('\n'.join(lines) + ('\n' if lines else ''))
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='XUnity.AutoTranslator 预翻译与导入/导出')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    translate_parser = subparsers.add_parser('translate', help='批量翻译文件中的原文并写入翻译缓存')
+    translate_parser.add_argument('inputs', nargs='+', help='XUnity 翻译文件或游戏脚本导出的文本（每行一条）')
+    translate_parser.add_argument('--concurrency', type=int, default=8, help='同时翻译的原文数（默认 8）')
+    translate_parser.add_argument('--tokens-per-sec', type=float, default=0,
+                                  help='每个云服务商每秒最多使用的 token 数（输入 + max_tokens），0 表示不限制')
+    translate_parser.add_argument('--checkpoint', default='warmup_checkpoint.json', help='进度文件路径，留空则不保存')
+    translate_parser.add_argument('--skip-failed', action='store_true', help='跳过进度文件中记录为失败的原文')
+    translate_parser.add_argument('--use-existing', action='store_true', help='先把翻译文件中已有的译文导入缓存')
+    translate_parser.add_argument('--limit', type=int, default=0, help='本次最多翻译的条数，0 表示不限制')
+    translate_parser.add_argument('--progress-interval', type=float, default=10.0, help='进度输出间隔（秒）')
+
+    export_parser = subparsers.add_parser('export', help='把缓存中的译文导出为 XUnity 翻译文件格式')
+    export_parser.add_argument('inputs', nargs='*', help='只导出这些文件中的原文（默认导出全部缓存）')
+    export_parser.add_argument('-o', '--output', help='输出文件路径（默认输出到标准输出）')
+
+    for sub in (translate_parser, export_parser):
+        sub.add_argument('--format', choices=['auto', 'xunity', 'lines'], default='auto',
+                         help='输入文件格式：xunity（key=value）、lines（每行一条原文）或 auto（自动判断）')
+    args = parser.parse_args(argv)
+
+    from translation_service import TranslationService
+    service = TranslationService()
+    if service.cache is None:
+        log.error("\033[31m[预翻译]翻译缓存未启用，请在 config.json 中开启 cache（建议设置 db_path）\033[0m")
+        return 2
+
+    if args.command == 'translate':
+        try:
+            return cmd_translate(service, args)
+        except KeyboardInterrupt:
+            return 130
+    return cmd_export(service, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+import concurrent.futures
+import threading
+import time
+from collections import deque
+from typing import Any, Dict
+
+
+class PoolFullError(Exception):
+    """等待队列已满，请求被拒绝"""
+    pass
+
+
+class WorkerPool:
+    """长期存在的共享工作线程池，带有有界等待队列和排队统计"""
+
+    def __init__(self, max_workers: int = 32, max_pending: int = 64,
+                 executor_factory=concurrent.futures.ThreadPoolExecutor):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.executor = executor_factory(max_workers=max_workers)
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.wait_times = deque(maxlen=1000)  # 最近的排队等待时间（秒）
+        self.stats = {
+            'submitted': 0,
+            'rejected': 0,
+            'completed': 0,
+            'failed': 0,
+        }
+
+    def submit(self, func, *args, **kwargs) -> concurrent.futures.Future:
+        """提交任务，等待队列已满时抛出 PoolFullError"""
+        return self._submit(False, func, *args, **kwargs)
+
+    def submit_continuation(self, func, *args, **kwargs) -> concurrent.futures.Future:
+        """提交已接纳请求的后续任务（例如流式响应的下一段），不受等待队列上限限制"""
+        return self._submit(True, func, *args, **kwargs)
+
+    def _submit(self, force, func, *args, **kwargs) -> concurrent.futures.Future:
+        with self.lock:
+            if not force and self.queued >= self.max_pending:
+                self.stats['rejected'] += 1
+                raise PoolFullError(f"等待队列已满（{self.queued}/{self.max_pending}）")
+            self.queued += 1
+            self.stats['submitted'] += 1
+
+        submitted_at = time.perf_counter()
+
+        def run():
+            with self.lock:
+                self.queued -= 1
+                self.running += 1
+                self.wait_times.append(time.perf_counter() - submitted_at)
+            failed = True
+            try:
+                result = func(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                with self.lock:
+                    self.running -= 1
+                    self.stats['failed' if failed else 'completed'] += 1
+
+        try:
+            return self.executor.submit(run)
+        except Exception:
+            with self.lock:
+                self.queued -= 1
+            raise
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取队列深度和排队等待时间统计"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats['queue_depth'] = self.queued
+            stats['running'] = self.running
+            waits = sorted(self.wait_times)
+        stats['max_workers'] = self.max_workers
+        stats['max_pending'] = self.max_pending
+        stats['wait_avg_ms'] = sum(waits) / len(waits) * 1000 if waits else 0.0
+        stats['wait_p95_ms'] = waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000 if waits else 0.0
+        stats['wait_max_ms'] = waits[-1] * 1000 if waits else 0.0
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait=wait)